@@ -0,0 +1,89 @@
+import sys
+import argparse
+
+
+def run(argv=None):
+    from organica.benchmarks.generator import LibraryGenerator
+    import organica.benchmarks.suite as suite
+
+    parser = argparse.ArgumentParser(description='Run Organica library benchmarks')
+    parser.add_argument('--nodes', type=int, default=1000, help='number of nodes in generated library')
+    parser.add_argument('--tags', type=int, default=200, help='number of tags in generated library')
+    parser.add_argument('--classes', type=int, default=5, help='number of tag classes in generated library')
+    parser.add_argument('--links', type=int, default=5, help='number of tags linked to each node')
+    parser.add_argument('--distribution', choices=(LibraryGenerator.UNIFORM_DISTRIBUTION,
+                                                   LibraryGenerator.ZIPF_DISTRIBUTION),
+                        default=LibraryGenerator.ZIPF_DISTRIBUTION, help='distribution of links between tags')
+    parser.add_argument('--seed', type=int, default=0, help='seed for library generator')
+    parser.add_argument('--repeat', type=int, default=5, help='number of runs for each benchmark')
+    parser.add_argument('--sample', type=int, default=100, help='number of nodes and tags used by per-object '
+                                                                'benchmarks')
+    parser.add_argument('--database', default=':memory:', help='file to generate library in')
+    parser.add_argument('--only', action='append', help='run only benchmarks matching this wildcard')
+    parser.add_argument('--output', help='file to save results to (JSON)')
+    parser.add_argument('--baseline', help='file with results to compare with (JSON)')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='allowed slowdown relative to baseline')
+    parser.add_argument('--stress', action='store_true', help='run concurrency stress test instead of benchmarks')
+    parser.add_argument('--readers', type=int, default=4, help='number of reader threads for stress test')
+    parser.add_argument('--writers', type=int, default=2, help='number of writer threads for stress test')
+    parser.add_argument('--duration', type=float, default=10.0, help='stress test duration in seconds')
+    parser.add_argument('--deadlock-timeout', type=float, default=30.0,
+                        help='time after which stuck operation is reported as deadlock')
+    parser.add_argument('--memory', action='store_true', help='measure memory footprint instead of running '
+                                                              'benchmarks')
+    parser.add_argument('--micro', action='store_true', help='run micro benchmarks of hot object operations')
+    parser.add_argument('--sizes', default='1000,10000,100000',
+                        help='comma-separated node counts of libraries to measure memory footprint for')
+    args = parser.parse_args(argv)
+
+    generator = LibraryGenerator(args.nodes, args.tags, args.classes, args.links, args.distribution,
+                                 seed=args.seed)
+
+    if args.stress:
+        import organica.utils.constants as constants
+        from organica.benchmarks.stress import StressTest
+
+        # there is no event loop to deliver queued signals
+        queued_connections_disabled = constants.disable_set_queued_connections
+        constants.disable_set_queued_connections = True
+        try:
+            lib = generator.generate(args.database)
+            results = StressTest(lib, args.readers, args.writers, args.duration, args.deadlock_timeout,
+                                 args.seed).run()
+            failed = bool(results['deadlocks'] or results['anomalies'])
+            if not results['deadlocks']:
+                lib.close()
+        finally:
+            constants.disable_set_queued_connections = queued_connections_disabled
+    elif args.micro:
+        from organica.benchmarks.micro import runMicroBenchmarks
+
+        results = {'micro': runMicroBenchmarks(repeat=args.repeat)}
+        failed = False
+    elif args.memory:
+        from organica.benchmarks.memory import measureGrowth
+
+        sizes = [int(size) for size in args.sizes.split(',')]
+        results = {'memory': measureGrowth(sizes, args.tags / args.nodes, args.classes, args.links, args.seed)}
+        failed = False
+    else:
+        results = suite.runSuite(generator, args.repeat, args.sample, args.only, args.database)
+        failed = False
+
+    if args.baseline and not (args.stress or args.memory or args.micro):
+        comparison = suite.compareResults(results, suite.loadResults(args.baseline), args.tolerance)
+        results['comparison'] = comparison
+        failed = suite.hasRegressions(comparison)
+
+    if args.output:
+        suite.saveResults(results, args.output)
+    else:
+        import json
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(run())
@@ -0,0 +1,132 @@
+import random
+import bisect
+from organica.lib.library import Library
+from organica.lib.objects import TagValue
+
+
+class LibraryGenerator(object):
+    """Generates synthetic libraries for benchmarking. Generated library is fully determined by generator
+    parameters, so two runs with same parameters produce identical libraries.
+        nodeCount:      number of nodes to create
+        tagCount:       number of tags to create. Tags are evenly distributed between classes.
+        classCount:     number of tag classes to create. Each fourth class has NUMBER value type, others - TEXT.
+        linksPerNode:   number of distinct tags linked to each node (limited by tagCount)
+        distribution:   how tags are chosen for linking. With UNIFORM_DISTRIBUTION each tag has equal chance to
+                        be linked, with ZIPF_DISTRIBUTION tag popularity decreases as 1 / rank ** zipfExponent,
+                        so few tags are linked with most of nodes (like gentres) and most tags are linked with
+                        few nodes (like authors).
+        seed:           seed for random numbers generator
+    """
+
+    UNIFORM_DISTRIBUTION = 'uniform'
+    ZIPF_DISTRIBUTION = 'zipf'
+
+    def __init__(self, node_count=1000, tag_count=200, class_count=5, links_per_node=5,
+                 distribution=ZIPF_DISTRIBUTION, zipf_exponent=1.0, seed=0):
+        if distribution not in (self.UNIFORM_DISTRIBUTION, self.ZIPF_DISTRIBUTION):
+            raise ValueError('unknown links distribution: {0}'.format(distribution))
+        if class_count <= 0:
+            raise ValueError('at least one tag class should be generated')
+
+        self.nodeCount = node_count
+        self.tagCount = tag_count
+        self.classCount = class_count
+        self.linksPerNode = links_per_node
+        self.distribution = distribution
+        self.zipfExponent = zipf_exponent
+        self.seed = seed
+
+    @property
+    def parameters(self):
+        """Dictionary of generator parameters. Can be used to reproduce generated library."""
+
+        return {
+            'node_count': self.nodeCount,
+            'tag_count': self.tagCount,
+            'class_count': self.classCount,
+            'links_per_node': self.linksPerNode,
+            'distribution': self.distribution,
+            'zipf_exponent': self.zipfExponent,
+            'seed': self.seed
+        }
+
+    @staticmethod
+    def className(class_index):
+        return 'class{0}'.format(class_index)
+
+    def classNames(self):
+        return [self.className(index) for index in range(self.classCount)]
+
+    @staticmethod
+    def classValueType(class_index):
+        return TagValue.TYPE_NUMBER if class_index % 4 == 3 else TagValue.TYPE_TEXT
+
+    @staticmethod
+    def tagValue(tag_index, value_type):
+        return tag_index if value_type == TagValue.TYPE_NUMBER else 'value #{0}'.format(tag_index)
+
+    @staticmethod
+    def nodeName(node_index):
+        return 'node #{0}'.format(node_index)
+
+    def generate(self, filename=':memory:'):
+        """Create new library at :filename: and fill it with generated objects. All objects are created in single
+        transaction, just like bulk import does.
+        """
+
+        lib = Library.createLibrary(filename)
+        try:
+            self.populate(lib)
+        except:
+            lib.close()
+            raise
+        return lib
+
+    def populate(self, lib):
+        rnd = random.Random(self.seed)
+
+        with lib.transaction():
+            tag_classes = [lib.createTagClass(self.className(index), self.classValueType(index))
+                           for index in range(self.classCount)]
+
+            tags = []
+            for tag_index in range(self.tagCount):
+                tag_class = tag_classes[tag_index % self.classCount]
+                tags.append(lib.createTag(tag_class, self.tagValue(tag_index, tag_class.valueType)))
+
+            # tags are shuffled so popular tags do not always belong to first classes
+            rnd.shuffle(tags)
+            cumulative_weights = self.__cumulativeWeights(len(tags))
+
+            for node_index in range(self.nodeCount):
+                node = lib.createNode(self.nodeName(node_index))
+                for tag_index in self.__pickTags(rnd, cumulative_weights):
+                    lib.createLink(node, tags[tag_index])
+
+    def __cumulativeWeights(self, count):
+        weights = []
+        total = 0.0
+        for rank in range(1, count + 1):
+            if self.distribution == self.ZIPF_DISTRIBUTION:
+                total += 1.0 / (rank ** self.zipfExponent)
+            else:
+                total += 1.0
+            weights.append(total)
+        return weights
+
+    def __pickTags(self, rnd, cumulative_weights):
+        if not cumulative_weights:
+            return []
+
+        wanted = min(self.linksPerNode, len(cumulative_weights))
+        picked = []
+        # sampling with replacement, duplicates are dropped. Number of attempts is limited to keep very
+        # skewed distributions from looping too long.
+        for attempt in range(wanted * 4):
+            if len(picked) == wanted:
+                break
+            tag_index = bisect.bisect_left(cumulative_weights, rnd.random() * cumulative_weights[-1])
+            tag_index = min(tag_index, len(cumulative_weights) - 1)
+            if tag_index not in picked:
+                picked.append(tag_index)
+        return picked
@@ -0,0 +1,177 @@
+import gc
+import copy
+import tracemalloc
+import organica.utils.constants as constants
+from organica.lib.filters import TagQuery, NodeQuery
+from organica.lib.objects import Identity, TagValue, Tag, Node
+from organica.lib.locator import Locator
+from organica.lib.sets import NodeSet
+from organica.lib.objectsmodel import ObjectsModel
+from organica.lib.tagsmodel import TagsModel
+from organica.benchmarks.generator import LibraryGenerator
+
+
+class _Measure(object):
+    """Measures how much traced memory is still allocated by objects created inside 'with' block.
+    Objects should be kept alive after leaving block (by storing them in variables, for example), otherwise
+    their memory is already released at the moment of measuring.
+    """
+
+    def __init__(self):
+        self.bytes = 0
+        self.__started = 0
+
+    def __enter__(self):
+        gc.collect()
+        self.__started = tracemalloc.get_traced_memory()[0]
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        gc.collect()
+        self.bytes = tracemalloc.get_traced_memory()[0] - self.__started
+
+
+def _perObject(total_bytes, count):
+    return total_bytes / count if count else 0.0
+
+
+def _objectCosts(lib, count):
+    """Bytes per single standalone object of each type."""
+
+    costs = {}
+
+    with _Measure() as m:
+        identities = [Identity(lib, index) for index in range(count)]
+    costs['Identity'] = _perObject(m.bytes, len(identities))
+
+    with _Measure() as m:
+        values = [TagValue('value #{0}'.format(index)) for index in range(count)]
+    costs['TagValue'] = _perObject(m.bytes, len(values))
+
+    tag_class = lib.tagClasses()[0]
+    with _Measure() as m:
+        tags = [Tag(tag_class, 'value #{0}'.format(index)) for index in range(count)]
+        for index, tag in enumerate(tags):
+            tag.identity = Identity(lib, index + 1)
+    costs['Tag (standalone)'] = _perObject(m.bytes, len(tags))
+
+    with _Measure() as m:
+        nodes = [Node('node #{0}'.format(index)) for index in range(count)]
+        for index, node in enumerate(nodes):
+            node.identity = Identity(lib, index + 1)
+    costs['Node (standalone)'] = _perObject(m.bytes, len(nodes))
+
+    # note that Locator keeps QUrl, and memory allocated by Qt is not traced
+    with _Measure() as m:
+        locators = [Locator.fromLocalFile('/data/file #{0}.txt'.format(index)) for index in range(count)]
+    costs['Locator'] = _perObject(m.bytes, len(locators))
+
+    return costs
+
+
+def measureLibrary(generator, top_allocations=10):
+    """Generate library with :generator: and measure memory consumed by library object graphs.
+    Returns dictionary that can be serialized to JSON. All values are in bytes.
+        per_object:         bytes per cached Node and Tag, per Node.allTags list (including tag copies it holds),
+                            per standalone Identity, TagValue and Locator and per deep copy of Node library
+                            sends with signals.
+        structures:         bytes held by library caches, NodeSet results, ObjectsModel (first page of rows)
+                            and TagsModel leaves tree with two first classes as hierarchy and all first-level
+                            items expanded.
+        bytes_per_node:     sum of structures divided by number of nodes.
+        top_allocations:    source lines that allocated most of memory still held by library caches.
+    """
+
+    # there is no event loop to deliver queued signals
+    queued_connections_disabled = constants.disable_set_queued_connections
+    constants.disable_set_queued_connections = True
+    try:
+        lib = generator.generate()
+        try:
+            # start with empty caches, generation leaves objects there
+            lib._nodes, lib._tags = {}, {}
+
+            tracemalloc.start()
+            try:
+                result = {'node_count': generator.nodeCount, 'tag_count': generator.tagCount}
+
+                with _Measure() as m:
+                    lib.tags(TagQuery())
+                tags_cache = m.bytes
+                tag_count = len(lib._tags)
+
+                with _Measure() as m:
+                    lib.nodes(NodeQuery())
+                nodes_cache = m.bytes
+                node_count = len(lib._nodes)
+
+                with _Measure() as m:
+                    for node in lib._nodes.values():
+                        node.ensureTagsFetched()
+                all_tags_lists = m.bytes
+
+                result['per_object'] = {
+                    'Node': _perObject(nodes_cache, node_count),
+                    'Tag': _perObject(tags_cache, tag_count),
+                    'Node.allTags': _perObject(all_tags_lists, node_count)
+                }
+                result['per_object'].update(_objectCosts(lib, min(node_count, 100000) or 1000))
+
+                # library emits deep copies of objects with each signal
+                with _Measure() as m:
+                    signal_copies = [copy.deepcopy(node) for node in lib._nodes.values()]
+                result['per_object']['signal copy of Node'] = _perObject(m.bytes, len(signal_copies))
+                del signal_copies
+
+                with _Measure() as m:
+                    node_set = NodeSet(lib, NodeQuery())
+                    node_set.ensureFetched()
+                set_results = m.bytes
+                del node_set
+
+                with _Measure() as m:
+                    objects_model = ObjectsModel(lib)
+                objects_model_bytes = m.bytes
+                del objects_model
+
+                with _Measure() as m:
+                    tags_model = TagsModel(lib)
+                    tags_model.hierarchy = generator.classNames()[:2]
+                    for row in range(tags_model.rowCount()):
+                        tags_model.fetchMore(tags_model.index(row, 0))
+                tags_model_bytes = m.bytes
+                del tags_model
+
+                result['structures'] = {
+                    'Library._nodes': nodes_cache + all_tags_lists,
+                    'Library._tags': tags_cache,
+                    '_Set.results': set_results,
+                    'ObjectsModel': objects_model_bytes,
+                    'TagsModel': tags_model_bytes
+                }
+                result['bytes_per_node'] = _perObject(sum(result['structures'].values()), node_count)
+
+                # models and sets are released at this moment, so top allocations are made by library caches
+                snapshot = tracemalloc.take_snapshot()
+                result['top_allocations'] = [str(stat) for stat in snapshot.statistics('lineno')[:top_allocations]]
+            finally:
+                tracemalloc.stop()
+        finally:
+            lib.close()
+    finally:
+        constants.disable_set_queued_connections = queued_connections_disabled
+
+    return result
+
+
+def measureGrowth(sizes=(1000, 10000, 100000), tags_per_node=0.2, class_count=5, links_per_node=5, seed=0):
+    """Measure libraries of growing size. Number of tags is :tags_per_node: * nodes count.
+    Returns list of dictionaries returned by measureLibrary for each size.
+    """
+
+    results = []
+    for size in sizes:
+        generator = LibraryGenerator(node_count=size, tag_count=max(1, int(size * tags_per_node)),
+                                     class_count=class_count, links_per_node=links_per_node, seed=seed)
+        results.append(measureLibrary(generator))
+    return results
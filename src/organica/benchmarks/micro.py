@@ -0,0 +1,58 @@
+import timeit
+from organica.lib.objects import Identity, TagValue, TagClass, Tag, Node
+from organica.lib.filters import TagQuery
+
+
+class _FakeLibrary(object):
+    """Stands in for library in micro benchmarks: objects are flushed, but never fetch anything."""
+
+    def tags(self, query):
+        return []
+
+
+def _fixture(tags_count=20):
+    lib = _FakeLibrary()
+    tag_class = TagClass(Identity(lib, 1), 'author', TagValue.TYPE_TEXT)
+    node = Node('node')
+    node.identity = Identity(lib, 1)
+    for index in range(tags_count):
+        tag = Tag(tag_class, 'Author #{0}'.format(index))
+        tag.identity = Identity(lib, index + 1)
+        node.linkTag(tag)
+    return tag_class, node
+
+
+def runMicroBenchmarks(number=100000, repeat=3):
+    """Time hot operations on TagValue and objects using it. Returns dictionary mapping operation name
+    to best time of single operation in microseconds.
+    """
+
+    tag_class, node = _fixture()
+    text_value = TagValue('Lewis Carrol')
+    other_value = TagValue('lewis carrol')
+    number_value = TagValue(1865)
+    tag = node.allTags[-1]
+    query = TagQuery(tag_class='author', text='author #19')
+
+    def assign_text():
+        text_value.text = 'Lewis Carrol'
+
+    cases = (
+        ('TagValue.text', lambda: text_value.text),
+        ('TagValue.number (other type)', lambda: text_value.number),
+        ('TagValue.text assignment', assign_text),
+        ('TagValue(str)', lambda: TagValue('Lewis Carrol')),
+        ('TagValue == TagValue', lambda: text_value == other_value),
+        ('TagValue == str', lambda: text_value == 'lewis carrol'),
+        ('TagValue == int', lambda: number_value == 1865),
+        ('TagQuery.passes', lambda: query.passes(tag)),
+        ('Node.testTag(Tag)', lambda: node.testTag(tag)),
+    )
+
+    results = {}
+    for name, func in cases:
+        # fewer iterations for operations scanning lists of tags
+        iterations = number // 20 if name.startswith('Node.') else number
+        best = min(timeit.repeat(func, number=iterations, repeat=repeat))
+        results[name] = best / iterations * 1000000
+    return results
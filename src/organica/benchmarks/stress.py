@@ -0,0 +1,322 @@
+import sys
+import time
+import random
+import threading
+import traceback
+from organica.lib.filters import TagQuery, NodeQuery
+from organica.benchmarks.generator import LibraryGenerator
+
+
+def _percentile(ordered, fraction):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _distribution(samples):
+    ordered = sorted(samples)
+    return {
+        'mean': sum(ordered) / len(ordered) if ordered else 0.0,
+        'p50': _percentile(ordered, 0.5),
+        'p90': _percentile(ordered, 0.9),
+        'p99': _percentile(ordered, 0.99),
+        'max': ordered[-1] if ordered else 0.0
+    }
+
+
+class _OperationStats(object):
+    def __init__(self):
+        self.latencies = []
+        self.lockWaits = []
+        self.errors = {}  # map error message to count
+
+    def addError(self, message):
+        self.errors[message] = self.errors.get(message, 0) + 1
+
+
+class _TransactionMonitor(object):
+    """Replaces Library._begin, _commit and _rollback with versions checking that transactions are properly
+    nested and never interleave between threads.
+    """
+
+    def __init__(self, lib):
+        self.lib = lib
+        self.anomalies = []
+        self.rollbacks = 0
+        self.__lock = threading.Lock()
+        self.__depths = {}  # map thread id to number of open transactions
+        self.__begin, self.__commit, self.__rollback = lib._begin, lib._commit, lib._rollback
+
+    def install(self):
+        self.lib._begin = self._begin
+        self.lib._commit = self._commit
+        self.lib._rollback = self._rollback
+
+    def uninstall(self):
+        for attr in ('_begin', '_commit', '_rollback'):
+            self.lib.__dict__.pop(attr, None)
+
+    def openTransactions(self, thread_id):
+        with self.__lock:
+            return self.__depths.get(thread_id, 0)
+
+    def _anomaly(self, description):
+        with self.__lock:
+            self.anomalies.append('{0}: {1}'.format(threading.current_thread().name, description))
+
+    def _begin(self):
+        self.__begin()
+        thread_id = threading.get_ident()
+        with self.__lock:
+            others = [t for t, depth in self.__depths.items() if depth and t != thread_id]
+            depth = self.__depths.get(thread_id, 0)
+            self.__depths[thread_id] = depth + 1
+        if others:
+            self._anomaly('transaction started while another thread has open transaction')
+        if len(self.lib._trans_states) != depth + 1:
+            self._anomaly('saved states count {0} does not match transaction depth {1}'
+                          .format(len(self.lib._trans_states), depth + 1))
+
+    def _commit(self):
+        self.__leave('commit')
+        try:
+            self.__commit()
+        except Exception as err:
+            self._anomaly('commit failed: {0}'.format(err))
+            raise
+
+    def _rollback(self):
+        with self.__lock:
+            self.rollbacks += 1
+        self.__leave('rollback')
+        try:
+            self.__rollback()
+        except Exception as err:
+            self._anomaly('rollback failed: {0}'.format(err))
+            raise
+
+    def __leave(self, action):
+        thread_id = threading.get_ident()
+        with self.__lock:
+            depth = self.__depths.get(thread_id, 0)
+            self.__depths[thread_id] = max(0, depth - 1)
+        if depth == 0:
+            self._anomaly('{0} without open transaction'.format(action))
+
+
+class _LockMonitor(object):
+    """Replaces library lock with wrapper measuring time threads spend waiting to acquire it inside library
+    methods. Waits are summed for each thread, so time spent waiting during one operation is difference between
+    totals taken before and after it.
+    """
+
+    def __init__(self, lib):
+        self.lib = lib
+        self.__lock = lib.lock
+        self.__waits = threading.local()
+
+    def install(self):
+        self.lib.lock = self
+
+    def uninstall(self):
+        self.lib.lock = self.__lock
+
+    def totalWait(self):
+        """Time current thread spent waiting for lock since monitor was installed"""
+        return getattr(self.__waits, 'total', 0.0)
+
+    def acquire(self, blocking=True, timeout=-1):
+        started = time.perf_counter()
+        acquired = self.__lock.acquire(blocking, timeout)
+        self.__waits.total = self.totalWait() + time.perf_counter() - started
+        return acquired
+
+    def release(self):
+        self.__lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+class StressTest(object):
+    """Drives library from several reader and writer threads simultaneously and collects throughput,
+    latency percentiles and time spent waiting for library lock for each operation type. Operations are not
+    serialized by test itself, so threads contend for library lock just like in application; waits are measured
+    by wrapper replacing library lock.
+    Readers call Library.nodes and Library.tags, writers call createLink (and removeLink to keep link count
+    stable), flushNode and setMeta.
+    Transaction methods of library are monitored to detect improperly nested or interleaved transactions
+    and failed commits or rollbacks. Watchdog thread reports deadlock if any operation does not complete
+    in :deadlock_timeout: seconds, dumps stacks of all threads and stops the test.
+    """
+
+    ReaderOperations = ('nodes', 'tags')
+    WriterOperations = ('createLink', 'flushNode', 'setMeta')
+
+    def __init__(self, lib=None, readers=4, writers=2, duration=5.0, deadlock_timeout=10.0, seed=0):
+        self.lib = lib
+        self.readers = readers
+        self.writers = writers
+        self.duration = duration
+        self.deadlockTimeout = deadlock_timeout
+        self.seed = seed
+        self.__stats = {}
+        self.__statsLock = threading.Lock()
+        self.__stop = threading.Event()
+        self.__inflight = {}  # map thread name to (operation name, start time)
+        self.__deadlocks = []
+
+    def run(self):
+        """Run test and return dictionary with results (can be serialized to JSON).
+        If no library was given, one is generated with default LibraryGenerator.
+        """
+
+        own_lib = self.lib is None
+        lib = LibraryGenerator().generate() if own_lib else self.lib
+
+        try:
+            self.__nodes = [node.identity for node in lib.nodes(NodeQuery())]
+            self.__tags = [tag.identity for tag in lib.tags(TagQuery())]
+            if not self.__nodes or not self.__tags:
+                raise ValueError('library used for stress test should have nodes and tags')
+
+            monitor = _TransactionMonitor(lib)
+            monitor.install()
+            lock_monitor = _LockMonitor(lib)
+            lock_monitor.install()
+            try:
+                threads = [threading.Thread(target=self.__work, args=(lib, lock_monitor, self.ReaderOperations,
+                                                                      index),
+                                            name='reader-{0}'.format(index), daemon=True)
+                           for index in range(self.readers)]
+                threads += [threading.Thread(target=self.__work, args=(lib, lock_monitor, self.WriterOperations,
+                                                                       index),
+                                             name='writer-{0}'.format(index), daemon=True)
+                            for index in range(self.writers)]
+
+                started = time.perf_counter()
+                for thread in threads:
+                    thread.start()
+
+                self.__watch(threads, started)
+                elapsed = time.perf_counter() - started
+
+                for thread in threads:
+                    if not thread.is_alive() and monitor.openTransactions(thread.ident):
+                        monitor._anomaly('thread {0} finished with open transaction'.format(thread.name))
+            finally:
+                if not self.__deadlocks:
+                    # deadlocked threads can still call transaction methods
+                    monitor.uninstall()
+                    lock_monitor.uninstall()
+        finally:
+            if own_lib and not self.__deadlocks:
+                lib.close()
+
+        return self.__report(elapsed, monitor)
+
+    def __watch(self, threads, started):
+        while any(thread.is_alive() for thread in threads):
+            now = time.perf_counter()
+            if now - started >= self.duration:
+                self.__stop.set()
+
+            with self.__statsLock:
+                stuck = [(name, op) for name, (op, op_started) in self.__inflight.items()
+                         if now - op_started > self.deadlockTimeout]
+            if stuck:
+                self.__deadlocks.append({'threads': dict(stuck), 'stacks': self.__dumpStacks()})
+                self.__stop.set()
+                break
+
+            time.sleep(0.05)
+
+    @staticmethod
+    def __dumpStacks():
+        names = dict((thread.ident, thread.name) for thread in threading.enumerate())
+        return dict((names.get(ident, str(ident)), ''.join(traceback.format_stack(frame)))
+                    for ident, frame in sys._current_frames().items())
+
+    def __work(self, lib, lock_monitor, operations, index):
+        rnd = random.Random('{0}-{1}-{2}'.format(self.seed, threading.current_thread().name, index))
+        name = threading.current_thread().name
+        while not self.__stop.is_set():
+            op_name = rnd.choice(operations)
+            operation = getattr(self, '_op_' + op_name)
+
+            with self.__statsLock:
+                self.__inflight[name] = (op_name, time.perf_counter())
+
+            error = None
+            waited_before = lock_monitor.totalWait()
+            started = time.perf_counter()
+            try:
+                operation(lib, rnd)
+            except Exception as err:
+                error = '{0}: {1}'.format(type(err).__name__, err)
+            latency = time.perf_counter() - started
+            lock_wait = lock_monitor.totalWait() - waited_before
+
+            with self.__statsLock:
+                del self.__inflight[name]
+                stats = self.__stats.setdefault(op_name, _OperationStats())
+                stats.latencies.append(latency)
+                stats.lockWaits.append(lock_wait)
+                if error is not None:
+                    stats.addError(error)
+
+    def _op_nodes(self, lib, rnd):
+        lib.nodes(NodeQuery(tags=TagQuery(identity=rnd.choice(self.__tags))))
+
+    def _op_tags(self, lib, rnd):
+        lib.tags(TagQuery(linked_with=rnd.choice(self.__nodes)))
+
+    def _op_createLink(self, lib, rnd):
+        node, tag = rnd.choice(self.__nodes), rnd.choice(self.__tags)
+        # other writer can link or unlink same tag between check and change
+        if lib.node(node).testTag(tag):
+            lib.removeLinkIfExists(node, tag)
+        else:
+            lib.createLinkIfNotExists(node, tag)
+
+    def _op_flushNode(self, lib, rnd):
+        node = lib.node(rnd.choice(self.__nodes))
+        tag = rnd.choice(self.__tags)
+        if node.testTag(tag):
+            node.unlink(tag)
+        else:
+            node.link(lib.tag(tag))
+        lib.flushNode(node)
+
+    def _op_setMeta(self, lib, rnd):
+        lib.setMeta('stress_meta_{0}'.format(rnd.randint(0, 9)), rnd.random())
+
+    def __report(self, elapsed, monitor):
+        operations = {}
+        for op_name, stats in self.__stats.items():
+            operations[op_name] = {
+                'count': len(stats.latencies),
+                'errors': stats.errors,
+                'throughput': len(stats.latencies) / elapsed if elapsed > 0 else 0.0,
+                'latency': _distribution(stats.latencies),
+                'lock_wait': _distribution(stats.lockWaits)
+            }
+
+        return {
+            'parameters': {
+                'readers': self.readers,
+                'writers': self.writers,
+                'duration': self.duration,
+                'deadlock_timeout': self.deadlockTimeout,
+                'seed': self.seed
+            },
+            'elapsed': elapsed,
+            'operations': operations,
+            'rollbacks': monitor.rollbacks,
+            'anomalies': list(monitor.anomalies),
+            'deadlocks': self.__deadlocks
+        }
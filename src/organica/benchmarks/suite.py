@@ -0,0 +1,282 @@
+import gc
+import json
+import time
+import platform
+import fnmatch
+import logging
+import organica.utils.constants as constants
+from organica.lib.filters import TagQuery, NodeQuery, Wildcard
+from organica.lib.sets import TagSet, NodeSet
+from organica.lib.formatstring import FormatString
+from organica.lib.objectsmodel import ObjectsModel
+from organica.lib.tagsmodel import TagsModel
+from organica.benchmarks.generator import LibraryGenerator
+
+
+logger = logging.getLogger(__name__)
+
+
+class BenchmarkTimer(object):
+    """Accumulates time spent inside 'with timer:' blocks. Benchmarks use it to exclude preparation and cleanup
+    from measured time.
+    """
+
+    def __init__(self):
+        self.elapsed = 0.0
+        self.__started = None
+
+    def __enter__(self):
+        self.__started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.elapsed += time.perf_counter() - self.__started
+
+
+class BenchmarkContext(object):
+    """Data shared by benchmarks of single suite run.
+        lib:            generated library
+        generator:      LibraryGenerator library was generated with
+        sampleNodes:    list of nodes used by benchmarks working with separate nodes
+        sampleTags:     list of tags used by benchmarks working with separate tags
+        benchTag:       tag that is not linked to any node, used by benchmarks creating links
+    """
+
+    def __init__(self, lib, generator, sample_size):
+        self.lib = lib
+        self.generator = generator
+        self.sampleNodes = lib.nodes(NodeQuery())[:sample_size]
+        self.sampleTags = lib.tags(TagQuery())[:sample_size]
+        self.benchTag = lib.createTag(lib.createTagClass('bench_class'), 'bench value')
+
+
+def _benchTagsByClass(context, timer):
+    with timer:
+        for class_name in context.generator.classNames():
+            context.lib.tags(TagQuery(tag_class=class_name))
+
+
+def _benchTagsLinkedWith(context, timer):
+    with timer:
+        for node in context.sampleNodes:
+            context.lib.tags(TagQuery(linked_with=node))
+
+
+def _benchAllNodes(context, timer):
+    with timer:
+        context.lib.nodes(NodeQuery())
+
+
+def _benchNodesByTag(context, timer):
+    with timer:
+        for tag in context.sampleTags:
+            context.lib.nodes(NodeQuery(tags=TagQuery(identity=tag)))
+
+
+def _benchFilterCompilation(context, timer):
+    with timer:
+        for index in range(100):
+            query = NodeQuery(tags=TagQuery(tag_class='class0', text=Wildcard('value #{0}*'.format(index)))) \
+                    | NodeQuery(display_name=Wildcard('node #{0}*'.format(index)))
+            query = query & ~NodeQuery(no_tags=True)
+            query.generateSqlWhere()
+
+
+def _benchCreateLink(context, timer):
+    for node in context.sampleNodes:
+        with timer:
+            context.lib.createLink(node, context.benchTag)
+        context.lib.removeLink(node, context.benchTag)
+
+
+def _benchFlushNode(context, timer):
+    for node in context.sampleNodes:
+        node = context.lib.node(node)
+        node.link(context.benchTag)
+        with timer:
+            context.lib.flushNode(node)
+        node.unlink(TagQuery(identity=context.benchTag))
+        context.lib.flushNode(node)
+
+
+def _benchFormatString(context, timer):
+    class_names = context.generator.classNames()
+    template = FormatString('{{{0}}} / {{{1}: max=3}}'.format(class_names[0], class_names[-1]))
+    with timer:
+        for node in context.sampleNodes:
+            template.format(node)
+
+
+def _benchFormatMany(context, timer):
+    class_names = context.generator.classNames()
+    template = FormatString('{{{0}}} / {{{1}: max=3}}'.format(class_names[0], class_names[-1]))
+    with timer:
+        template.formatMany(context.sampleNodes)
+
+
+def _benchSetsFetch(context, timer):
+    with timer:
+        NodeSet(context.lib, NodeQuery()).ensureFetched()
+        TagSet(context.lib, TagQuery()).ensureFetched()
+
+
+def _benchObjectsModel(context, timer):
+    with timer:
+        model = ObjectsModel(context.lib, background_loading=False)
+        model.fetchAll()
+        for row in range(model.rowCount()):
+            model.data(model.index(row, 0))
+
+
+def _benchTagsModel(context, timer):
+    with timer:
+        model = TagsModel(context.lib)
+        model.hierarchy = context.generator.classNames()[:2]
+        for row in range(model.rowCount()):
+            index = model.index(row, 0)
+            model.data(index)
+            model.fetchMore(index)
+            model.rowCount(index)
+
+
+# Benchmarks modifying library go before benchmarks creating sets and models, so objects watching library
+# state do not affect timings of modifications.
+Benchmarks = (
+    ('queries.tags_by_class', _benchTagsByClass),
+    ('queries.tags_linked_with', _benchTagsLinkedWith),
+    ('queries.all_nodes', _benchAllNodes),
+    ('queries.nodes_by_tag', _benchNodesByTag),
+    ('filters.compile', _benchFilterCompilation),
+    ('library.create_link', _benchCreateLink),
+    ('library.flush_node', _benchFlushNode),
+    ('formatstring.render', _benchFormatString),
+    ('formatstring.render_many', _benchFormatMany),
+    ('sets.fetch', _benchSetsFetch),
+    ('models.objects_populate', _benchObjectsModel),
+    ('models.tags_populate', _benchTagsModel),
+)
+
+BulkImportBenchmarkName = 'library.bulk_import'
+
+
+def _summary(samples):
+    ordered = sorted(samples)
+    middle = len(ordered) // 2
+    median = ordered[middle] if len(ordered) % 2 else (ordered[middle - 1] + ordered[middle]) / 2
+    return {
+        'runs': len(samples),
+        'min': ordered[0],
+        'max': ordered[-1],
+        'mean': sum(samples) / len(samples),
+        'median': median
+    }
+
+
+def runSuite(generator=None, repeat=5, sample_size=100, names=None, filename=':memory:'):
+    """Generate library with :generator: (default LibraryGenerator if None) and run benchmarks on it.
+    Each benchmark is run :repeat: times. If :names: is not None, only benchmarks with names matching one of
+    given wildcard patterns (fnmatch syntax) are run. Returns dictionary that can be serialized to JSON.
+    Time of library generation is reported as library.bulk_import benchmark with single run.
+    """
+
+    generator = generator or LibraryGenerator()
+
+    def selected(name):
+        return names is None or any(fnmatch.fnmatch(name, pattern) for pattern in names)
+
+    results = {}
+
+    # there is no event loop to deliver queued signals when running benchmarks
+    queued_connections_disabled = constants.disable_set_queued_connections
+    constants.disable_set_queued_connections = True
+    try:
+        started = time.perf_counter()
+        lib = generator.generate(filename)
+        if selected(BulkImportBenchmarkName):
+            results[BulkImportBenchmarkName] = _summary([time.perf_counter() - started])
+
+        try:
+            context = BenchmarkContext(lib, generator, sample_size)
+            for name, benchmark in Benchmarks:
+                if not selected(name):
+                    continue
+
+                samples = []
+                for run_index in range(repeat):
+                    gc.collect()
+                    timer = BenchmarkTimer()
+                    benchmark(context, timer)
+                    samples.append(timer.elapsed)
+                results[name] = _summary(samples)
+                logger.debug('benchmark {0}: {1}'.format(name, results[name]))
+        finally:
+            lib.close()
+    finally:
+        constants.disable_set_queued_connections = queued_connections_disabled
+
+    return {
+        'parameters': generator.parameters,
+        'repeat': repeat,
+        'sample_size': sample_size,
+        'platform': {
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'system': platform.system()
+        },
+        'benchmarks': results
+    }
+
+
+# values of 'status' key of comparison results
+STATUS_OK, STATUS_REGRESSION, STATUS_IMPROVEMENT, STATUS_NEW, STATUS_MISSING = \
+    'ok', 'regression', 'improvement', 'new', 'missing'
+
+
+def compareResults(results, baseline, tolerance=0.1):
+    """Compare median times of benchmarks in :results: with ones in :baseline: (both are dictionaries returned
+    by runSuite). Benchmark is considered regressed if it is more than :tolerance: times slower than baseline.
+    Returns dictionary mapping benchmark name to dictionary with baseline, current, ratio and status keys.
+    """
+
+    current_benchmarks = results.get('benchmarks', {})
+    baseline_benchmarks = baseline.get('benchmarks', {})
+
+    comparison = {}
+    for name in set(current_benchmarks.keys()) | set(baseline_benchmarks.keys()):
+        current = current_benchmarks[name]['median'] if name in current_benchmarks else None
+        base = baseline_benchmarks[name]['median'] if name in baseline_benchmarks else None
+
+        ratio = None
+        if current is None:
+            status = STATUS_MISSING
+        elif base is None:
+            status = STATUS_NEW
+        else:
+            ratio = current / base if base > 0 else float('inf') if current > 0 else 1.0
+            if ratio > 1.0 + tolerance:
+                status = STATUS_REGRESSION
+            elif ratio < 1.0 / (1.0 + tolerance):
+                status = STATUS_IMPROVEMENT
+            else:
+                status = STATUS_OK
+
+        comparison[name] = {'baseline': base, 'current': current, 'ratio': ratio, 'status': status}
+
+    if baseline.get('parameters') != results.get('parameters'):
+        logger.warning('baseline was collected with different generator parameters, comparison can be meaningless')
+
+    return comparison
+
+
+def hasRegressions(comparison):
+    return any(c['status'] == STATUS_REGRESSION for c in comparison.values())
+
+
+def loadResults(filename):
+    with open(filename, 'rt', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def saveResults(results, filename):
+    with open(filename, 'wt', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
@@ -109,7 +109,8 @@ class GenericNodeEditor(QWidget):
         self.tagsModel.tags = self.originalCommonTags
 
     def getModified(self, original_node):
-        node_tags = [copy.deepcopy(tag) for tag in original_node.allTags if tag not in self.originalCommonTags] + self.tagsModel.tags
+        original_common_tags = set(self.originalCommonTags)
+        node_tags = [copy.deepcopy(tag) for tag in original_node.allTags if tag not in original_common_tags] + self.tagsModel.tags
         node = copy.deepcopy(original_node)
         node.allTags = node_tags
         return node
@@ -125,6 +125,8 @@ class NodeReferenceEditor(QComboBox):
 
         model = ObjectsModel(self.lib)
         model.columns = [CustomColumn()]
+        # combo box does not request rows on demand
+        model.fetchAll()
         self.setModel(model)
         self.setModelColumn(0)
 
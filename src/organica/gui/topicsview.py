@@ -5,7 +5,8 @@ from PyQt4.QtGui import QToolButton, QSortFilterProxyModel, QWidget, QLineEdit,
 from organica.gui.selectionmodel import WatchingSelectionModel
 from organica.gui.actions import StandardStateValidator, globalCommandManager
 from organica.lib.tagsmodel import TagsModel
-from organica.lib.filters import TagQuery, Wildcard, replaceInFilters
+from organica.lib.filters import TagQuery, NodeQuery, Wildcard, replaceInFilters
+from organica.lib.library import FacetLimit
 from organica.utils.extend import globalObjectPool
 from organica.utils.helpers import tr
 import organica.gui.resources.qrc_main
@@ -90,6 +91,8 @@ class TopicsView(QWidget):
         self.contextMenu = QMenu(self)
         self.tree.setContextMenuPolicy(Qt.CustomContextMenu)
         self.tree.customContextMenuRequested.connect(self.__showContextMenu)
+        self.tree.expanded.connect(self.__onExpanded)
+        self.tree.collapsed.connect(self.__onCollapsed)
 
         with globalObjectPool().lock:
             self.modes = []
@@ -158,6 +161,14 @@ class TopicsView(QWidget):
             else:
                 self.tree.setCurrentIndex(QModelIndex())
 
+    def facets(self, classes=None, limit_per_class=FacetLimit):
+        """Tags linked to nodes of current topic with number of these nodes, see Library.facets
+        """
+
+        current_tag = self.currentTag
+        node_query = NodeQuery(tags=TagQuery(identity=current_tag)) if current_tag is not None else NodeQuery()
+        return self.lib.facets(node_query, classes, limit_per_class)
+
     def __onSearchTextChanged(self, new_search_text):
         tags_model = self._treeModel.sourceModel()
         if tags_model is not None:
@@ -199,3 +210,9 @@ class TopicsView(QWidget):
     def __onCurrentTagChanged(self, new_index=QModelIndex()):
         tag = new_index.data(TagsModel.TagIdentityRole)
         self.selectedTagChanged.emit(tag)
+
+    def __onExpanded(self, index):
+        self.model.branchExpanded(self._treeModel.mapToSource(index))
+
+    def __onCollapsed(self, index):
+        self.model.branchCollapsed(self._treeModel.mapToSource(index))
@@ -0,0 +1,196 @@
+from PyQt4.QtCore import Qt
+from organica.utils.lockable import Lockable
+
+
+# ids of set bits for each byte value
+_BitsOfByte = [tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256)]
+
+
+def _bytesFromIds(ids):
+    """Build mutable bitmap (bytearray, lowest bit of first byte is position 0) from sequence of ids"""
+
+    ids = list(ids)
+    data = bytearray(max(ids) // 8 + 1 if ids else 0)
+    for object_id in ids:
+        data[object_id >> 3] |= 1 << (object_id & 7)
+    return data
+
+
+def _setBit(data, position):
+    byte_index = position >> 3
+    if byte_index >= len(data):
+        data.extend(bytes(byte_index - len(data) + 1))
+    data[byte_index] |= 1 << (position & 7)
+
+
+def _clearBit(data, position):
+    byte_index = position >> 3
+    if byte_index < len(data):
+        data[byte_index] &= ~(1 << (position & 7)) & 0xff
+
+
+def bitmapFromIds(ids):
+    """Build bitmap (Python int with bits set at given positions) from sequence of ids"""
+
+    return int.from_bytes(_bytesFromIds(ids), 'little')
+
+
+def idsFromBitmap(bitmap):
+    """Get sorted list of positions of set bits of bitmap"""
+
+    ids = []
+    for byte_index, byte in enumerate(bitmap.to_bytes((bitmap.bit_length() + 7) // 8, 'little')):
+        if byte:
+            base = byte_index << 3
+            ids.extend(base + bit for bit in _BitsOfByte[byte])
+    return ids
+
+
+class BitmapIndex(Lockable):
+    """In-memory inverted index mapping tag id to set of ids of nodes linked with this tag. Index is built from
+    database when created and kept in sync with library by watching its signals. Node queries that consist only
+    of tags conditions with known tag identities combined with AND, OR and NOT (see NodeQuery.nodeBitmap) are
+    evaluated by index without querying database.
+
+    Nodes of tags are stored as bitmaps when tag is linked to many nodes and as sets of ids for rarely used tags,
+    so memory used by index does not grow with number of tags times number of nodes. Stored bitmaps are
+    bytearrays changed in place, so updating index on link change does not copy bitmap; they are converted to
+    Python ints (which queries are evaluated with) only when query is evaluated.
+    """
+
+    # tag is stored as bitmap when it is linked to more than (greatest node id * DenseRatio) nodes
+    DenseRatio = 1 / 256
+
+    def __init__(self, lib):
+        Lockable.__init__(self)
+        self.__lib = lib
+        self.__tagNodes = {}  # bitmaps (bytearrays) or sets of node ids by tag id
+        self.__allNodes = bytearray()  # bitmap of ids of all existing nodes
+        self.__maxNodeId = 0
+        self.rebuild()
+
+        conn_type = Qt.DirectConnection
+        lib.linkCreated.connect(self.__onLinkCreated, conn_type)
+        lib.linkRemoved.connect(self.__onLinkRemoved, conn_type)
+        lib.nodeCreated.connect(self.__onNodeCreated, conn_type)
+        lib.nodeRemoved.connect(self.__onNodeRemoved, conn_type)
+        lib.tagRemoved.connect(self.__onTagRemoved, conn_type)
+        lib.resetted.connect(self.rebuild, conn_type)
+
+    @property
+    def lib(self):
+        return self.__lib
+
+    def close(self):
+        """Stop watching library changes"""
+
+        with self.lock:
+            self.__lib.linkCreated.disconnect(self.__onLinkCreated)
+            self.__lib.linkRemoved.disconnect(self.__onLinkRemoved)
+            self.__lib.nodeCreated.disconnect(self.__onNodeCreated)
+            self.__lib.nodeRemoved.disconnect(self.__onNodeRemoved)
+            self.__lib.tagRemoved.disconnect(self.__onTagRemoved)
+            self.__lib.resetted.disconnect(self.rebuild)
+            self.__tagNodes = {}
+            self.__allNodes = bytearray()
+
+    def rebuild(self):
+        """Build index from database contents"""
+
+        # library lock is taken first, as library holds it when emitting signals index handles
+        with self.__lib.lock, self.lock:
+            with self.__lib.cursor() as c:
+                c.execute('select id from nodes')
+                node_ids = [row[0] for row in c.fetchall()]
+                c.execute('select tag_id, node_id from links')
+                links = c.fetchall()
+
+            nodes_by_tag = {}
+            for tag_id, node_id in links:
+                nodes_by_tag.setdefault(tag_id, []).append(node_id)
+
+            self.__maxNodeId = max(node_ids) if node_ids else 0
+            self.__allNodes = _bytesFromIds(node_ids)
+            self.__tagNodes = {}
+            for tag_id, tag_node_ids in nodes_by_tag.items():
+                if self.__isDense(len(tag_node_ids)):
+                    self.__tagNodes[tag_id] = _bytesFromIds(tag_node_ids)
+                else:
+                    self.__tagNodes[tag_id] = set(tag_node_ids)
+
+    @property
+    def allNodes(self):
+        """Bitmap of ids of all nodes"""
+
+        with self.lock:
+            return int.from_bytes(self.__allNodes, 'little')
+
+    def nodesOfTags(self, tag_ids):
+        """Bitmap of ids of nodes linked with at least one of given tags"""
+
+        with self.lock:
+            bitmap, sparse_ids = 0, []
+            for tag_id in tag_ids:
+                tag_nodes = self.__tagNodes.get(tag_id)
+                if isinstance(tag_nodes, bytearray):
+                    bitmap |= int.from_bytes(tag_nodes, 'little')
+                elif tag_nodes:
+                    sparse_ids.extend(tag_nodes)
+            return bitmap | bitmapFromIds(sparse_ids) if sparse_ids else bitmap
+
+    def nodeBitmap(self, node_query):
+        """Evaluate query and return bitmap of ids of matching nodes. Returns None if query cannot be evaluated
+        by index.
+        """
+
+        with self.lock:
+            if node_query is None or node_query.qeval() == 0:
+                return 0
+            return node_query.nodeBitmap(self)
+
+    def nodeIds(self, node_query):
+        """Evaluate query and return sorted list of ids of matching nodes, or None if query cannot be evaluated
+        by index.
+        """
+
+        bitmap = self.nodeBitmap(node_query)
+        return idsFromBitmap(bitmap) if bitmap is not None else None
+
+    def __isDense(self, node_count):
+        return node_count > self.__maxNodeId * self.DenseRatio
+
+    def __onLinkCreated(self, node, tag):
+        with self.lock:
+            tag_nodes = self.__tagNodes.get(tag.id)
+            if isinstance(tag_nodes, bytearray):
+                _setBit(tag_nodes, node.id)
+            else:
+                if tag_nodes is None:
+                    tag_nodes = self.__tagNodes[tag.id] = set()
+                tag_nodes.add(node.id)
+                if self.__isDense(len(tag_nodes)):
+                    self.__tagNodes[tag.id] = _bytesFromIds(tag_nodes)
+
+    def __onLinkRemoved(self, node, tag):
+        with self.lock:
+            tag_nodes = self.__tagNodes.get(tag.id)
+            if isinstance(tag_nodes, bytearray):
+                # bitmap is kept even if it becomes empty, checking it would take time proportional to its size
+                _clearBit(tag_nodes, node.id)
+            elif tag_nodes is not None:
+                tag_nodes.discard(node.id)
+                if not tag_nodes:
+                    del self.__tagNodes[tag.id]
+
+    def __onNodeCreated(self, node):
+        with self.lock:
+            _setBit(self.__allNodes, node.id)
+            self.__maxNodeId = max(self.__maxNodeId, node.id)
+
+    def __onNodeRemoved(self, node):
+        with self.lock:
+            _clearBit(self.__allNodes, node.id)
+
+    def __onTagRemoved(self, tag):
+        with self.lock:
+            self.__tagNodes.pop(tag.id, None)
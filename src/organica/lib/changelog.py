@@ -0,0 +1,74 @@
+import copy
+
+
+class Change(object):
+    """Single entry of library change log. Library records a change each time meta, tag class, tag, node or
+    link is created, updated or removed. Changes are ordered by sequence number which is monotonically
+    increasing in scope of library that recorded the change.
+
+    Changes returned by Library.changesSince do not contain database ids of library that produced them,
+    but references in form of tuple (origin, id), where origin is uuid of library object was originally
+    created in and id is identifier of object in that library. This allows applying changes to another
+    library (see Library.applyChanges) which has own set of ids.
+        seq:        sequence number of change in source library.
+        source:     uuid of library that returned this change.
+        origin:     uuid of library where change was originally made.
+        objectType: one of META, TAG_CLASS, TAG, NODE, LINK constants.
+        action:     one of CREATE, UPDATE, REMOVE constants.
+        objectRef:  reference to changed object. Is None for metas and links.
+        data:       dictionary with object-type specific data:
+            META:       name, value
+            TAG_CLASS:  name, value_type, hidden
+            TAG:        class (reference), value_type, value (database form of value, reference for
+                        TYPE_NODE_REFERENCE values)
+            NODE:       display_name
+            LINK:       node (reference), tag (reference)
+    """
+
+    # values for Change.objectType
+    META, TAG_CLASS, TAG, NODE, LINK = range(5)
+
+    # values for Change.action
+    CREATE, UPDATE, REMOVE = range(3)
+
+    # keys of Change.data that hold references
+    _RefKeys = ('class', 'node', 'tag')
+
+    def __init__(self, seq=0, source='', origin='', object_type=META, action=CREATE, object_ref=None, data=None):
+        self.seq = seq
+        self.source = source
+        self.origin = origin
+        self.objectType = object_type
+        self.action = action
+        self.objectRef = object_ref
+        self.data = data or {}
+
+    def toDict(self):
+        """Dictionary that can be serialized to JSON to ship change to another machine."""
+
+        return {
+            'seq': self.seq,
+            'source': self.source,
+            'origin': self.origin,
+            'object_type': self.objectType,
+            'action': self.action,
+            'object_ref': self.objectRef,
+            'data': copy.deepcopy(self.data)
+        }
+
+    @staticmethod
+    def fromDict(d):
+        """Reverse of Change.toDict. JSON turns reference tuples into lists, so we convert them back."""
+
+        def to_ref(value):
+            return tuple(value) if isinstance(value, list) else value
+
+        data = dict(d.get('data') or {})
+        for key in Change._RefKeys:
+            if key in data:
+                data[key] = to_ref(data[key])
+        if 'value' in data:
+            data['value'] = to_ref(data['value'])
+
+        return Change(int(d['seq']), d['source'], d['origin'], int(d['object_type']), int(d['action']),
+                      to_ref(d.get('object_ref')), data)
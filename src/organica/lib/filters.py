@@ -14,6 +14,7 @@ class Wildcard(object):
 
     def __init__(self, pattern=''):
         self.pattern = pattern if not isinstance(pattern, Wildcard) else pattern.pattern
+        self.__regex = None  # tuple (pattern, compiled regular expression)
 
     def isEqual(self, text):
         """Check if given string matches pattern.
@@ -25,12 +26,17 @@ class Wildcard(object):
         if not text:
             return False
 
-        # generate regular expression we can use
-        # escape all regexp special chars except * and ?
-        pattern_re = helpers.escape(self.pattern, '[\\^$.|+()') + '$'
-        # and translate wildcard special chars to regexp
-        pattern_re = pattern_re.replace('*', '.*').replace('?', '.?')
-        return bool(re.compile(pattern_re, re.IGNORECASE).match(text))
+        return bool(self.__compiledRegex().match(text))
+
+    def __compiledRegex(self):
+        # regular expression is generated once and regenerated only if pattern was changed
+        if self.__regex is None or self.__regex[0] != self.pattern:
+            # escape all regexp special chars except * and ?
+            pattern_re = helpers.escape(self.pattern, '[\\^$.|+()') + '$'
+            # and translate wildcard special chars to regexp
+            pattern_re = pattern_re.replace('*', '.*').replace('?', '.?')
+            self.__regex = (self.pattern, re.compile(pattern_re, re.IGNORECASE))
+        return self.__regex[1]
 
     def __eq__(self, text):
         """Comparing with string will cause wildcard matching; comparing with another
@@ -126,10 +132,44 @@ def _equiv(expression):
     return copy.deepcopy(expression)
 
 
+class _Batch(object):
+    """List of objects evaluated by compiled filter predicates together (see AbstractFilter.compile) and results
+    of database lookups predicates made for these objects. Lookups are made once for batch instead of once for
+    each object. :objects: can be a callable returning list of objects, it is called on first access.
+    """
+
+    def __init__(self, objects):
+        self.__objects = objects
+        self.__cache = {}
+
+    @property
+    def objects(self):
+        if callable(self.__objects):
+            self.__objects = self.__objects()
+        return self.__objects
+
+    def cached(self, key, factory):
+        """Get value stored with :key: in batch. If there is no such value, it is created by calling :factory:
+        """
+
+        if key not in self.__cache:
+            self.__cache[key] = factory()
+        return self.__cache[key]
+
+
 class AbstractFilter(object):
     def __init__(self):
         pass
 
+    def compile(self):
+        """Get predicate function for this filter. Predicate is called as predicate(obj, batch) and returns
+        True if object passes filter, :batch: is _Batch the object belongs to. Values predicate depends on are
+        resolved once when filter is compiled. Default implementation calls passes.
+        """
+
+        passes = self.passes
+        return lambda obj, batch: passes(obj)
+
     def qeval(self):
         """Should return 1 if filter passes all tags, 0 if passes no tags, -1 in other cases.
         """
@@ -143,6 +183,18 @@ class AbstractFilter(object):
         else:
             return self._generateSql()
 
+    def nodeBitmap(self, index):
+        """Evaluate node filter with BitmapIndex :index: and return bitmap of ids of matching nodes. Returns None
+        if filter cannot be evaluated by index.
+        """
+        return None
+
+    def tagIds(self):
+        """Get set of ids of tags matching tag filter, if it is possible without querying database. Returns None
+        otherwise.
+        """
+        return None
+
 
 class _Filter_Disabled(AbstractFilter):
     """Disabled filter passes all tags.
@@ -151,9 +203,15 @@ class _Filter_Disabled(AbstractFilter):
     def passes(self, tag):
         return tag is not None
 
+    def compile(self):
+        return lambda obj, batch: obj is not None
+
     def qeval(self):
         return 1
 
+    def nodeBitmap(self, index):
+        return index.allNodes
+
     def debugRepr(self, indent):
         return (' ' * indent) + 'disabled'
 
@@ -165,9 +223,18 @@ class _Filter_Block(AbstractFilter):
     def passes(self, obj):
         return False
 
+    def compile(self):
+        return lambda obj, batch: False
+
     def qeval(self):
         return 0
 
+    def nodeBitmap(self, index):
+        return 0
+
+    def tagIds(self):
+        return set()
+
     def debugRepr(self, indent):
         return (' ' * indent) + 'blocked'
 
@@ -178,6 +245,19 @@ class _Twin_Filter(AbstractFilter):
         self.left = _equiv(left)
         self.right = _equiv(right)
 
+    def _operands(self):
+        """Get list of operands of this filter and of nested filters of same type, so chain of filters can be
+        evaluated in one loop.
+        """
+
+        operands = []
+        for operand in (self.left, self.right):
+            if type(operand) is type(self):
+                operands.extend(operand._operands())
+            else:
+                operands.append(operand)
+        return operands
+
 
 class _Filter_And(_Twin_Filter):
     """This filter is TRUE only when :left: and :right: filters are TRUE.
@@ -189,6 +269,19 @@ class _Filter_And(_Twin_Filter):
 
         return self.left.passes(obj) and self.right.passes(obj)
 
+    def compile(self):
+        # disabled filters pass all objects that are not None, and this is checked anyway
+        predicates = [operand.compile() for operand in self._operands() if not isinstance(operand, _Filter_Disabled)]
+
+        def predicate(obj, batch):
+            if obj is None:
+                return False
+            for operand_predicate in predicates:
+                if not operand_predicate(obj, batch):
+                    return False
+            return True
+        return predicate
+
     def _generateSql(self):
         if self.left.qeval() == -1 and self.right.qeval() == -1:
             return '({0}) and ({1})'.format(self.left.generateSql(), self.right.generateSql())
@@ -208,6 +301,16 @@ class _Filter_And(_Twin_Filter):
         else:
             return -1
 
+    def nodeBitmap(self, index):
+        left = self.left.nodeBitmap(index)
+        right = self.right.nodeBitmap(index) if left is not None else None
+        return left & right if right is not None else None
+
+    def tagIds(self):
+        left = self.left.tagIds()
+        right = self.right.tagIds() if left is not None else None
+        return left & right if right is not None else None
+
     def debugRepr(self, indent):
         return (' ' * indent) + 'AND\n' + self.left.debugRepr(indent + 1) + '\n' + self.right.debugRepr(indent + 1)
 
@@ -231,6 +334,18 @@ class _Filter_Or(_Twin_Filter):
 
         return self.left.passes(obj) or self.right.passes(obj)
 
+    def compile(self):
+        predicates = [operand.compile() for operand in self._operands() if not isinstance(operand, _Filter_Block)]
+
+        def predicate(obj, batch):
+            if obj is None:
+                return False
+            for operand_predicate in predicates:
+                if operand_predicate(obj, batch):
+                    return True
+            return False
+        return predicate
+
     def _generateSql(self):
         if self.left.qeval() == -1 and self.right.qeval() == -1:
             return '({0}) or ({1})'.format(self.left.generateSql(), self.right.generateSql())
@@ -250,6 +365,16 @@ class _Filter_Or(_Twin_Filter):
         else:
             return -1
 
+    def nodeBitmap(self, index):
+        left = self.left.nodeBitmap(index)
+        right = self.right.nodeBitmap(index) if left is not None else None
+        return left | right if right is not None else None
+
+    def tagIds(self):
+        left = self.left.tagIds()
+        right = self.right.tagIds() if left is not None else None
+        return left | right if right is not None else None
+
     def debugRepr(self, indent):
         return (' ' * indent) + 'OR\n' + self.left.debugRepr(indent + 1) + '\n' + self.right.debugRepr(indent + 1)
 
@@ -276,9 +401,17 @@ class _Filter_Not(AbstractFilter):
 
         return not self.__expr.passes(obj)
 
+    def compile(self):
+        expr = self.__expr.compile()
+        return lambda obj, batch: obj is not None and not expr(obj, batch)
+
     def _generateSql(self):
         return 'not ({0})'.format(self.__expr.generateSql())
 
+    def nodeBitmap(self, index):
+        expr = self.__expr.nodeBitmap(index)
+        return index.allNodes & ~expr if expr is not None else None
+
     def qeval(self):
         expr_q = self.__expr.qeval()
         if expr_q == 0:
@@ -308,6 +441,16 @@ class _Tag_Class(AbstractFilter):
         else:
             return helpers.cicompare(tag.className, self.tagClass)
 
+    def compile(self):
+        tag_class = self.tagClass
+        if isinstance(tag_class, (Identity, TagClass)):
+            return lambda tag, batch: tag is not None and tag.tagClass == tag_class
+        elif isinstance(tag_class, Wildcard):
+            return lambda tag, batch: tag is not None and tag_class.isEqual(tag.className)
+        else:
+            class_name = helpers.uncase(tag_class)
+            return lambda tag, batch: tag is not None and helpers.uncase(tag.className) == class_name
+
     def _generateSql(self):
         if isinstance(self.tagClass, (Identity, TagClass)):
             if self.tagClass.isFlushed:
@@ -339,6 +482,9 @@ class _Tag_Identity(AbstractFilter):
     def qeval(self):
         return 0 if not self.identity.isFlushed else -1
 
+    def tagIds(self):
+        return set((self.identity.id, )) if self.identity.isFlushed else set()
+
     def debugRepr(self, indent):
         return (' ' * indent) + 'identity = ' + str(self.identity.id)
 
@@ -357,6 +503,17 @@ class _Tag_Text(AbstractFilter):
         else:
             return helpers.cicompare(self.text, tag.value.text)
 
+    def compile(self):
+        if isinstance(self.text, Wildcard):
+            matches = self.text.isEqual
+        else:
+            folded_text = helpers.uncase(self.text)
+            matches = lambda text: helpers.uncase(text) == folded_text
+
+        def predicate(tag, batch):
+            return tag is not None and tag.value.valueType == TagValue.TYPE_TEXT and matches(tag.value.text)
+        return predicate
+
     def _generateSql(self):
         return 'value_type = {0} and {1} collate strict_nocase' .format(TagValue.TYPE_TEXT, generateSqlCompare('value', self.text))
 
@@ -389,6 +546,14 @@ class _Tag_Number(AbstractFilter):
         return tag is not None and tag.value.valueType == TagValue.TYPE_NUMBER and \
                 op_func(tag.value.number, self.number)
 
+    def compile(self):
+        op_func, number = getattr(operator, self.op), self.number
+
+        def predicate(tag, batch):
+            return tag is not None and tag.value.valueType == TagValue.TYPE_NUMBER and \
+                    op_func(tag.value.number, number)
+        return predicate
+
     def _generateSql(self):
         return "value_type = {0} and value {1} {2}".format(TagValue.TYPE_NUMBER, _Tag_Number.op_map[self.op], self.number)
 
@@ -426,7 +591,8 @@ class _Tag_Object(AbstractFilter):
         return tag is not None and tag.value.nodeReference == self.nodeReference
 
     def _generateSql(self):
-        return 'value_type = {0} and value = {1}'.format(TagValue.TYPE_NODE_REFERENCE, self.nodeReference.id)
+        # identities of referenced nodes are stored as text
+        return "value_type = {0} and value = '{1}'".format(TagValue.TYPE_NODE_REFERENCE, self.nodeReference.id)
 
     def qeval(self):
         return 0 if not self.nodeReference.isFlushed else -1
@@ -497,6 +663,24 @@ class _Tag_Unused(AbstractFilter):
 
         return not tag.lib.nodes(NodeQuery(tags=tag).limit(1))
 
+    def compile(self):
+        def predicate(tag, batch):
+            if tag is None or not tag.isFlushed:
+                return False
+            elif len(batch.objects) == 1:
+                return self.passes(tag)
+
+            # one query for all tags of batch instead of query for each tag
+            lib = tag.lib
+
+            def unusedIds():
+                batch_ids = set(t.id for t in batch.objects if t is not None and t.isFlushed and t.lib == lib)
+                return set(row[0] for row in lib._selectInChunks('select id from tags where id in ({0}) and '
+                                                                 'id not in (select tag_id from links)', batch_ids))
+
+            return tag.id in batch.cached((self, lib), unusedIds)
+        return predicate
+
     def _generateSql(self):
         return 'id not in (select distinct tag_id from links)'
 
@@ -516,6 +700,15 @@ class _Tag_LinkedWith(AbstractFilter):
         obj = self.node.lib.node(self.node)
         return obj is not None and obj.testTag(tag)
 
+    def compile(self):
+        node_identity = self.node
+
+        def predicate(tag, batch):
+            # node is fetched from library once for batch
+            obj = batch.cached(self, lambda: node_identity.lib.node(node_identity))
+            return tag is not None and obj is not None and obj.testTag(tag)
+        return predicate
+
     def _generateSql(self):
         return 'id in (select tag_id from links where node_id = {0})'.format(self.node.id)
 
@@ -555,6 +748,24 @@ class _Tag_FriendOf(AbstractFilter):
 
         return tag.lib == self.tag.lib and tag.isFriendOf(self.tag)
 
+    def compile(self):
+        if self.qeval() == 0:
+            return lambda tag, batch: False
+
+        friend = self.tag
+
+        def friendIds():
+            # tag is always friend of itself, even if it is not linked to any node
+            return set(t.id for t in friend.lib.tags(TagQuery(friend_of=friend))) | set((friend.id, ))
+
+        def predicate(tag, batch):
+            if tag is None or not tag.isFlushed or tag.lib != friend.lib:
+                return False
+            elif len(batch.objects) == 1:
+                return tag.isFriendOf(friend)
+            return tag.id in batch.cached(self, friendIds)
+        return predicate
+
     def _generateSql(self):
         return 'id in (select tag_id from links where node_id in (select node_id from links where tag_id = {0}))' \
                .format(self.tag.id)
@@ -605,6 +816,38 @@ class _Node_DisplayName(AbstractFilter):
         return (' ' * indent) + 'display name = ' + str(self.displayName)
 
 
+class _Node_Name(AbstractFilter):
+    def __init__(self, name):
+        AbstractFilter.__init__(self)
+        self.name = name
+
+    def passes(self, obj):
+        if obj is None:
+            return False
+        elif isinstance(self.name, Wildcard):
+            return self.name == obj.displayName
+        return helpers.uncase(self.name or '') == helpers.uncase(obj.displayName)
+
+    def compile(self):
+        if isinstance(self.name, Wildcard):
+            name = self.name
+            return lambda obj, batch: obj is not None and name.isEqual(obj.displayName)
+        folded_name = helpers.uncase(self.name or '')
+        return lambda obj, batch: obj is not None and helpers.uncase(obj.displayName) == folded_name
+
+    def _generateSql(self):
+        # rendered names are stored in casefolded form too
+        if isinstance(self.name, Wildcard):
+            return generateSqlCompare('rendered_key', Wildcard(helpers.uncase(self.name.pattern)))
+        return generateSqlCompare('rendered_key', helpers.uncase(self.name or ''))
+
+    def qeval(self):
+        return -1
+
+    def debugRepr(self, indent):
+        return (' ' * indent) + 'name = ' + str(self.name)
+
+
 class _Node_Identity(AbstractFilter):
     def __init__(self, obj):
         AbstractFilter.__init__(self)
@@ -619,6 +862,9 @@ class _Node_Identity(AbstractFilter):
     def qeval(self):
         return 0 if not self.identity.isFlushed else -1
 
+    def nodeBitmap(self, index):
+        return index.allNodes & (1 << self.identity.id) if self.identity.isFlushed else 0
+
     def debugRepr(self, indent):
         return (' ' * indent) + str(self.identity.id)
 
@@ -634,13 +880,42 @@ class _Node_Tags(AbstractFilter):
     def passes(self, obj):
         return obj is not None and obj.testTag(self.tagFilter)
 
+    def compile(self):
+        tag_predicate = self.tagFilter.compile()
+
+        def tagBatch(batch):
+            # tags of nodes that are not fetched yet are fetched with one query for each library
+            to_fetch = {}  # map library to list of nodes
+            for node in batch.objects:
+                if node is not None and node.isFlushed and not node.tagsFetched:
+                    to_fetch.setdefault(node.lib, []).append(node)
+            for lib, nodes in to_fetch.items():
+                tags_by_node = lib.tagsByNode(node.id for node in nodes)
+                for node in nodes:
+                    node.allTags = tags_by_node.get(node.id, [])
+
+            # tags of all nodes of batch are evaluated as one batch
+            return _Batch([tag for node in batch.objects if node is not None for tag in node.allTags])
+
+        def predicate(obj, batch):
+            if obj is None:
+                return False
+            tag_batch = batch.cached(self, lambda: tagBatch(batch))
+            return any(tag_predicate(tag, tag_batch) for tag in obj.allTags)
+        return predicate
+
     def _generateSql(self):
         return ('id in (select node_id from links where tag_id in '
-                + '(select id from tags where {0}))').format(self.tagFilter.generateSqlWhere())
+                + '(select id from tags where {0}{1}))').format(self.tagFilter.generateSqlWhere(),
+                                                              self.tagFilter.generateSqlTail())
 
     def qeval(self):
         return self.tagFilter.qeval()
 
+    def nodeBitmap(self, index):
+        tag_ids = self.tagFilter.tagIds()
+        return index.nodesOfTags(tag_ids) if tag_ids is not None else None
+
     def debugRepr(self, indent):
         return (' ' * indent) + 'has tags\n' + self.tagFilter.debugRepr(indent + 1)
 
@@ -663,10 +938,17 @@ class _Query(object):
     """Base class for TagQuery and NodeQuery classes.
     """
 
+    # table queried objects are stored in and map of sort keys to columns of this table
+    _table = ''
+    _orderColumns = {}
+
     def __init__(self, filter):
         self.__filter = _equiv(filter)
         self.__limit = -1
         self.__offset = 0
+        self.__orderBy = []  # list of tuples (key, descending)
+        self.__after = None  # identity of last object of previous page
+        self.__predicate = None  # compiled filter, see compile
         self.hint = None
 
     def limit(self, limit_count):
@@ -685,6 +967,76 @@ class _Query(object):
         q.__offset = offset_count
         return q
 
+    def orderBy(self, *keys):
+        """Make results sorted by given keys. Key is name of sorting criteria, results are sorted in descending
+        order by keys prefixed with minus sign (for example, '-use_count'). Allowed keys are listed in
+        docstrings of derived classes. Results with equal keys are sorted by id, so order is always stable.
+        Replaces sorting keys set before.
+        """
+
+        order = []
+        for key in keys:
+            descending = key.startswith('-')
+            if descending:
+                key = key[1:]
+            if self._orderExpression(key) is None:
+                raise TypeError('unknown sort key: {0}'.format(key))
+            order.append((key, descending))
+
+        q = copy.deepcopy(self)
+        q.__orderBy = order
+        return q
+
+    def after(self, cursor):
+        """Make query to match only results that follow :cursor: in query sort order (keyset pagination).
+        :cursor: is object (or identity of object) that was last on previous page, it should exist in database.
+        Unlike offset, database does not skip results of previous pages, so fetching next page takes same time
+        regardless of its position. Condition is checked only by database, passes method ignores it.
+        """
+
+        identity = get_identity(cursor)
+        if identity is None or not identity.isFlushed:
+            raise TypeError('invalid argument: cursor')
+
+        q = copy.deepcopy(self)
+        q.__after = identity
+        return q
+
+    def _orderExpression(self, key, row_id=None):
+        """Get SQL expression evaluating to sort key value for row with id :row_id:. If :row_id: is None,
+        expression is evaluated for current row of query. Returns None for unknown keys.
+        """
+
+        column = self._orderColumns.get(key)
+        if column is None:
+            return None
+        elif row_id is None:
+            return '{0}.{1}'.format(self._table, column)
+        return '(select {1} from {0} where id = {2})'.format(self._table, column, row_id)
+
+    def __sortKeys(self):
+        keys = list(self.__orderBy)
+        # id is added to make order stable
+        if not any(key == 'id' for key, descending in keys):
+            keys.append(('id', keys[-1][1] if keys else False))
+        return keys
+
+    def __generateSqlKeyset(self):
+        keys = self.__sortKeys()
+        current = [self._orderExpression(key) for key, descending in keys]
+        last = [self._orderExpression(key, self.__after.id) for key, descending in keys]
+
+        if all(descending == keys[0][1] for key, descending in keys):
+            # row values comparision can be optimized with index
+            return '({0}) {1} ({2})'.format(', '.join(current), '<' if keys[0][1] else '>', ', '.join(last))
+
+        conditions = []
+        for index, (key, descending) in enumerate(keys):
+            terms = ['{0} = {1}'.format(current[i], last[i]) for i in range(index)]
+            terms.append('{0} {1} {2}'.format(current[index], '<' if descending else '>', last[index]))
+            conditions.append(' and '.join(terms))
+        return ' or '.join('({0})'.format(condition) for condition in conditions)
+
     def __and__(self, other):
         """AND's filters of two queries. Other parameters (limit, offset) are get from
         first query filter.
@@ -692,6 +1044,7 @@ class _Query(object):
 
         q = copy.deepcopy(self)
         q.__filter = _Filter_And(self.__filter, other.__filter)
+        q.__predicate = None
         return q
 
     def __or__(self, other):
@@ -701,6 +1054,7 @@ class _Query(object):
 
         q = copy.deepcopy(self)
         q.__filter = _Filter_Or(self.__filter, other.__filter)
+        q.__predicate = None
         return q
 
     def __invert__(self):
@@ -709,27 +1063,90 @@ class _Query(object):
 
         q = copy.deepcopy(self)
         q.__filter = _Filter_Not(self.__filter)
+        q.__predicate = None
         return q
 
+    def compile(self):
+        """Get predicate of query filter (see AbstractFilter.compile). Filter is compiled on first call only.
+        """
+
+        if self.__predicate is None:
+            self.__predicate = self.__filter.compile()
+        return self.__predicate
+
     def passes(self, lib_object):
-        return self.__filter.passes(lib_object)
+        return self.compile()(lib_object, _Batch((lib_object, )))
+
+    def passesMany(self, lib_objects):
+        """Check each object of given sequence and return list of results in same order. Database lookups
+        made for conditions like unused, linked_with or friend_of are made once for all objects.
+        """
+
+        lib_objects = list(lib_objects)
+        predicate, batch = self.compile(), _Batch(lib_objects)
+        return [predicate(obj, batch) for obj in lib_objects]
 
     def generateSqlWhere(self):
-        q = self.__filter.generateSql()
-        if self.__limit >= 0:
-            q = q + ' limit ' + str(self.__limit)
-        if self.__offset:
-            q = q + ' offset ' + str(self.__offset)
+        """Generate condition for WHERE clause. Sorting and limits are generated by generateSqlTail."""
+
+        if self.__after is None:
+            return self.__filter.generateSql()
+        elif self.__filter.qeval() == 1:
+            return self.__generateSqlKeyset()
+        return '({0}) and ({1})'.format(self.__filter.generateSql(), self.__generateSqlKeyset())
+
+    def generateSqlTail(self):
+        """Generate ORDER BY, LIMIT and OFFSET clauses that should follow WHERE clause. Returns empty string if
+        query has no sorting and limits, otherwise string starts with space.
+        """
+
+        q = ''
+        if self.__orderBy or self.__after is not None:
+            q += ' order by ' + ', '.join(self._orderExpression(key) + (' desc' if descending else '')
+                                          for key, descending in self.__sortKeys())
+        if self.__limit >= 0 or self.__offset:
+            q += ' limit ' + str(self.__limit)
+            if self.__offset:
+                q += ' offset ' + str(self.__offset)
         return q
 
     def qeval(self):
-        return self.__filter.qeval()
+        q = self.__filter.qeval()
+        return -1 if q == 1 and self.__after is not None else q
+
+    def nodeBitmap(self, index):
+        """Evaluate query with BitmapIndex :index:, see AbstractFilter.nodeBitmap. Queries with sorting and limits
+        cannot be evaluated by index.
+        """
+
+        if self.generateSqlTail():
+            return None
+        return self.__filter.nodeBitmap(index)
+
+    def tagIds(self):
+        """See AbstractFilter.tagIds"""
+
+        if self.generateSqlTail():
+            return None
+        return self.__filter.tagIds()
 
     def debugRepr(self):
         return self.__filter.debugRepr(0)
 
 
 class TagQuery(_Query):
+    """Query for tags. Results can be sorted (see orderBy) by keys: id, value, tag_class (class id) and
+    use_count.
+    """
+
+    _table = 'tags'
+    _orderColumns = {
+        'id': 'id',
+        'value': 'value',
+        'tag_class': 'class_id',
+        'use_count': 'use_count'
+    }
+
     def __init__(self, **kwargs):
         _Query.__init__(self, self.__getFilter(**kwargs))
 
@@ -793,6 +1210,17 @@ class TagQuery(_Query):
 
 
 class NodeQuery(_Query):
+    """Query for nodes. Results can be sorted (see orderBy) by keys: id, name (rendered display name, not case
+    sensitive) and tag_xx, where xx is tag class name. Nodes are sorted by least value of tags of this class,
+    nodes without such tags are placed after all others.
+    """
+
+    _table = 'nodes'
+    _orderColumns = {
+        'id': 'id',
+        'name': 'rendered_key'
+    }
+
     def __init__(self, **kwargs):
         _Query.__init__(self, self.__getFilter(**kwargs))
 
@@ -800,6 +1228,8 @@ class NodeQuery(_Query):
         """Get new query with filters AND'ed with filters of this query. Allowed arguments:
         display_name:    matches nodes with given display name template. Can use string or Wildcard
                          as argument.
+        name:            matches nodes with given rendered display name (not case sensitive). Can use
+                         string or Wildcard as argument.
         identity:        matches nodes with given identity.
         tags:            matches nodes which have linked at least one tag satisfying given
                          condition.
@@ -812,8 +1242,18 @@ class NodeQuery(_Query):
         q.__filter = self.__getFilter(**kwargs)
         return q
 
+    def _orderExpression(self, key, row_id=None):
+        if key.startswith('tag_') and len(key) > 4:
+            # empty blob is greater than any text or number
+            return ("coalesce((select min(tags.value) from links inner join tags on tags.id = links.tag_id "
+                    "where links.node_id = {0} and links.tag_class_id in "
+                    "(select id from tag_classes where name = '{1}')), x'')").format(
+                        row_id if row_id is not None else 'nodes.id', _sqlEqualForm(key[4:]))
+        return _Query._orderExpression(self, key, row_id)
+
     __args_map = {
         'display_name': _Node_DisplayName,
+        'name': _Node_Name,
         'identity': _Node_Identity,
         'tags': _Node_Tags,
         'linked_with': _Node_Tags
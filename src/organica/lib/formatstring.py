@@ -1,7 +1,9 @@
 import string
 import logging
+import functools
 from PyQt4.QtCore import QFileInfo
 import organica.utils.helpers as helpers
+from organica.lib.objects import TagValue, Identity, get_identity
 
 
 logger = logging.getLogger(__name__)
@@ -11,6 +13,10 @@ class ParseError(Exception):
     pass
 
 
+# maximal number of compiled templates kept by compileTemplate
+TemplateCacheSize = 1000
+
+
 class FormatStringToken:
     def __init__(self):
         self.start = 0
@@ -92,15 +98,19 @@ class FormatString:
     When parsing format strings for tag value locators, @source block is usually defined.
     This block is replaced with value of Locator.source
 
+    Template is compiled into CompiledTemplate on first call to format. Templates that use only predefined
+    special blocks share compiled objects cached by compileTemplate.
     """
 
-    __known_params = ['default', 'none', 'max', 'sort', 'separator', 'end', 'locator']
+    _known_params = ['default', 'none', 'max', 'sort', 'separator', 'end', 'locator']
+
+    _predefined_blocks = {
+        '@': (lambda obj, token: [obj.displayNameTemplate]),
+        '@name': (lambda obj, token: [obj.displayNameTemplate])
+    }
 
     def __init__(self, template=''):
-        self.custom_blocks = {
-            '@': (lambda obj, token: [obj.displayNameTemplate]),
-            '@name': (lambda obj, token: [obj.displayNameTemplate])
-        }
+        self.custom_blocks = dict(FormatString._predefined_blocks)
 
         if isinstance(template, FormatString):
             self.__template = template.template
@@ -111,6 +121,7 @@ class FormatString:
             self.__tokens = []
             self.__parsed = False
         self.__tail, self.__head = 0, 0
+        self.__compiled = None  # tuple of custom blocks and template compiled with these blocks
 
     @property
     def template(self):
@@ -121,6 +132,7 @@ class FormatString:
         if self.__template != value:
             self.__template = value
             self.__parsed = False
+            self.__compiled = None
 
     @property
     def tokens(self):
@@ -197,99 +209,35 @@ class FormatString:
         if block_name in self.custom_blocks:
             del self.custom_blocks[block_name]
 
-    def __tagValue(self, tag_value, block):
-        from organica.lib.objects import TagValue
-
-        if tag_value.valueType == TagValue.TYPE_TEXT:
-            return tag_value.text
-        elif tag_value.valueType == TagValue.TYPE_NUMBER:
-            return str(tag_value.number)
-        elif tag_value.valueType == TagValue.TYPE_LOCATOR:
-            url = tag_value.locator.url
-            mode = block.getParam('locator', 'url').lower()
-            if mode == 'url':
-                return url.toString()
-            elif mode == 'scheme':
-                return url.scheme()
-            elif mode == 'path':
-                return url.toLocalFile if url.isLocalFile() else url.path()
-            elif mode == 'name':
-                # get not fileName(), but last component of path.
-                return QFileInfo(helpers.removeLastSlash(url.toLocalFile())).fileName() if url.isLocalFile() else ''
-            elif mode == 'basename':
-                return QFileInfo(url.toLocalFile()).baseName() if url.isLocalFile() else ''
-            elif mode == 'ext' or mode == 'extension':
-                return QFileInfo(url.toLocalFile()).suffix() if url.isLocalFile() else ''
-            else:
-                raise ParseError('unknown value for "locator" parameter: {0}'.format(mode))
-        elif tag_value.valueType == TagValue.TYPE_NODE_REFERENCE:
-            node_identity = tag_value.nodeReference
-            if node_identity.isFlushed:
-                return node_identity.lib.object(node_identity).displayNameTemplate
-            else:
-                return ''
-        elif tag_value.valueType == TagValue.TYPE_NONE:
-            return block.params.get('none', '')
-        else:
-            return ''
-
-    def format(self, obj):
-        from organica.lib.filters import TagQuery
-        from organica.lib.objects import TagValue
-
-        self.__parse()
-
-        formatted = ''
-        for token in self.__tokens:
-            if not token.isBlock:
-                formatted = formatted + token.value
-            else:
-                # find tag with this name first
-                values = None
-                if token.value.startswith('@'):
-                    if token.value not in self.custom_blocks:
-                        raise ParseError('unknown special block: {0}'.format(token.value))
-                    values = self.custom_blocks[token.value](obj, token)
-                else:
-                    values = [tag.value for tag in obj.tags(TagQuery(tag_class=token.value))]
-
-                values = [self.__tagValue(TagValue(v), token) for v in values]
-
-                # find unknown parameters for standard blocks
-                for param in token.params.keys():
-                    if param not in FormatString.__known_params:
-                        logger.warn('unknown parameter: {0} in "{1}"'.format(param, self.template))
-
-                if not values:
-                    values = [token.getParam('default', '')]
+    def compile(self):
+        """Get CompiledTemplate for this format string. If no custom blocks are registered, compiled
+        template is taken from process-wide cache.
+        """
 
-                sort = token.getParam('sort', 'asc')
-                if sort.lower() in ('asc', 'desc'):
-                    values = sorted(values, key=str.lower, reverse=(sort.lower() == 'desc'))
-                else:
-                    raise ParseError('only allowed values for "sort" parameter are "asc" and "desc"')
+        if self.custom_blocks == FormatString._predefined_blocks:
+            return compileTemplate(self.template)
 
-                if len(values) == 1:
-                    formatted += str(values[0])
-                else:
-                    overcount = False
-                    try:
-                        max_items = int(token.getParam('max', 7))
-                    except ValueError:
-                        raise ParseError('number excepted for "max" parameter value')
+        if self.__compiled is None or self.__compiled[0] != self.custom_blocks:
+            self.__compiled = (dict(self.custom_blocks), CompiledTemplate(self.tokens, self.custom_blocks,
+                                                                          self.template))
+        return self.__compiled[1]
 
-                    if 0 < max_items < len(values):
-                        values = values[:max_items]
-                        overcount = True
+    def format(self, obj, values_by_class=None):
+        """Generate text for given object. If :values_by_class: is given, it should be dictionary returned
+        by tagValuesByClass for this object, and tags linked to object will not be accessed.
+        """
 
-                    end = str(token.getParam('end', '...'))
-                    separator = str(token.getParam('separator', ', '))
+        return self.compile().render(obj, values_by_class)
 
-                    formatted += separator.join(values)
-                    if overcount:
-                        formatted += end
+    def formatMany(self, nodes, connection=None):
+        """Generate text for each node in list. Values of tags from classes used in template are fetched
+        for all nodes at once (only for flushed nodes which tags are not fetched yet), and nodes referenced
+        by tag values are resolved in bulk too. Returns list of strings in same order as nodes.
+        :connection: is passed to Library.tagValuesByNode.
+        """
 
-        return formatted
+        compiled = self.compile()
+        return renderMany([compiled] * len(nodes), nodes, connection)
 
     @staticmethod
     def buildFromTokens(token_list):
@@ -458,3 +406,218 @@ class FormatString:
         elif head != tail:
             result_text += text[tail:head]
         return result_text
+
+
+def tagValuesByClass(tags):
+    """Get dictionary mapping tag class names (converted with helpers.uncase) to lists of values of given
+    tags. Used to render CompiledTemplate without scanning list of tags for each block.
+    """
+
+    values_by_class = {}
+    for tag in tags:
+        values_by_class.setdefault(helpers.uncase(tag.className), []).append(tag.value)
+    return values_by_class
+
+
+def displayNames(nodes, connection=None):
+    """Bulk equivalent of getting Node.displayName for each node in list. See FormatString.formatMany."""
+
+    return renderMany([compileTemplate(node.displayNameTemplate) for node in nodes], nodes, connection)
+
+
+def renderMany(templates, nodes, connection=None):
+    """Render each of compiled templates for node at same position, fetching tags in bulk. Tags already
+    fetched by nodes are used as is.
+    """
+
+    class_names = set()
+    for compiled in set(templates):
+        class_names |= compiled.classNames
+
+    all_values = [None] * len(nodes)
+    if class_names:
+        to_fetch = {}  # map library to list of positions of nodes which tags should be fetched
+        for position, (compiled, node) in enumerate(zip(templates, nodes)):
+            if compiled.usesTags:
+                if node.isFlushed and not node.tagsFetched:
+                    to_fetch.setdefault(node.lib, []).append(position)
+                else:
+                    all_values[position] = tagValuesByClass(node.allTags)
+
+        for lib, positions in to_fetch.items():
+            fetched = lib.tagValuesByNode([nodes[position].id for position in positions], class_names, connection)
+            for position in positions:
+                all_values[position] = fetched.get(nodes[position].id, {})
+
+    # collect referenced nodes to get their names with one query for each library
+    references = {}  # map library to set of node ids
+    for values_by_class in all_values:
+        if values_by_class:
+            for values in values_by_class.values():
+                for value in values:
+                    if value.valueType == TagValue.TYPE_NODE_REFERENCE and value.value.isFlushed:
+                        references.setdefault(value.value.lib, set()).add(value.value.id)
+
+    node_names = {}
+    for lib, node_ids in references.items():
+        for node_id, name in lib.nodeDisplayNames(node_ids, connection).items():
+            node_names[Identity(lib, node_id)] = name
+
+    return [compiled.render(node, values_by_class, node_names)
+            for compiled, node, values_by_class in zip(templates, nodes, all_values)]
+
+
+def _valueText(tag_value, block, node_names=None):
+    value_type = tag_value.valueType
+    if value_type == TagValue.TYPE_TEXT:
+        return tag_value.value
+    elif value_type == TagValue.TYPE_NUMBER:
+        return str(tag_value.value)
+    elif value_type == TagValue.TYPE_LOCATOR:
+        url = tag_value.locator.url
+        mode = block.locatorMode
+        if mode == 'url':
+            return url.toString()
+        elif mode == 'scheme':
+            return url.scheme()
+        elif mode == 'path':
+            return url.toLocalFile() if url.isLocalFile() else url.path()
+        elif mode == 'name':
+            # get not fileName(), but last component of path.
+            return QFileInfo(helpers.removeLastSlash(url.toLocalFile())).fileName() if url.isLocalFile() else ''
+        elif mode == 'basename':
+            return QFileInfo(url.toLocalFile()).baseName() if url.isLocalFile() else ''
+        elif mode == 'ext' or mode == 'extension':
+            return QFileInfo(url.toLocalFile()).suffix() if url.isLocalFile() else ''
+        else:
+            raise ParseError('unknown value for "locator" parameter: {0}'.format(mode))
+    elif value_type == TagValue.TYPE_NODE_REFERENCE:
+        node_identity = get_identity(tag_value.nodeReference)
+        if not node_identity.isFlushed:
+            return ''
+        elif node_names is not None:
+            return node_names.get(node_identity, '')
+        else:
+            node = node_identity.lib.node(node_identity)
+            return node.displayNameTemplate if node is not None else ''
+    elif value_type == TagValue.TYPE_NONE:
+        return block.none
+    else:
+        return ''
+
+
+class _CompiledBlock(object):
+    """Block of compiled template. Parameters are converted and checked once at compilation."""
+
+    __slots__ = ('token', 'className', 'callback', 'default', 'none', 'maxItems', 'reverse', 'separator', 'end',
+                 'locatorMode')
+
+    def __init__(self, token, custom_blocks, template):
+        self.token = token
+        if token.value.startswith('@'):
+            if token.value not in custom_blocks:
+                raise ParseError('unknown special block: {0}'.format(token.value))
+            self.className, self.callback = None, custom_blocks[token.value]
+        else:
+            self.className, self.callback = helpers.uncase(token.value), None
+
+        # find unknown parameters for standard blocks
+        for param in token.params.keys():
+            if param not in FormatString._known_params:
+                logger.warn('unknown parameter: {0} in "{1}"'.format(param, template))
+
+        self.default = token.getParam('default', '')
+        self.none = token.getParam('none', '')
+
+        sort = token.getParam('sort', 'asc')
+        if sort.lower() not in ('asc', 'desc'):
+            raise ParseError('only allowed values for "sort" parameter are "asc" and "desc"')
+        self.reverse = sort.lower() == 'desc'
+
+        try:
+            self.maxItems = int(token.getParam('max', 7))
+        except ValueError:
+            raise ParseError('number excepted for "max" parameter value')
+
+        self.end = str(token.getParam('end', '...'))
+        self.separator = str(token.getParam('separator', ', '))
+        self.locatorMode = str(token.getParam('locator', 'url')).lower()
+
+    def render(self, obj, values_by_class, node_names=None):
+        if self.callback is not None:
+            values = self.callback(obj, self.token)
+            if isinstance(values, str):
+                values = [values]
+            values = [v if isinstance(v, TagValue) else TagValue(v) for v in values]
+        else:
+            values = values_by_class.get(self.className, ())
+
+        values = [_valueText(v, self, node_names) for v in values]
+
+        if not values:
+            return str(self.default)
+        elif len(values) == 1:
+            return str(values[0])
+
+        values.sort(key=str.lower, reverse=self.reverse)
+        if 0 < self.maxItems < len(values):
+            return self.separator.join(values[:self.maxItems]) + self.end
+        return self.separator.join(values)
+
+
+class CompiledTemplate(object):
+    """Template parsed and prepared for rendering. Do not create objects of this class directly,
+    use FormatString.compile or compileTemplate instead. Compiled template does not change after creation,
+    so it can be shared between threads.
+    """
+
+    def __init__(self, tokens, custom_blocks, template=''):
+        self.template = template
+        self.__parts = []  # literal strings and _CompiledBlock objects
+        for token in tokens:
+            if token.isBlock:
+                self.__parts.append(_CompiledBlock(token, custom_blocks, template))
+            elif self.__parts and isinstance(self.__parts[-1], str):
+                self.__parts[-1] += token.value
+            else:
+                self.__parts.append(token.value)
+
+        self.__classNames = frozenset(part.className for part in self.__parts
+                                      if isinstance(part, _CompiledBlock) and part.className is not None)
+        # text of template without blocks does not depend on object
+        self.__static = ''.join(self.__parts) if all(isinstance(part, str) for part in self.__parts) else None
+
+    @property
+    def usesTags(self):
+        """True if rendered text depends on tags linked to object"""
+        return bool(self.__classNames)
+
+    @property
+    def classNames(self):
+        """Set of names of tag classes (converted with helpers.uncase) which values are used by template"""
+        return self.__classNames
+
+    def render(self, obj, values_by_class=None, node_names=None):
+        """Generate text for given object. :values_by_class: is dictionary returned by tagValuesByClass,
+        if it is not given, one is built from tags linked to object. :node_names: is dictionary mapping
+        identities of nodes referenced by tag values to their display name templates, referenced nodes
+        are queried from library if it is not given.
+        """
+
+        if self.__static is not None:
+            return self.__static
+
+        if values_by_class is None and self.__classNames:
+            values_by_class = tagValuesByClass(obj.allTags)
+
+        return ''.join(part if isinstance(part, str) else part.render(obj, values_by_class, node_names)
+                       for part in self.__parts)
+
+
+@functools.lru_cache(maxsize=TemplateCacheSize)
+def compileTemplate(template):
+    """Get CompiledTemplate for template text that uses only predefined special blocks. Compiled templates
+    are kept in process-wide LRU cache keyed by template text.
+    """
+
+    return CompiledTemplate(FormatString(template).tokens, FormatString._predefined_blocks, template)
@@ -3,18 +3,32 @@ import sqlite3
 import logging
 import copy
 import threading
+import json
+import uuid
 from PyQt4.QtCore import QObject, pyqtSignal, QFileInfo
 from organica.utils.lockable import Lockable
 from organica.lib.filters import Wildcard, generateSqlCompare, TagQuery, NodeQuery
 from organica.lib.objects import Node, Tag, TagClass, TagValue, isCorrectIdent, Identity, ObjectError, get_identity
 from organica.lib.storage import LocalStorage
 from organica.lib.locator import Locator
+from organica.lib.changelog import Change
+from organica.lib.querylog import QueryLog
+from organica.lib.bitmapindex import BitmapIndex
+from organica.lib.formatstring import compileTemplate, renderMany, ParseError
+from organica.utils.profiling import globalProfiler
 import organica.utils.helpers as helpers
 
 
 logger = logging.getLogger(__name__)
 
 
+# maximal number of ids passed to single query when fetching data in bulk (SQLite limits number of parameters)
+BulkFetchChunkSize = 500
+
+# default maximal number of tags of one class returned by Library.facets
+FacetLimit = 20
+
+
 class LibraryError(Exception):
     pass
 
@@ -33,7 +47,7 @@ class Library(QObject, Lockable):
             self._lib = lib
 
         def __enter__(self):
-            self._cursor = self._lib.connection.cursor()
+            self._cursor = self._lib._queryLog.wrap(self._lib.connection.cursor())
             return self._cursor
 
         def __exit__(self, tp, v, tb):
@@ -45,7 +59,7 @@ class Library(QObject, Lockable):
 
         def __enter__(self):
             self.lib._begin()
-            self.cursor = self.lib.connection.cursor()
+            self.cursor = self.lib._queryLog.wrap(self.lib.connection.cursor())
             return self.cursor
 
         def __exit__(self, exc_type, exc_value, traceback):
@@ -55,7 +69,7 @@ class Library(QObject, Lockable):
                 self.lib._commit()
             self.cursor.close()
 
-    _AttrsToSaveOnTransaction = ['_meta', '_tagClasses', '_tags', '_nodes']
+    _AttrsToSaveOnTransaction = ['_meta', '_tagClasses', '_tagClassesById', '_tags', '_nodes']
 
     _loaded_libraries = []
     _loaded_libraries_lock = threading.RLock()
@@ -66,6 +80,10 @@ class Library(QObject, Lockable):
     MetaStoragePath = 'storage_path'
     MetaProfileUuid = 'profile'
     MetaAutoDeleteUnusedTags = 'autodelete_tags'
+    MetaUuid = 'uuid'
+
+    # metas that identify this library and should never be replicated to another one
+    _UnloggedMetas = ('organica', MetaUuid)
 
     # Signals are emitted when set of library objects is changed or updated.
     # Receiver should not rely on library state at moment of processing signal as
@@ -75,6 +93,12 @@ class Library(QObject, Lockable):
     # emitted after library has returned to previous state on rollbacking transaction
     resetted = pyqtSignal()
 
+    # emitted after library is closed
+    closed = pyqtSignal()
+
+    # emitted after outermost transaction is committed, so its changes became visible to other connections
+    committed = pyqtSignal()
+
     # emitted after any operation has changed metas. Argument is dictionary of metas after modifications
     metaChanged = pyqtSignal(object)
 
@@ -99,15 +123,20 @@ class Library(QObject, Lockable):
         self._filename = ''
         self._meta = {}  # map by name
         self._tagClasses = {}  # map by name
+        self._tagClassesById = {}  # map by identity, holds same objects as _tagClasses
         self._tags = {}  # map by id
         self._nodes = {}  # map by id
         self._trans_states = []
         self._storage = None
+        self._applyingOrigin = None  # uuid of library which changes are applied now (see applyChanges)
+        self._queryLog = QueryLog()
+        self._bitmapIndex = None
 
     @staticmethod
-    def loadLibrary(filename):
+    def loadLibrary(filename, bitmap_index=False):
         """Load library from database file. File should exists, otherwise LibraryError raised.
         To create in-memory database, use createLibrary instead.
+        If :bitmap_index: is True, in-memory index of links is built (see bitmapIndexEnabled).
         """
 
         if filename.lower() == ':memory:':
@@ -115,6 +144,8 @@ class Library(QObject, Lockable):
 
         loaded_lib = Library._findOpenLibrary(filename)
         if loaded_lib is not None:
+            if bitmap_index:
+                loaded_lib.bitmapIndexEnabled = True
             return loaded_lib
 
         if not os.path.exists(filename):
@@ -134,6 +165,14 @@ class Library(QObject, Lockable):
         lib.__loadMeta()
         lib.__loadTagClasses()
 
+        # libraries created by older versions have no change log and uuid
+        lib.__ensureChangeLog()
+        if not lib.getMeta(Library.MetaUuid):
+            lib.setMeta(Library.MetaUuid, uuid.uuid4())
+        lib.__ensureRenderedNames()
+        with lib.cursor() as c:
+            c.execute('create index if not exists links_tag_index on links(tag_id, node_id)')
+
         # load storage if any
         if lib.testMeta(Library.MetaStoragePath):
             storage_path = lib.getMeta(Library.MetaStoragePath)
@@ -147,6 +186,9 @@ class Library(QObject, Lockable):
                     # do not load storage when its directory does not exist - storage settings will not be loaded.
                     lib._storage = LocalStorage.fromDirectory(storage_path)
 
+        if bitmap_index:
+            lib.bitmapIndexEnabled = True
+
         with Library._loaded_libraries_lock:
             Library._loaded_libraries.append(lib)
 
@@ -174,15 +216,21 @@ class Library(QObject, Lockable):
         # meta, node and tag class names are not case-sensitive
         # we are storing some tag class parameters in links table to prevent slow
         # queries to tag classes table.
+        # nodes store both display name template and rendered name (with its casefolded form to sort and search
+        # by), rendered name is updated each time node template or tags used by template are changed.
         with lib.cursor() as c:
             c.executescript("""
                     pragma encoding = 'UTF-8';
 
+                    pragma auto_vacuum = incremental;
+
                     create table organica_meta(name text collate nocase,
                                                value text);
 
                     create table nodes(id integer primary key autoincrement,
-                                       display_name text collate strict_nocase);
+                                       display_name text collate strict_nocase,
+                                       rendered_name text,
+                                       rendered_key text);
 
                     create table tag_classes(id integer primary key,
                                              name text collate nocase unique,
@@ -207,11 +255,18 @@ class Library(QObject, Lockable):
 
                     create index links_index on links(node_id, tag_class_id, tag_id);
 
+                    create index links_tag_index on links(tag_id, node_id);
+
                     create index nodes_index on nodes(display_name);
+
+                    create index nodes_rendered_index on nodes(rendered_key);
                             """)
 
+            lib.__ensureChangeLog()
+
             # and add magic meta
             lib.setMeta('organica', 'is magic')
+            lib.setMeta(Library.MetaUuid, uuid.uuid4())
 
             # create basic tag classes
             lib.createTagClass('locator', TagValue.TYPE_LOCATOR)
@@ -263,8 +318,10 @@ class Library(QObject, Lockable):
                 if meta_name in self._meta:
                     if meta_value != self._meta[meta_name]:
                         c.execute('update organica_meta set value = ? where name = ?', (meta_value, meta_name))
+                        self._logMetaChange(c, Change.UPDATE, meta_name, meta_value)
                 else:
                     c.execute('insert into organica_meta(name, value) values(?, ?)', (meta_name, meta_value))
+                    self._logMetaChange(c, Change.CREATE, meta_name, meta_value)
                 self._meta[meta_name] = meta_value
                 self.metaChanged.emit(copy.deepcopy(self._meta))
 
@@ -275,6 +332,8 @@ class Library(QObject, Lockable):
             with self.transaction() as c:
                 name_mask = helpers.uncase(name_mask)
                 c.execute('delete from organica_meta where ' + generateSqlCompare('name', name_mask))
+                for meta_name in (k for k in self._meta.keys() if name_mask == k):
+                    self._logMetaChange(c, Change.REMOVE, meta_name)
             self._meta = {k: self._meta[k] for k in self._meta.keys() if name_mask != k}
             self.metaChanged.emit(copy.deepcopy(self._meta))
 
@@ -303,6 +362,7 @@ class Library(QObject, Lockable):
 
         with self.lock:
             self._tagClasses = dict()
+            self._tagClassesById = dict()
             with self.transaction() as c:
                 c.execute("select id, name, value_type, hidden from tag_classes")
                 for r in c.fetchall():
@@ -312,6 +372,7 @@ class Library(QObject, Lockable):
                         logger.error('invalid tag class "{0}" (#{1})'.format(r[1], r[0]))
                         continue
                     self._tagClasses[tc.name.lower()] = tc
+                    self._tagClassesById[tc.identity] = tc
 
     def tagClass(self, tag_class):
         """Get tag class with given identity or name. Another use is to get actual value of flushed
@@ -320,8 +381,7 @@ class Library(QObject, Lockable):
 
         with self.lock:
             if isinstance(tag_class, (Identity, TagClass)):
-                return helpers.first(copy.deepcopy(tc) for tc in self._tagClasses.values() if
-                                     tc.identity == get_identity(tag_class))
+                return copy.deepcopy(self._tagClassesById.get(get_identity(tag_class), None))
             else:
                 return copy.deepcopy(self._tagClasses.get(tag_class.lower(), None))
 
@@ -354,9 +414,13 @@ class Library(QObject, Lockable):
                 c.execute('insert into tag_classes(name, value_type, hidden) values(?, ?, ?)',
                           (str(name), int(value_type), bool(is_hidden)))
                 tc.identity = Identity(self, c.lastrowid)
+                self._logChange(c, Change.TAG_CLASS, Change.CREATE, tc.id,
+                                {'name': tc.name, 'value_type': tc.valueType, 'hidden': tc.hidden})
 
             # update cached
-            self._tagClasses[tc.name.lower()] = copy.deepcopy(tc)
+            cached_class = copy.deepcopy(tc)
+            self._tagClasses[tc.name.lower()] = cached_class
+            self._tagClassesById[tc.identity] = cached_class
             self.tagClassCreated.emit(copy.deepcopy(tc))
             return tc
 
@@ -385,9 +449,11 @@ class Library(QObject, Lockable):
 
             with self.transaction() as c:
                 c.execute('delete from tag_classes where id = ?', (tag_class.id, ))
+                self._logChange(c, Change.TAG_CLASS, Change.REMOVE, tag_class.id)
 
             # update cache
             del self._tagClasses[r_class.name.lower()]
+            del self._tagClassesById[r_class.identity]
 
             self.tagClassRemoved.emit(copy.deepcopy(tag_class))
 
@@ -401,26 +467,123 @@ class Library(QObject, Lockable):
             sql = 'select id, class_id, value_type, value, use_count from tags'
             if query.qeval() == -1:
                 sql = sql + ' where ' + query.generateSqlWhere()
+            sql += query.generateSqlTail()
             with self.cursor() as c:
                 c.execute(sql)
 
                 r = []
                 for row in c.fetchall():
-                    if int(row[0]) not in self._tags:
-                        tag_class = self.tagClass(Identity(self, int(row[1])))
-                        if tag_class is None:
-                            logger.error('invalid class_id for tag #{0}'.format(row[0]))
-                            continue
-                        try:
-                            use_count = row[4]
-                            use_count = int(use_count) if use_count is not None else 0
-                            tag = Tag(tag_class, TagValue.fromDatabaseForm(tag_class, row[3]), use_count)
-                        except (TypeError, ObjectError):
-                            logger.error('invalid tag #{0}'.format(row[0]))
-                            continue
-                        tag.identity = Identity(self, int(row[0]))
-                        self._tags[tag.id] = tag
-                    r.append(copy.deepcopy(self._tags[int(row[0])]))
+                    tag = self.__cacheTag(row[0], row[1], row[3], row[4])
+                    if tag is not None:
+                        r.append(copy.deepcopy(tag))
+                return r
+
+    def __cacheTag(self, tag_id, class_id, db_value, use_count):
+        """Get cached tag with given id, creating one from row values if tag is not cached yet. Returns None
+        if row values are invalid.
+        """
+
+        tag_id = int(tag_id)
+        if tag_id not in self._tags:
+            tag_class = self.tagClass(Identity(self, int(class_id)))
+            if tag_class is None:
+                logger.error('invalid class_id for tag #{0}'.format(tag_id))
+                return None
+            try:
+                use_count = int(use_count) if use_count is not None else 0
+                tag = Tag(tag_class, TagValue.fromDatabaseForm(tag_class, db_value), use_count)
+            except (TypeError, ObjectError):
+                logger.error('invalid tag #{0}'.format(tag_id))
+                return None
+            tag.identity = Identity(self, tag_id)
+            self._tags[tag.id] = tag
+        return self._tags[tag_id]
+
+    def cooccurringTags(self, parent_tags, class_name=None):
+        """Get tags linked to nodes that have all :parent_tags: linked. Returns list of (tag, count) tuples, where
+        count is number of such nodes tag is linked to. Parent tags themselves are not returned. If :class_name:
+        is given, only tags of this class are returned. Uses one query regardless of number of tags.
+        """
+
+        parent_ids = list(set(tag.id for tag in parent_tags if tag is not None and tag.isFlushed and
+                              tag.lib is self))
+        if not parent_ids:
+            return []
+
+        with self.lock:
+            placeholders = ', '.join('?' * len(parent_ids))
+            sql = ('select tags.id, tags.class_id, tags.value, tags.use_count, count(*) '
+                   'from (select node_id from links where tag_id in ({0}) group by node_id having count(*) = ?) '
+                   'as parent_nodes inner join links on links.node_id = parent_nodes.node_id '
+                   'inner join tags on tags.id = links.tag_id '
+                   'where links.tag_id not in ({0})').format(placeholders)
+            params = parent_ids + [len(parent_ids)] + parent_ids
+            if class_name is not None:
+                tag_class = self.tagClass(class_name)
+                if tag_class is None:
+                    return []
+                sql += ' and links.tag_class_id = ?'
+                params.append(tag_class.id)
+            sql += ' group by tags.id order by tags.id'
+
+            with self.cursor() as c:
+                c.execute(sql, tuple(params))
+
+                r = []
+                for row in c.fetchall():
+                    tag = self.__cacheTag(row[0], row[1], row[2], row[3])
+                    if tag is not None:
+                        r.append((copy.deepcopy(tag), row[4]))
+                return r
+
+    def facets(self, node_query, classes=None, limit_per_class=FacetLimit):
+        """Get tags linked to nodes matching :node_query: grouped by class. Returns dictionary mapping class name to
+        list of (tag, count) tuples, where count is number of matching nodes tag is linked to. Lists are sorted by
+        count (most used tags go first) and contain at most :limit_per_class: tags (None means no limit).
+        If :classes: (sequence of class names or TagClass objects) is given, only tags of these classes are
+        returned. Uses one query regardless of number of classes; limit is applied by database, so number of
+        fetched rows does not depend on number of tags in library.
+        """
+
+        if node_query is None or node_query.qeval() == 0:
+            return {}
+
+        with self.lock:
+            sql = ('select tags.id, tags.class_id, tags.value, tags.use_count, count(*) as node_count, '
+                   'row_number() over (partition by tags.class_id order by count(*) desc, tags.id) as class_rank '
+                   'from links inner join tags on tags.id = links.tag_id')
+            conditions, params = [], []
+            if node_query.qeval() == -1 or node_query.generateSqlTail():
+                node_sql = 'select id from nodes'
+                if node_query.qeval() == -1:
+                    node_sql += ' where ' + node_query.generateSqlWhere()
+                conditions.append('links.node_id in ({0}{1})'.format(node_sql, node_query.generateSqlTail()))
+            if classes is not None:
+                class_ids = [tag_class.id for tag_class in (self.tagClass(tag_class) for tag_class in classes)
+                             if tag_class is not None]
+                if not class_ids:
+                    return {}
+                conditions.append('links.tag_class_id in ({0})'.format(', '.join('?' * len(class_ids))))
+                params += class_ids
+            if conditions:
+                sql += ' where ' + ' and '.join(conditions)
+            sql += ' group by tags.id'
+
+            # tags are ranked by count inside each class, so only first :limit_per_class: tags are fetched
+            sql = 'select * from ({0})'.format(sql)
+            if limit_per_class is not None:
+                sql += ' where class_rank <= ?'
+                params.append(limit_per_class)
+            sql += ' order by class_id, class_rank'
+
+            with self.cursor() as c:
+                c.execute(sql, tuple(params))
+
+                r = {}
+                for row in c.fetchall():
+                    tag = self.__cacheTag(row[0], row[1], row[2], row[3])
+                    if tag is not None:
+                        r.setdefault(tag.className, []).append((copy.deepcopy(tag), row[4]))
                 return r
 
     def tag(self, *args):
@@ -468,6 +631,7 @@ class Library(QObject, Lockable):
                 c.execute('insert into tags(class_id, value_type, value, use_count) values(?, ?, ?, ?)',
                           (int(tag_class.id), int(tag_class.valueType), str(value.databaseForm), 0))
                 tag.identity = Identity(self, c.lastrowid)
+                self._logTagChange(c, Change.CREATE, tag)
 
             tag_copy = copy.deepcopy(tag)
             tag_copy.useCount = 0  # sanitize useCount as we use it internally
@@ -502,6 +666,18 @@ class Library(QObject, Lockable):
                             c.execute('update links set tag_class_id = ? where tag_id = ?',
                                       (tag_to_flush.tagClass.id, tag_to_flush.id))
 
+                        # names of nodes which templates use old or new tag class should be rendered again
+                        c.execute('select nodes.id, nodes.display_name from links inner join nodes '
+                                  'on nodes.id = links.node_id where links.tag_id = ?', (tag_to_flush.id, ))
+                        linked_nodes = []
+                        for row in c.fetchall():
+                            node = Node(str(row[1]))
+                            node.identity = Identity(self, row[0])
+                            linked_nodes.append(node)
+                        self._updateRenderedNames(c, linked_nodes, (old_tag.className, tag_to_flush.className))
+
+                        self._logTagChange(c, Change.UPDATE, tag_to_flush)
+
                     tag_copy = copy.deepcopy(tag_to_flush)
                     tag_copy.useCount = old_tag.useCount
                     self._tags[tag_to_flush.id] = tag_copy
@@ -539,6 +715,7 @@ class Library(QObject, Lockable):
                      raise LibraryError('cannot remove tag while there are nodes linked with it')
 
                 c.execute('delete from tags where id = ?', (tag_to_remove.id, ))
+                self._logChange(c, Change.TAG, Change.REMOVE, tag_to_remove.id)
 
             # update cache
             if tag_to_remove.id in self._tags:
@@ -575,6 +752,9 @@ class Library(QObject, Lockable):
             with self.transaction() as c:
                 c.execute('insert into nodes(display_name) values (?)', (str(node.displayNameTemplate), ))
                 node.identity = Identity(self, c.lastrowid)
+                self._updateRenderedNames(c, (node, ))
+                self._logChange(c, Change.NODE, Change.CREATE, node.id,
+                                {'display_name': str(node.displayNameTemplate)})
 
                 self._nodes[node.id] = copy.deepcopy(node)
 
@@ -616,6 +796,7 @@ class Library(QObject, Lockable):
                     self.removeLink(node_to_remove, tag)
 
                 c.execute('delete from nodes where id = ?', (node_to_remove.id,))
+                self._logChange(c, Change.NODE, Change.REMOVE, node_to_remove.id)
 
             # update cache
             if node_to_remove.id in self._nodes:
@@ -640,14 +821,22 @@ class Library(QObject, Lockable):
         if query is None or query.qeval() == 0:
             return []
 
-        sql = 'select id, display_name from nodes'
-        if query.qeval() == -1:
-            sql = sql + ' where ' + query.generateSqlWhere()
-        with self.cursor() as c:
-            c.execute(sql)
+        with self.lock:
+            node_ids = self.__indexedNodeIds(query)
+            if node_ids is not None:
+                rows = sorted(self._selectInChunks('select id, display_name from nodes where id in ({0})', node_ids),
+                              key=lambda row: row[0])
+            else:
+                sql = 'select id, display_name from nodes'
+                if query.qeval() == -1:
+                    sql = sql + ' where ' + query.generateSqlWhere()
+                sql += query.generateSqlTail()
+                with self.cursor() as c:
+                    c.execute(sql)
+                    rows = c.fetchall()
 
             r = []
-            for row in c.fetchall():
+            for row in rows:
                 if int(row[0]) not in self._nodes:
                     node = Node(row[1])
                     node.identity = Identity(self, row[0])
@@ -656,6 +845,71 @@ class Library(QObject, Lockable):
                 r.append(copy.deepcopy(self._nodes[int(row[0])]))
             return r
 
+    def __indexedNodeIds(self, query):
+        """Get ids of nodes matching query using bitmap index. Returns None if index is disabled or query cannot
+        be evaluated by index.
+        """
+
+        if self._bitmapIndex is None or query.qeval() != -1:
+            return None
+        return self._bitmapIndex.nodeIds(query)
+
+    def nodeIds(self, query):
+        """Get identities of nodes matching query. Unlike nodes method, nodes are neither fetched nor cached."""
+
+        if query is None or query.qeval() == 0:
+            return []
+
+        with self.lock:
+            node_ids = self.__indexedNodeIds(query)
+            if node_ids is not None:
+                return [Identity(self, node_id) for node_id in node_ids]
+
+            sql = 'select id from nodes'
+            if query.qeval() == -1:
+                sql = sql + ' where ' + query.generateSqlWhere()
+            sql += query.generateSqlTail()
+            with self.cursor() as c:
+                c.execute(sql)
+                return [Identity(self, row[0]) for row in c.fetchall()]
+
+    def tagsByNode(self, node_ids):
+        """Get tags linked with nodes with given ids, using one query for each BulkFetchChunkSize nodes. Returns
+        dictionary mapping node id to list of tags, nodes without tags are omitted. Tags are not copied.
+        """
+
+        with self.lock:
+            tags_by_node = {}
+            for row in self._selectInChunks('select links.node_id, tags.id, tags.class_id, tags.value, '
+                                            'tags.use_count from links inner join tags on tags.id = links.tag_id '
+                                            'where links.node_id in ({0})', node_ids):
+                tag = self.__cacheTag(row[1], row[2], row[3], row[4])
+                if tag is not None:
+                    tags_by_node.setdefault(row[0], []).append(tag)
+            return tags_by_node
+
+    def nodesByIds(self, node_ids):
+        """Get nodes with given ids with tags fetched, using one query for nodes and one for links for each
+        BulkFetchChunkSize nodes. Returns dictionary mapping node id to node, nodes that do not exist are
+        omitted. Cached nodes are returned as is, others are not added to cache.
+        """
+
+        with self.lock:
+            node_ids = set(node_ids)
+            result = dict((node_id, copy.deepcopy(self._nodes[node_id])) for node_id in node_ids
+                          if node_id in self._nodes and self._nodes[node_id].tagsFetched)
+            node_ids -= set(result.keys())
+            if not node_ids:
+                return result
+
+            tags_by_node = self.tagsByNode(node_ids)
+            for node_id, template in self.nodeDisplayNames(node_ids).items():
+                node = Node(template)
+                node.identity = Identity(self, node_id)
+                node.allTags = tags_by_node.get(node_id, [])
+                result[node_id] = node
+            return result
+
     def node(self, node):
         """Get node with given identity or actual value of node.
         """
@@ -666,6 +920,116 @@ class Library(QObject, Lockable):
             else:
                 return helpers.first(self.nodes(NodeQuery(identity=node)))
 
+    def _selectInChunks(self, sql, ids, params=(), connection=None):
+        """Execute :sql: for chunks of :ids: and return all fetched rows. {0} in :sql: is replaced with
+        placeholders for ids of chunk, :params: are passed after ids. If :connection: is given, query is
+        executed on it without locking library.
+        """
+
+        ids = list(ids)
+        rows = []
+        for chunk_start in range(0, len(ids), BulkFetchChunkSize):
+            chunk = ids[chunk_start:chunk_start + BulkFetchChunkSize]
+            chunk_sql = sql.format(', '.join('?' * len(chunk)))
+            if connection is None:
+                with self.lock:
+                    with self.cursor() as c:
+                        c.execute(chunk_sql, tuple(chunk) + tuple(params))
+                        rows += c.fetchall()
+            else:
+                c = self._queryLog.wrap(connection.cursor())
+                try:
+                    c.execute(chunk_sql, tuple(chunk) + tuple(params))
+                    rows += c.fetchall()
+                finally:
+                    c.close()
+        return rows
+
+    def tagValuesByNode(self, node_ids, class_names=None, connection=None):
+        """Fetch values of tags linked to nodes with given ids using one query for each BulkFetchChunkSize
+        nodes. Returns dictionary mapping node id to dictionary like one returned by
+        formatstring.tagValuesByClass. If :class_names: is given, only tags of these classes are fetched.
+        Library caches are neither used nor modified, so method can be called with another :connection:
+        to the same database (from another thread, for example). Values of node references are identities
+        of referenced nodes, existence of these nodes is not checked.
+        """
+
+        sql = ('select links.node_id, tag_classes.id, tag_classes.name, tag_classes.value_type, tags.value '
+               'from links inner join tags on tags.id = links.tag_id '
+               'inner join tag_classes on tag_classes.id = tags.class_id '
+               'where links.node_id in ({0})')
+        params = ()
+        if class_names is not None:
+            class_names = list(class_names)
+            if not class_names:
+                return {}
+            sql += ' and tag_classes.name in ({0})'.format(', '.join('?' * len(class_names)))
+            params = tuple(class_names)
+
+        result = {}
+        tag_classes = {}  # lightweight classes used to decode values, by class id
+        for node_id, class_id, class_name, value_type, db_value in self._selectInChunks(sql, node_ids, params,
+                                                                                          connection):
+            tag_class = tag_classes.get(class_id)
+            if tag_class is None:
+                tag_class = tag_classes[class_id] = TagClass(Identity(self, class_id), class_name, value_type)
+            try:
+                if value_type == TagValue.TYPE_NODE_REFERENCE:
+                    value = TagValue(Identity(self, int(db_value)), value_type)
+                else:
+                    value = TagValue.fromDatabaseForm(tag_class, db_value)
+            except (TypeError, ValueError, ObjectError):
+                logger.error('invalid value of tag linked to node #{0}'.format(node_id))
+                continue
+            result.setdefault(node_id, {}).setdefault(helpers.uncase(class_name), []).append(value)
+        return result
+
+    def nodeDisplayNames(self, node_ids, connection=None):
+        """Fetch display name templates of nodes with given ids in bulk. Returns dictionary mapping node id to
+        template, nodes that do not exist are omitted. See tagValuesByNode for :connection: details.
+        """
+
+        return dict((row[0], str(row[1])) for row in
+                    self._selectInChunks('select id, display_name from nodes where id in ({0})', node_ids,
+                                         connection=connection))
+
+    def _updateRenderedNames(self, cursor, nodes, changed_classes=None):
+        """Render display names of given flushed nodes and store them in rendered_name and rendered_key columns.
+        If :changed_classes: is given, only nodes which templates use tags of these classes are updated.
+        Names of nodes with invalid templates are equal to templates.
+        """
+
+        if changed_classes is not None:
+            changed_classes = set(helpers.uncase(class_name) for class_name in changed_classes)
+
+        names = {}  # map node id to rendered name
+        templates, nodes_to_render = [], []
+        for node in nodes:
+            try:
+                compiled = compileTemplate(node.displayNameTemplate)
+            except ParseError:
+                names[node.id] = node.displayNameTemplate
+                continue
+            if changed_classes is None or compiled.classNames & changed_classes:
+                templates.append(compiled)
+                nodes_to_render.append(node)
+
+        try:
+            rendered = renderMany(templates, nodes_to_render)
+        except ParseError:
+            # some templates cannot be rendered (unknown locator mode, for example), process nodes one by one
+            rendered = []
+            for compiled, node in zip(templates, nodes_to_render):
+                try:
+                    rendered.append(renderMany((compiled, ), (node, ))[0])
+                except ParseError:
+                    rendered.append(node.displayNameTemplate)
+        names.update((node.id, name) for node, name in zip(nodes_to_render, rendered))
+
+        if names:
+            cursor.executemany('update nodes set rendered_name = ?, rendered_key = ? where id = ?',
+                               [(name, helpers.uncase(name), node_id) for node_id, name in names.items()])
+
     def flushNode(self, node_to_flush):
         """Flush node into database. Set of linked tag is changed to match node_to_flush.allTags array.
         """
@@ -685,6 +1049,15 @@ class Library(QObject, Lockable):
                         c.execute('update nodes set display_name = ? where id = ?',
                                   (node_to_flush.displayNameTemplate, node_to_flush.id))
 
+                        # template of node is used as name of referenced node by templates of other nodes
+                        updated_node = copy.deepcopy(unmodified_node)
+                        updated_node.displayNameTemplate = node_to_flush.displayNameTemplate
+                        referring_nodes = self.nodes(NodeQuery(tags=TagQuery(node_ref=node_to_flush)))
+                        self._updateRenderedNames(c, [updated_node] + [node for node in referring_nodes
+                                                                       if node.id != node_to_flush.id])
+                        self._logChange(c, Change.NODE, Change.UPDATE, node_to_flush.id,
+                                        {'display_name': str(node_to_flush.displayNameTemplate)})
+
                         if node_to_flush.id in self._nodes:
                             self._nodes[node_to_flush.id].displayNameTemplate = node_to_flush.displayNameTemplate
 
@@ -692,20 +1065,22 @@ class Library(QObject, Lockable):
 
                     # find differences in tag list
                     actual_tags = []  # will contain flushed copies of tags
+                    unmodified_tags = set(unmodified_node.allTags)
 
                     # find tags to flush (tags that are not in unmodified_node.allTags)
-                    for tag_to_flush in (tag for tag in node_to_flush.allTags if tag not in unmodified_node.allTags):
+                    for tag_to_flush in (tag for tag in node_to_flush.allTags if tag not in unmodified_tags):
                         self.flushTag(tag_to_flush)
                         self.createLinkIfNotExists(node_to_flush, tag_to_flush)
                         actual_tags.append(tag_to_flush)
 
                     # find tags to remove (tags with identities that are not in node_to_flush.allTags)
+                    flushed_identities = set(tag.identity for tag in node_to_flush.allTags)
                     for tag in unmodified_node.allTags:
-                        if tag.identity not in (tag.identity for tag in node_to_flush.allTags):
+                        if tag.identity not in flushed_identities:
                             self.removeLinkIfExists(node_to_flush, tag)
 
                     # append tags that should remain intact
-                    actual_tags += (tag for tag in node_to_flush.allTags if tag in unmodified_node.allTags)
+                    actual_tags += (tag for tag in node_to_flush.allTags if tag in unmodified_tags)
 
                     node_to_flush.allTags = actual_tags
 
@@ -740,8 +1115,11 @@ class Library(QObject, Lockable):
                           (node.id, tag.id, tag.tagClass.id))
 
                 c.execute('update tags set use_count = use_count + 1 where id = ?', (tag.id, ))
+                self._logChange(c, Change.LINK, Change.CREATE, 0, {'node': node.id, 'tag': tag.id})
+
+                node.allTags.append(tag)
+                self._updateRenderedNames(c, (node, ), (tag.className, ))
 
-            node.allTags.append(tag)
             self._nodes[node.id] = copy.deepcopy(node)
 
             if tag.id in self._tags:
@@ -776,9 +1154,12 @@ class Library(QObject, Lockable):
 
             with self.transaction() as c:
                 c.execute('delete from links where node_id = ? and tag_id = ?', (node.id, tag.id))
+                self._logChange(c, Change.LINK, Change.REMOVE, 0, {'node': node.id, 'tag': tag.id})
+
+                # actualize node
+                node.allTags = [t for t in node.allTags if t.identity != tag.identity]
+                self._updateRenderedNames(c, (node, ), (tag.className, ))
 
-            # actualize node
-            node.allTags = [t for t in node.allTags if t.identity != tag.identity]
             self._nodes[node.id] = node
 
             if tag.id in self._tags:
@@ -813,6 +1194,262 @@ class Library(QObject, Lockable):
         else:
             raise ValueError()
 
+    def __ensureChangeLog(self):
+        """Create tables used to track changes and synchronize libraries if they do not exist.
+        change_log keeps ids of this library, sync_map maps ids of objects created by changes
+        applied from another libraries to its ids in library of origin.
+        """
+
+        with self.cursor() as c:
+            c.executescript("""
+                    create table if not exists change_log(seq integer primary key autoincrement,
+                                                          origin text,
+                                                          object_type integer,
+                                                          object_id integer,
+                                                          action integer,
+                                                          data text);
+
+                    create table if not exists sync_map(object_type integer,
+                                                        origin text,
+                                                        remote_id integer,
+                                                        local_id integer,
+                                                        unique(object_type, origin, remote_id));
+
+                    create index if not exists sync_map_local_index on sync_map(object_type, local_id);
+
+                    create table if not exists sync_state(source text primary key,
+                                                          seq integer);
+                            """)
+
+    def __ensureRenderedNames(self):
+        """Libraries created by older versions have no columns for rendered node names, add them and render
+        names of all existing nodes.
+        """
+
+        with self.lock:
+            with self.cursor() as c:
+                c.execute('pragma table_info(nodes)')
+                if 'rendered_key' in (row[1] for row in c.fetchall()):
+                    return
+
+            with self.transaction() as c:
+                c.execute('alter table nodes add column rendered_name text')
+                c.execute('alter table nodes add column rendered_key text')
+                c.execute('create index nodes_rendered_index on nodes(rendered_key)')
+
+                c.execute('select id, display_name from nodes')
+                rows = c.fetchall()
+                for chunk_start in range(0, len(rows), BulkFetchChunkSize):
+                    nodes = []
+                    for row in rows[chunk_start:chunk_start + BulkFetchChunkSize]:
+                        node = Node(str(row[1]))
+                        node.identity = Identity(self, row[0])
+                        nodes.append(node)
+                    self._updateRenderedNames(c, nodes)
+
+    def _logChange(self, cursor, object_type, action, object_id=0, data=None):
+        """Append entry to change log. Should be called inside transaction that makes the change, so
+        entry will be discarded if transaction is rolled back.
+        """
+
+        cursor.execute('insert into change_log(origin, object_type, object_id, action, data) values(?, ?, ?, ?, ?)',
+                       (self._applyingOrigin, object_type, object_id, action, json.dumps(data or {})))
+
+    def _logMetaChange(self, cursor, action, meta_name, meta_value=None):
+        if meta_name not in self._UnloggedMetas:
+            data = {'name': meta_name}
+            if action != Change.REMOVE:
+                data['value'] = meta_value
+            self._logChange(cursor, Change.META, action, 0, data)
+
+    def _logTagChange(self, cursor, action, tag):
+        self._logChange(cursor, Change.TAG, action, tag.id, {'class': tag.tagClass.id,
+                                                             'value_type': tag.value.valueType,
+                                                             'value': tag.value.databaseForm})
+
+    @property
+    def lastChangeSeq(self):
+        """Sequence number of last change recorded in this library or 0 if there are no changes."""
+
+        with self.lock:
+            with self.cursor() as c:
+                c.execute('select max(seq) from change_log')
+                r = c.fetchone()[0]
+                return int(r) if r is not None else 0
+
+    def changesSince(self, seq=0, limit=-1):
+        """Get list of changes recorded after change with sequence number :seq:. Returned Change objects
+        hold references that can be resolved by any library that has applied changes from this library
+        (see Change docstring). :limit: limits number of changes returned (-1 means no limit).
+        """
+
+        with self.lock:
+            with self.cursor() as c:
+                c.execute('select seq, origin, object_type, object_id, action, data from change_log '
+                          'where seq > ? order by seq limit ?', (int(seq), int(limit)))
+                rows = c.fetchall()
+
+                own_uuid = self.uuid
+                cached_refs = {}
+
+                def ref(object_type, object_id):
+                    key = (object_type, object_id)
+                    if key not in cached_refs:
+                        c.execute('select origin, remote_id from sync_map where object_type = ? and local_id = ?',
+                                  (object_type, object_id))
+                        r = c.fetchone()
+                        cached_refs[key] = (r[0], int(r[1])) if r else (own_uuid, object_id)
+                    return cached_refs[key]
+
+                changes = []
+                for row in rows:
+                    change = Change(int(row[0]), own_uuid, row[1] or own_uuid, int(row[2]), int(row[4]))
+                    data = json.loads(row[5]) if row[5] else {}
+                    if change.objectType in (Change.TAG_CLASS, Change.TAG, Change.NODE):
+                        change.objectRef = ref(change.objectType, int(row[3]))
+                    if change.objectType == Change.TAG and 'class' in data:
+                        data['class'] = ref(Change.TAG_CLASS, data['class'])
+                        if data.get('value_type') == TagValue.TYPE_NODE_REFERENCE:
+                            data['value'] = ref(Change.NODE, int(data['value']))
+                    elif change.objectType == Change.LINK:
+                        data['node'] = ref(Change.NODE, data['node'])
+                        data['tag'] = ref(Change.TAG, data['tag'])
+                    change.data = data
+                    changes.append(change)
+                return changes
+
+    def syncedSeq(self, source_uuid):
+        """Sequence number of last change applied from library with given uuid."""
+
+        with self.lock:
+            with self.cursor() as c:
+                c.execute('select seq from sync_state where source = ?', (str(source_uuid), ))
+                r = c.fetchone()
+                return int(r[0]) if r else 0
+
+    def applyChanges(self, changes):
+        """Apply changes returned by Library.changesSince of another library. Objects referenced by changes are
+        mapped to objects of this library, so ids of both libraries are never mixed. Changes originated
+        in this library are skipped. All changes are applied in single transaction.
+        Changes applied are recorded in change log of this library too, so they can be passed further.
+        """
+
+        with self.lock:
+            own_uuid = self.uuid
+            with self.transaction() as c:
+                for change in changes:
+                    if change.origin != own_uuid:
+                        self._applyingOrigin = change.origin
+                        try:
+                            self.__applyChange(c, change)
+                        finally:
+                            self._applyingOrigin = None
+
+                    c.execute('insert or replace into sync_state(source, seq) values(?, ?)',
+                              (change.source, max(change.seq, self.syncedSeq(change.source))))
+
+    def syncFrom(self, source_lib):
+        """Apply all changes made in :source_lib: since last synchronization. Returns number of changes
+        fetched from source library.
+        """
+
+        changes = source_lib.changesSince(self.syncedSeq(source_lib.uuid))
+        self.applyChanges(changes)
+        return len(changes)
+
+    def __resolveRef(self, cursor, object_type, ref):
+        """Get identity of object in this library by reference from Change. Returns None if object is unknown."""
+
+        if ref is None:
+            return None
+        origin, remote_id = ref
+        if origin == self.uuid:
+            return Identity(self, int(remote_id))
+        cursor.execute('select local_id from sync_map where object_type = ? and origin = ? and remote_id = ?',
+                       (object_type, origin, int(remote_id)))
+        r = cursor.fetchone()
+        return Identity(self, int(r[0])) if r else None
+
+    def __mapRef(self, cursor, object_type, ref, local_id):
+        origin, remote_id = ref
+        if origin != self.uuid:
+            cursor.execute('insert or replace into sync_map(object_type, origin, remote_id, local_id) '
+                           'values(?, ?, ?, ?)', (object_type, origin, int(remote_id), local_id))
+
+    def __decodeChangeValue(self, cursor, tag_class, change):
+        if change.data.get('value_type') == TagValue.TYPE_NODE_REFERENCE:
+            node_identity = self.__resolveRef(cursor, Change.NODE, change.data['value'])
+            if node_identity is None:
+                raise LibraryError('unknown node referenced by tag')
+            return TagValue(node_identity, TagValue.TYPE_NODE_REFERENCE)
+        elif change.data.get('value_type') == TagValue.TYPE_NONE:
+            return TagValue()
+        return TagValue.fromDatabaseForm(tag_class, change.data['value'])
+
+    def __applyChange(self, c, change):
+        def skip(reason):
+            logger.warning('change #{0} from {1} skipped: {2}'.format(change.seq, change.source, reason))
+
+        data = change.data
+        if change.objectType == Change.META:
+            if change.action == Change.REMOVE:
+                if self.testMeta(data['name']):
+                    self.removeMeta(data['name'])
+            else:
+                self.setMeta(data['name'], data['value'])
+        elif change.objectType == Change.TAG_CLASS:
+            if change.action == Change.REMOVE:
+                tag_class = self.tagClass(self.__resolveRef(c, Change.TAG_CLASS, change.objectRef) or Identity())
+                if tag_class is not None:
+                    self.removeTagClass(tag_class, remove_tags=True)
+            else:
+                tag_class = self.createTagClass(data['name'], data['value_type'], data['hidden'])
+                self.__mapRef(c, Change.TAG_CLASS, change.objectRef, tag_class.id)
+        elif change.objectType == Change.TAG:
+            tag_identity = self.__resolveRef(c, Change.TAG, change.objectRef)
+            tag = self.tag(tag_identity) if tag_identity is not None else None
+            if change.action == Change.REMOVE:
+                if tag is not None:
+                    self.removeTag(tag, remove_links=True)
+                return
+
+            tag_class = self.tagClass(self.__resolveRef(c, Change.TAG_CLASS, data['class']) or Identity())
+            if tag_class is None:
+                return skip('unknown tag class')
+            value = self.__decodeChangeValue(c, tag_class, change)
+            if tag is None:
+                tag = self.createTag(tag_class, value)
+                self.__mapRef(c, Change.TAG, change.objectRef, tag.id)
+            else:
+                tag.tagClass = tag_class
+                tag.value = value
+                self.flushTag(tag)
+        elif change.objectType == Change.NODE:
+            node_identity = self.__resolveRef(c, Change.NODE, change.objectRef)
+            node = self.node(node_identity) if node_identity is not None else None
+            if change.action == Change.REMOVE:
+                if node is not None:
+                    self.removeNode(node, remove_references=True)
+            elif node is None:
+                node = self.createNode(data['display_name'])
+                self.__mapRef(c, Change.NODE, change.objectRef, node.id)
+            else:
+                node.displayNameTemplate = data['display_name']
+                self.flushNode(node)
+        elif change.objectType == Change.LINK:
+            node_identity = self.__resolveRef(c, Change.NODE, data['node'])
+            tag_identity = self.__resolveRef(c, Change.TAG, data['tag'])
+            if node_identity is None or tag_identity is None or self.node(node_identity) is None or \
+                    self.tag(tag_identity) is None:
+                if change.action == Change.CREATE:
+                    skip('unknown node or tag')
+                return
+
+            if change.action == Change.REMOVE:
+                self.removeLinkIfExists(node_identity, tag_identity)
+            else:
+                self.createLinkIfNotExists(node_identity, tag_identity)
+
     @property
     def connection(self):
         with self.lock:
@@ -820,17 +1457,43 @@ class Library(QObject, Lockable):
 
     def close(self):
         with self.lock:
+            self.bitmapIndexEnabled = False
             if self._conn:
                 self._conn.close()
 
             with Library._loaded_libraries_lock:
                 Library._loaded_libraries = [lib for lib in Library._loaded_libraries if lib is not self]
+        self.closed.emit()
 
     @property
     def databaseFilename(self):
         with self.lock:
             return self._filename
 
+    @property
+    def queryLog(self):
+        """QueryLog collecting statements executed through Library.cursor and Library.transaction. Disabled by
+        default, set queryLog.enabled to True to start recording.
+        """
+
+        return self._queryLog
+
+    @staticmethod
+    def setProfilingEnabled(enable):
+        """Enable or disable collecting of calls statistics for hot library functions (see utils.profiling).
+        Profiling is process-wide and disabled by default.
+        """
+
+        globalProfiler().enabled = enable
+
+    @staticmethod
+    def profileStats(reset=False):
+        """Return dictionary mapping profiled function name to ProfileRecord with number of calls, wall time
+        and returned rows. If :reset: is True, statistics are cleared after returning.
+        """
+
+        return globalProfiler().stats(reset)
+
     def transaction(self):
         return self.Transaction(self)
 
@@ -846,13 +1509,20 @@ class Library(QObject, Lockable):
         assert(self._trans_states)
         self._trans_states.pop()
         self.connection.execute('release xs')
+        outermost = not self._trans_states
         self.lock.release()
+        if outermost:
+            self.committed.emit()
 
     def _rollback(self):
-        self.__restorestate()
-        self.connection.execute('rollback to xs')
-        self.connection.execute('release xs')
-        self.lock.release()
+        try:
+            self.__restorestate()
+            self.connection.execute('rollback to xs')
+            self.connection.execute('release xs')
+            # listeners reload data from database, so they are notified only after changes are rolled back
+            self.resetted.emit()
+        finally:
+            self.lock.release()
 
     def __savestate(self):
         state = {}
@@ -865,9 +1535,13 @@ class Library(QObject, Lockable):
         state = self._trans_states.pop()
         for attr in state.keys():
             setattr(self, attr, state[attr])
-        self.resetted.emit()
 
     def _connect(self, filename):
+        self._filename = filename
+        self._conn = self.__createConnection(filename)
+
+    @staticmethod
+    def __createConnection(filename):
         def strict_nocase_collation(left, right):
             l = helpers.uncase(left)
             r = helpers.uncase(right)
@@ -881,12 +1555,130 @@ class Library(QObject, Lockable):
         def match_tagvalue(value, pattern):
             return Wildcard(pattern) == str(TagValue(value))
 
-        self._filename = filename
-        self._conn = sqlite3.connect(filename, isolation_level=None)
-        self._conn.create_collation('strict_nocase', strict_nocase_collation)
-        self._conn.create_function('match_tagvalue', 2, match_tagvalue)
-        self._conn.row_factory = sqlite3.Row
-        self._conn.execute('pragma foreign_keys = on')
+        # access to connection is serialized with library lock, so it is safe to use connection from
+        # any thread (operations are usually executed in separate threads)
+        conn = sqlite3.connect(filename, isolation_level=None, check_same_thread=False)
+        conn.create_collation('strict_nocase', strict_nocase_collation)
+        conn.create_function('match_tagvalue', 2, match_tagvalue)
+        conn.row_factory = sqlite3.Row
+        conn.execute('pragma foreign_keys = on')
+        return conn
+
+    @property
+    def isInMemory(self):
+        return self.databaseFilename.lower() == ':memory:'
+
+    def openConnection(self):
+        """Open another connection to library database. Connection has same collations and functions registered
+        as main library connection, but is not protected by library lock. It can be used by code that should not
+        block library for a long time (for example, maintenance operations executed in another thread).
+        LibraryError is raised for in-memory libraries as they cannot be shared between connections.
+        Caller is responsible for closing connection.
+        """
+
+        if self.isInMemory:
+            raise LibraryError('in-memory database cannot be opened by another connection')
+        return self.__createConnection(self.databaseFilename)
+
+    def backupTo(self, filename, pages=256, progress_callback=None):
+        """Copy library database into file :filename: using SQLite online backup API. Database is copied by
+        :pages: pages per step and library remains usable between steps. If database is modified by another
+        connection during backup, copying will be restarted by SQLite.
+        :progress_callback: is called after each step with two arguments: number of pages remaining and total
+        number of pages. If it returns False, backup is cancelled. Partially copied file is removed when backup is
+        cancelled or fails. Returns True if backup is completed, False if it was cancelled.
+        """
+
+        class _BackupCancelled(Exception):
+            pass
+
+        def on_progress(status, remaining, total):
+            if progress_callback is not None and progress_callback(remaining, total) is False:
+                raise _BackupCancelled()
+
+        if os.path.exists(filename):
+            raise LibraryError('file "{0}" already exists'.format(filename))
+
+        completed = False
+        target_conn = sqlite3.connect(filename)
+        try:
+            if self.isInMemory:
+                with self.lock:
+                    self.connection.backup(target_conn, pages=pages, progress=on_progress)
+            else:
+                source_conn = self.openConnection()
+                try:
+                    source_conn.backup(target_conn, pages=pages, progress=on_progress)
+                finally:
+                    source_conn.close()
+            completed = True
+        except _BackupCancelled:
+            return False
+        finally:
+            target_conn.close()
+            if not completed:
+                os.remove(filename)
+        return True
+
+    def optimize(self, vacuum_pages=256, progress_callback=None):
+        """Update statistics used by query planner (ANALYZE and pragma optimize) and return free pages
+        to file system with incremental vacuum, :vacuum_pages: pages per step. Library is locked only
+        for duration of one step.
+        Libraries created by older versions have incremental vacuum disabled; for such libraries full VACUUM
+        is executed once to enable it, and it is reported as one step. Full VACUUM runs on separate connection
+        without locking library (other connections wait for database file lock instead), except for in-memory
+        libraries which have only one connection: such library stays locked until VACUUM is finished.
+        :progress_callback: is called after each step with two arguments: number of steps done and total
+        number of steps. If it returns False, optimization is cancelled. Returns True if all steps were done,
+        False if cancelled.
+        """
+
+        # in-memory library cannot be opened by another connection
+        shared_connection = self.isInMemory
+        conn = self.connection if shared_connection else self.openConnection()
+        try:
+            with self.lock:
+                free_pages = conn.execute('pragma freelist_count').fetchone()[0]
+                incremental = conn.execute('pragma auto_vacuum').fetchone()[0] == 2
+            vacuum_steps = (free_pages + vacuum_pages - 1) // vacuum_pages if incremental else 1
+            total_steps = 2 + vacuum_steps
+
+            def step_done(done_steps):
+                return progress_callback is None or progress_callback(done_steps, total_steps) is not False
+
+            with self.lock:
+                conn.execute('analyze')
+            if not step_done(1):
+                return False
+
+            with self.lock:
+                conn.execute('pragma optimize')
+            if not step_done(2):
+                return False
+
+            if not incremental:
+                if shared_connection:
+                    with self.lock:
+                        conn.execute('pragma auto_vacuum = incremental')
+                        conn.execute('vacuum')
+                else:
+                    conn.execute('pragma auto_vacuum = incremental')
+                    conn.execute('vacuum')
+                step_done(total_steps)
+                return True
+
+            for step in range(vacuum_steps):
+                with self.lock:
+                    conn.execute('pragma incremental_vacuum({0})'.format(int(vacuum_pages))).fetchall()
+                    if not conn.execute('pragma freelist_count').fetchone()[0]:
+                        step_done(total_steps)
+                        break
+                if not step_done(3 + step):
+                    return False
+            return True
+        finally:
+            if not shared_connection:
+                conn.close()
 
     @property
     def name(self):
@@ -914,6 +1706,12 @@ class Library(QObject, Lockable):
             else:
                 self.removeMeta(self.MetaStoragePath)
 
+    @property
+    def uuid(self):
+        """Unique identifier of this library. Used to distinguish libraries when synchronizing changes."""
+
+        return self.getMeta(self.MetaUuid)
+
     @property
     def profileUuid(self):
         with self.lock:
@@ -951,6 +1749,25 @@ class Library(QObject, Lockable):
     def autoDeleteUnusedTags(self, new_value):
         self.setMeta(self.MetaAutoDeleteUnusedTags, str(int(new_value)))
 
+    @property
+    def bitmapIndexEnabled(self):
+        """If True, library keeps in memory index of nodes linked with each tag (see BitmapIndex) and uses it to
+        evaluate node queries combining conditions on tag identities, without querying database.
+        Disabled by default, as index takes time to build and holds memory proportional to number of links.
+        """
+
+        with self.lock:
+            return self._bitmapIndex is not None
+
+    @bitmapIndexEnabled.setter
+    def bitmapIndexEnabled(self, enabled):
+        with self.lock:
+            if enabled and self._bitmapIndex is None:
+                self._bitmapIndex = BitmapIndex(self)
+            elif not enabled and self._bitmapIndex is not None:
+                self._bitmapIndex.close()
+                self._bitmapIndex = None
+
     def getNodeForResource(self, locator):
         nodes = self.nodes(NodeQuery(tag_locator=TagValue(locator)))
         return nodes[0] if nodes else None
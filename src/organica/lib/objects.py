@@ -7,6 +7,11 @@ def get_identity(some_object):
     return some_object if isinstance(some_object, Identity) else some_object.identity
 
 
+def _tagKey(tag):
+    """Key for tag that is equal for tags having equal classes and values"""
+    return helpers.uncase(tag.className), tag.value.hashKey
+
+
 def isCorrectIdent(name):
     """Check if name can be used as class or meta name"""
     return isinstance(name, str) and (0 < len(name) <= 1000) and all(c in string.ascii_letters + string.digits + '_'
@@ -19,8 +24,12 @@ class ObjectError(Exception):
 
 class Identity(object):
     """Each flushed library object has an identity that uniquely identifies an entry in
-    underlying database. Identity is immutable.
+    underlying database. Identity is immutable, so copies of library objects share
+    identity instances instead of duplicating them.
     """
+
+    __slots__ = ('__lib', '__id')
+
     def __init__(self, lib=None, id=-1):
         self.__lib = lib
         self.__id = id
@@ -38,20 +47,27 @@ class Identity(object):
         """Identity is valid (flushed) if there is real database row representing
         corresponding library object.
         """
-        return self.lib is not None and self.id > 0
+        return self.__lib is not None and self.__id > 0
 
     def __eq__(self, other):
         """Two unflushed identities are not equal"""
         if not isinstance(other, Identity):
             return NotImplemented
-        return self.isFlushed and other.isFlushed and self.lib == other.lib and self.id == other.id
+        return self.isFlushed and other.isFlushed and self.__lib == other.__lib and self.__id == other.__id
 
     def __ne__(self, other):
         return not self.__eq__(other)
 
+    def __hash__(self):
+        # unflushed identities are equal to nothing, so any hash will do for them
+        return hash((id(self.__lib), self.__id)) if self.isFlushed else object.__hash__(self)
+
+    def __copy__(self):
+        return self
+
     def __deepcopy__(self, memo):
-        # do not deepcopy referenced library
-        return Identity(self.lib, self.id)
+        # identity is immutable and should not deepcopy referenced library
+        return self
 
 
 class TagValue(object):
@@ -69,6 +85,8 @@ class TagValue(object):
     Note that all Python types TagValue can be converted to are immutable. TagValue is immutable too.
     """
 
+    __slots__ = ('value', '__valueType')
+
     # constants for value types
     TYPE_NONE, TYPE_TEXT, TYPE_NUMBER, TYPE_LOCATOR, TYPE_NODE_REFERENCE = range(5)
 
@@ -85,12 +103,14 @@ class TagValue(object):
 
     @staticmethod
     def _type_traits():
-        if not hasattr(TagValue, '_type_traits_list'):
+        try:
+            return TagValue._type_traits_list
+        except AttributeError:
             from organica.lib.locator import Locator
 
             # function to decode value of TYPE_NODE_REFERENCE stored in db
             def dec_object(tag_class, db_form):
-                if tag_class.lib.object(Identity(tag_class.lib, int(db_form))):
+                if tag_class.lib.node(Identity(tag_class.lib, int(db_form))):
                     return Identity(tag_class.lib, int(db_form))
                 raise TypeError('invalid id {0} for object reference tag'.format(db_form))
 
@@ -104,7 +124,11 @@ class TagValue(object):
                 TagValue.TYPE_NODE_REFERENCE: ('Node reference', 'nodeReference', (Identity, Node),
                                         (lambda obj: obj.id), dec_object)
             }
-        return TagValue._type_traits_list
+
+            # map Python type to value type
+            TagValue._python_types_map = dict((python_type, vt) for vt, traits in TagValue._type_traits_list.items()
+                                              for python_type in traits[2])
+            return TagValue._type_traits_list
 
     def __init__(self, value=None, value_type=-1):
         if isinstance(value, TagValue):
@@ -145,22 +169,39 @@ class TagValue(object):
     def valueType(self):
         return self.__valueType
 
-    def __getattr__(self, name):
-        for vt in self._type_traits().keys():
-            traits = self._type_traits()[vt]
-            if name == traits[1]:
-                return self.value if self.valueType == vt else None
-        else:
-            raise AttributeError()
+    # Typed accessors: getter returns None if value has another type, setter changes value type.
 
-    def __setattr__(self, name, value):
-        for vt in self._type_traits().keys():
-            traits = self._type_traits()[vt]
-            if name == traits[1]:
-                self.setValue(value, vt)
-                break
-        else:
-            return object.__setattr__(self, name, value)
+    @property
+    def text(self):
+        return self.value if self.__valueType == TagValue.TYPE_TEXT else None
+
+    @text.setter
+    def text(self, new_value):
+        self.setValue(new_value, TagValue.TYPE_TEXT)
+
+    @property
+    def number(self):
+        return self.value if self.__valueType == TagValue.TYPE_NUMBER else None
+
+    @number.setter
+    def number(self, new_value):
+        self.setValue(new_value, TagValue.TYPE_NUMBER)
+
+    @property
+    def locator(self):
+        return self.value if self.__valueType == TagValue.TYPE_LOCATOR else None
+
+    @locator.setter
+    def locator(self, new_value):
+        self.setValue(new_value, TagValue.TYPE_LOCATOR)
+
+    @property
+    def nodeReference(self):
+        return self.value if self.__valueType == TagValue.TYPE_NODE_REFERENCE else None
+
+    @nodeReference.setter
+    def nodeReference(self, new_value):
+        self.setValue(new_value, TagValue.TYPE_NODE_REFERENCE)
 
     @property
     def isNone(self):
@@ -170,6 +211,22 @@ class TagValue(object):
         self.__valueType = self.TYPE_NONE
         self.value = None
 
+    @property
+    def hashKey(self):
+        """Hashable key consistent with TagValue comparision: equal values have equal keys.
+        TagValue itself is mutable and not hashable, use this key to build dictionaries of values.
+        """
+
+        value_type = self.__valueType
+        if value_type == TagValue.TYPE_TEXT:
+            return value_type, helpers.uncase(self.value)
+        elif value_type == TagValue.TYPE_LOCATOR:
+            return value_type, self.value.databaseForm
+        elif value_type == TagValue.TYPE_NONE:
+            # None values are never equal
+            return value_type, id(self)
+        return value_type, self.value
+
     @property
     def databaseForm(self):
         """Returns value that can be stored in SQLite database.
@@ -204,38 +261,38 @@ class TagValue(object):
         """Get value type index from Python type
         """
 
-        for vt in TagValue._type_traits().keys():
-            traits = TagValue._type_traits()[vt]
-            if type_object in traits[2]:
-                return vt
-        else:
-            return -1
+        TagValue._type_traits()
+        return TagValue._python_types_map.get(type_object, -1)
 
     def __eq__(self, other):
-        if not isinstance(other, TagValue) and TagValue.getValueTypeForType(type(other)) == -1:
-            return NotImplemented
-
-        # try to convert value to TagValue (it means we can compare TagValue and,
-        # for example, strings)
-        other = TagValue(other)
-
-        if self.valueType != other.valueType or not TagValue.isValueTypeCorrect(self.valueType):
-            return False
+        # values of other types are compared as if they were converted to TagValue (it means we
+        # can compare TagValue and, for example, strings)
+        if isinstance(other, TagValue):
+            other_type, other_value = other.__valueType, other.value
+        else:
+            other_type, other_value = TagValue.getValueTypeForType(type(other)), other
+            if other_type == -1:
+                return NotImplemented
 
         # None values are never equal
-        if self.valueType == self.TYPE_NONE:
+        if self.__valueType != other_type or self.__valueType == TagValue.TYPE_NONE:
             return False
 
         # custom comparision for text - should ignore case
-        if self.valueType == self.TYPE_TEXT:
-            return helpers.cicompare(self.text, other.text)
+        if self.__valueType == TagValue.TYPE_TEXT:
+            return helpers.cicompare(self.value, other_value)
         else:
-            traits = self._type_traits()[self.valueType]
-            return getattr(self, traits[1]) == getattr(other, traits[1])
+            return self.value == other_value
 
     def __ne__(self, other):
         return not self.__eq__(other)
 
+    def __deepcopy__(self, memo):
+        copied = object.__new__(TagValue)
+        copied.value = deepcopy(self.value, memo)
+        copied.__valueType = self.__valueType
+        return copied
+
     @staticmethod
     def typeString(valueType):
         """Human-readable name for value type
@@ -293,17 +350,11 @@ class LibraryObject(object):
     See __eq__ reimplemented method docstrings for details about comparision.
     """
 
+    __slots__ = ('identity', )
+
     def __init__(self, identity=None):
         super().__init__()
-        self.__identity = identity or Identity()
-
-    @property
-    def identity(self):
-        return self.__identity
-
-    @identity.setter
-    def identity(self, value):
-        self.__identity = value
+        self.identity = identity or Identity()
 
     @property
     def lib(self):
@@ -348,6 +399,8 @@ class TagClass(LibraryObject):
     library for classes.
     """
 
+    __slots__ = ('__name', '__valueType', '__hidden')
+
     def __init__(self, identity, name, value_type, hidden=False):
         super().__init__(identity)
 
@@ -393,7 +446,7 @@ class TagClass(LibraryObject):
         return not r if r != NotImplemented else r
 
     def __hash__(self):
-        return self.id
+        return hash(helpers.uncase(self.name))
 
 
 class Tag(LibraryObject):
@@ -404,6 +457,8 @@ class Tag(LibraryObject):
     class name.
     """
 
+    __slots__ = ('_value', 'tagClass', 'useCount')
+
     def __init__(self, tag_class=None, tag_value=None, use_count=0):
         super().__init__()
         self.value = TagValue(tag_value)
@@ -446,15 +501,18 @@ class Tag(LibraryObject):
 
     def isFriendOf(self, other_tag):
         """Two tags are considered to be friends if there is at least one node that have
-        both these tags linked. Tag is always friend of itself.
+        both these tags linked. Tag is always friend of itself. Other tag can be Tag or Identity.
         """
 
         if not self.isFlushed or other_tag is None or not other_tag.isFlushed:
             return False
 
-        if self.identity == other_tag.identity:
+        other_identity = other_tag.identity if isinstance(other_tag, Tag) else other_tag
+        if self.identity == other_identity:
             return True
 
+        from organica.lib.filters import NodeQuery
+
         return bool(self.lib.nodes(NodeQuery(linked_with=self) & NodeQuery(linked_with=other_tag)))
 
     def remove(self, remove_links=False):
@@ -479,6 +537,10 @@ class Tag(LibraryObject):
         r = self.__eq__(other)
         return not r if r != NotImplemented else r
 
+    def __hash__(self):
+        # Tag is mutable: do not change tags while they are kept in sets or used as dictionary keys
+        return hash(_tagKey(self))
+
     def actual(self):
         return self.lib.tag(self) if self.isFlushed else None
 
@@ -488,19 +550,22 @@ class Node(LibraryObject):
     display name template and set of linked tags.
     """
 
+    __slots__ = ('displayNameTemplate', '__allTags', '__tagsFetched', '__tagsByKey')
+
     def __init__(self, display_name='', tags=None):
         super().__init__()
         self.displayNameTemplate = display_name
         self.__allTags = []
         self.__tagsFetched = False
+        self.__tagsByKey = None  # index of linked tags built on demand, see __tagIndex
         if tags:
             for tag in tags:
                 self.linkTag(tag)
 
     @property
     def displayName(self):
-        from organica.lib.formatstring import FormatString
-        return FormatString(self.displayNameTemplate).format(self)
+        from organica.lib.formatstring import compileTemplate
+        return compileTemplate(self.displayNameTemplate).render(self)
 
     @property
     def allTags(self):
@@ -508,19 +573,42 @@ class Node(LibraryObject):
         """
 
         self.ensureTagsFetched()
+        # caller can modify list or tags in it, so index is rebuilt on next lookup
+        self.__tagsByKey = None
         return self.__allTags
 
     @allTags.setter
     def allTags(self, new_tags):
         self.__tagsFetched = True
         self.__allTags = deepcopy(new_tags)
+        self.__tagsByKey = None
+
+    @property
+    def tagsFetched(self):
+        """True if list of linked tags is already fetched from database or assigned. See ensureTagsFetched."""
+        return self.__tagsFetched
+
+    def __tagIndex(self):
+        """Dictionary mapping key of tag class and value to list of linked tags having these class and value.
+        Index is dropped by every method that changes list of tags or gives it away (see allTags).
+        """
+
+        if self.__tagsByKey is None:
+            index = {}
+            for tag in self.__allTags:
+                index.setdefault(_tagKey(tag), []).append(tag)
+            self.__tagsByKey = index
+        return self.__tagsByKey
 
     def tags(self, condition=None):
         """Get list of tags that satisfies given condition. See Tag.passes for details about condition.
         """
 
         self.ensureTagsFetched()
-        return [deepcopy(t) for t in self.__allTags if t.passes(condition)]
+        if condition is None or isinstance(condition, (Tag, Identity)):
+            return [deepcopy(t) for t in self.__allTags if t.passes(condition)]
+        # query is checked for all tags at once
+        return [deepcopy(t) for t, passes in zip(self.__allTags, condition.passesMany(self.__allTags)) if passes]
 
     def testTag(self, condition):
         """Check if at least one tag satisfying given condition is linked with node. See Tag.passes for
@@ -528,6 +616,9 @@ class Node(LibraryObject):
         """
 
         self.ensureTagsFetched()
+        if isinstance(condition, Tag):
+            # only tags with same key can be equal to given one
+            return any(t == condition for t in self.__tagIndex().get(_tagKey(condition), ()))
         return any((t.passes(condition) for t in self.__allTags))
 
     def passes(self, condition):
@@ -554,10 +645,15 @@ class Node(LibraryObject):
         if not nodeList:
             return []
 
-        result = nodeList[0].allTags
+        # keys of candidate tags are calculated only once
+        result = [(_tagKey(tag), tag) for tag in nodeList[0].allTags]
         for node in nodeList[1:]:
-            result = [tag for tag in result if node.testTag(tag)]
-        return result
+            if not result:
+                break
+            node.ensureTagsFetched()
+            index = node.__tagIndex()
+            result = [(key, tag) for key, tag in result if any(t == tag for t in index.get(key, ()))]
+        return [tag for key, tag in result]
 
     def linkTag(self, tag):
         """Link tag to this node. If same tag already linked to node, ObjectError will be raised.
@@ -565,11 +661,15 @@ class Node(LibraryObject):
         Node will hold copy of given Tag object, not original one.
         """
 
-        from organica.lib.filters import TagQuery
-        if self.testTag(TagQuery(tag_class=tag.tagClass, value=tag.value)):
+        self.ensureTagsFetched()
+        index = self.__tagIndex()
+        key = _tagKey(tag)
+        if any(t.tagClass == tag.tagClass and t.value == tag.value for t in index.get(key, ())):
             raise ObjectError('tag {0}:{1} already linked to object'.format(tag.className, tag.value.printable()))
         else:
-            self.__allTags.append(deepcopy(tag))
+            linked_tag = deepcopy(tag)
+            self.__allTags.append(linked_tag)
+            index.setdefault(key, []).append(linked_tag)
 
     def linkNewTag(self, tag_class, tag_value):
         """Convenience method that creates tag with given class and value and immediately links it
@@ -613,7 +713,8 @@ class Node(LibraryObject):
                 raise ObjectError('tag {0} is not linked to node'.format(m))
             self.__allTags = [x for x in self.__allTags if not x.passes(condition)]
         else:
-            self.__allTags = [x for x in self.__allTags if not condition.passes(x)]
+            self.__allTags = [x for x, passes in zip(self.__allTags, condition.passesMany(self.__allTags)) if not passes]
+        self.__tagsByKey = None
 
     def __eq__(self, other):
         """Nodes are different from other LibraryObject.
@@ -636,6 +737,21 @@ class Node(LibraryObject):
         r = self.__eq__(other)
         return not r if r != NotImplemented else r
 
+    def __hash__(self):
+        # nodes with different identities are never equal
+        return hash(self.identity)
+
+    def __deepcopy__(self, memo):
+        # index of linked tags is not copied: copy builds its own one when needed
+        copied = object.__new__(Node)
+        memo[id(self)] = copied
+        copied.identity = self.identity
+        copied.displayNameTemplate = self.displayNameTemplate
+        copied.__allTags = deepcopy(self.__allTags, memo)
+        copied.__tagsFetched = self.__tagsFetched
+        copied.__tagsByKey = None
+        return copied
+
     def ensureTagsFetched(self):
         """When node is initialized from database, code will not automatically query for linked tags
         at the moment (for perfomance). This is made in call to this method. Method is automatically
@@ -647,6 +763,7 @@ class Node(LibraryObject):
 
         if self.isFlushed and not self.__tagsFetched:
             self.__allTags = self.lib.tags(TagQuery(linked_with=self))
+            self.__tagsByKey = None
         self.__tagsFetched = True
 
     def updateTag(self, tag):
@@ -657,6 +774,7 @@ class Node(LibraryObject):
             for i in range(len(self.__allTags)):
                 if self.__allTags[i].isFlushed and self.__allTags[i].identity == tag.identity:
                     self.__allTags[i] = deepcopy(tag)
+                    self.__tagsByKey = None
                     break
 
     def remove(self, remove_references=False):
@@ -1,56 +1,241 @@
-from PyQt4.QtCore import Qt, QAbstractItemModel, QModelIndex
+import bisect
+import logging
+from threading import Thread, Condition
+from collections import OrderedDict
+from PyQt4.QtCore import Qt, QObject, QAbstractItemModel, QModelIndex, QTimer, pyqtSignal
 from organica.utils.helpers import removeLastSlash, tr
+import organica.utils.helpers as helpers
 from organica.utils.lockable import Lockable
-from organica.lib.sets import NodeSet
-from organica.lib.filters import TagQuery
-from organica.lib.objects import get_identity
+from organica.lib.filters import NodeQuery, TagQuery
+from organica.lib.objects import Node, get_identity
+from organica.lib.formatstring import ParseError, compileTemplate
+import organica.utils.constants as constants
+
+
+logger = logging.getLogger(__name__)
+
+
+# Columns can implement renderMany(nodes, connection) returning list of texts to show for given nodes. Texts of such
+# columns are rendered by RowsLoader in background, and these columns should not provide data for other roles.
+# Texts of columns are cached by model. Column can implement classNames(node) returning set of names of tag
+# classes (converted with helpers.uncase) its text for node depends on, otherwise text is rendered again after any
+# change of tags linked to node.
 
 
 class NodeNameColumn(object):
     def data(self, index, node, role=Qt.DisplayRole):
         return node.displayName if role == Qt.DisplayRole else None
 
+    def renderMany(self, nodes, connection=None):
+        from organica.lib.formatstring import displayNames
+
+        return displayNames(nodes, connection)
+
+    def classNames(self, node):
+        try:
+            return compileTemplate(node.displayNameTemplate).classNames
+        except ParseError:
+            return frozenset()
+
     title = tr('Name')
 
 
 class FormattedColumn(object):
     def __init__(self, template, title=tr('Custom')):
-        from organica.lib.formatstring import FormatString
-
-        self.__template = FormatString(template)
+        self.__template = compileTemplate(template)
         self.title = title
 
     def data(self, index, node, role=Qt.DisplayRole):
         if role == Qt.DisplayRole:
-            return self.__template.format(node)
+            return self.__template.render(node)
         return None
 
+    def renderMany(self, nodes, connection=None):
+        from organica.lib.formatstring import renderMany
+
+        return renderMany([self.__template] * len(nodes), nodes, connection)
+
+    def classNames(self, node):
+        return self.__template.classNames
+
 
 class NodeLocatorColumn(FormattedColumn):
     def __init__(self):
         FormattedColumn.__init__(self, '{locator: max=1, end="", locator=name}', tr('Locator'))
 
 
+class RowsLoader(QObject):
+    """Renders texts of ObjectsModel cells in background thread using separate connection to library database.
+    Only last request is processed: request that is not started yet is replaced by newer one, and request being
+    processed is abandoned between chunks of ChunkSize rows when newer one arrives.
+    """
+
+    # emitted from loader thread with generation passed to request and dictionary mapping node identity to list
+    # of column texts. Text is None if column cannot be rendered in background.
+    rowsLoaded = pyqtSignal(int, object)
+
+    ChunkSize = 64
+
+    def __init__(self, lib):
+        QObject.__init__(self)
+        self.__lib = lib
+        self.__condition = Condition()
+        self.__request = None  # tuple (sequence number, generation, identities, columns) waiting for processing
+        self.__requestSeq = 0  # sequence number of last request
+        self.__thread = None
+        self.__stopped = False
+
+    def request(self, generation, identities, columns):
+        """Request rendering cells for nodes with given identities. Thread is started on first request (or
+        again if previous one has died).
+        """
+
+        with self.__condition:
+            if self.__stopped:
+                return
+            self.__requestSeq += 1
+            self.__request = (self.__requestSeq, generation, list(identities), list(columns))
+            if self.__thread is None or not self.__thread.is_alive():
+                self.__thread = Thread(target=self.__work, name='RowsLoader')
+                self.__thread.daemon = True
+                self.__thread.start()
+            self.__condition.notify()
+
+    def cancel(self):
+        """Abandon all requests made before"""
+
+        with self.__condition:
+            self.__requestSeq += 1
+            self.__request = None
+
+    def stop(self):
+        """Stop loader thread and wait for it to finish. Requests are ignored after stopping."""
+
+        with self.__condition:
+            self.__stopped = True
+            self.__request = None
+            self.__condition.notify()
+            thread = self.__thread
+        if thread is not None:
+            thread.join()
+
+    def isRunning(self):
+        with self.__condition:
+            return self.__thread is not None and self.__thread.is_alive()
+
+    def __isCurrent(self, request_seq):
+        with self.__condition:
+            return not self.__stopped and request_seq == self.__requestSeq
+
+    def __work(self):
+        try:
+            connection = self.__lib.openConnection()
+        except Exception as err:
+            # rows are rendered using library connection then
+            logger.warning('failed to open connection for background loading: {0}'.format(err))
+            connection = None
+
+        try:
+            while True:
+                with self.__condition:
+                    while self.__request is None and not self.__stopped:
+                        self.__condition.wait()
+                    if self.__stopped:
+                        return
+                    request_seq, generation, identities, columns = self.__request
+                    self.__request = None
+
+                for chunk_start in range(0, len(identities), self.ChunkSize):
+                    if not self.__isCurrent(request_seq):
+                        break
+                    chunk = identities[chunk_start:chunk_start + self.ChunkSize]
+                    try:
+                        cells = self.__render(chunk, columns, connection)
+                    except Exception as err:
+                        # model will render these rows itself
+                        logger.warning('failed to render rows in background: {0}'.format(err))
+                        cells = dict((identity, [None] * len(columns)) for identity in chunk)
+                    if self.__isCurrent(request_seq):
+                        self.rowsLoaded.emit(generation, cells)
+        finally:
+            if connection is not None:
+                connection.close()
+
+    def __render(self, identities, columns, connection):
+        templates = self.__lib.nodeDisplayNames([identity.id for identity in identities], connection)
+        nodes = []
+        for identity in identities:
+            if identity.id in templates:
+                node = Node(templates[identity.id])
+                node.identity = identity
+                nodes.append(node)
+
+        texts = [column.renderMany(nodes, connection) if hasattr(column, 'renderMany') else [None] * len(nodes)
+                 for column in columns]
+        return dict((node.identity, [column_texts[index] for column_texts in texts])
+                    for index, node in enumerate(nodes))
+
 
 class ObjectsModel(QAbstractItemModel, Lockable):
+    """Model shows nodes matching query ordered by id. Rows are loaded by pages of FetchBatchSize identities
+    when view asks for them (see canFetchMore and fetchMore), nodes themselves are fetched in bulk for window
+    of WindowSize rows around requested one and only CacheSize last used nodes are kept in memory.
+    If :background_loading: is True and library is not in-memory one, cell texts are rendered by RowsLoader
+    for rows around requested one, and PlaceholderText is shown until they are ready.
+    Displayed texts of cells are cached for CacheSize rows and rendered again only when node or tags text
+    depends on are changed.
+    Rows of removed nodes are collected and removed together when control returns to event loop or earlier,
+    when rows or data are requested from model. Each range of adjacent rows is removed with single
+    beginRemoveRows call.
+    """
+
     NodeIdentityRole = Qt.UserRole + 200
 
-    def __init__(self, lib):
+    FetchBatchSize = 256
+    WindowSize = 64
+    CacheSize = 1024
+
+    PlaceholderText = tr('Loading...')
+
+    def __init__(self, lib, background_loading=True):
         QAbstractItemModel.__init__(self)
         Lockable.__init__(self)
         self.__lib = lib
-        self.__set = NodeSet(self.__lib)
         self.__columns = [NodeNameColumn(), NodeLocatorColumn()]
-        self.__cached_nodes = []
+        self.__identities = []  # identities of loaded rows, sorted by id
+        self.__ids = []  # ids of __identities, kept to find row for inserted node
+        self.__rows = {}  # map node identity to row, rows starting from __indexedRows can be stale (see __rowOf)
+        self.__indexedRows = 0
+        self.__pendingRemovals = []  # identities of nodes which rows should be removed
+        self.__cached_nodes = OrderedDict()  # LRU cache of nodes by identity
+        self.__exhausted = False  # True if all matching identities are loaded
         self.__filters = []
-
-        with self.__set.lock:
-            self.__fetch()
-
-            self.__set.elementAppeared.connect(self.__onElementAppeared)
-            self.__set.elementDisappeared.connect(self.__onElementDisappeared)
-            self.__set.elementUpdated.connect(self.__onElementUpdated)
-            self.__set.resetted.connect(self.__onResetted)
+        self.__loader = None
+        self.__generation = 0  # incremented each time texts being loaded by loader become stale
+        self.__cells = OrderedDict()  # LRU cache of lists of column texts (None if not rendered) by node identity
+        self.__requestedWindows = set()  # first rows of windows requested from loader
+        # identities of nodes which texts were invalidated after last commit. Loader reads committed data
+        # only, so texts it renders for these nodes can be stale until transaction is committed.
+        self.__uncommitted = set()
+
+        self.__fetchBatch(notify=False)
+
+        if self.__lib is not None:
+            conn_type = Qt.DirectConnection if constants.disable_set_queued_connections else Qt.QueuedConnection
+            if background_loading and not self.__lib.isInMemory:
+                self.__loader = RowsLoader(self.__lib)
+                self.__loader.rowsLoaded.connect(self.__onRowsLoaded, conn_type)
+                # loader thread would outlive model and keep library alive otherwise
+                self.destroyed.connect(self.__loader.stop)
+                self.__lib.closed.connect(self.__loader.stop)
+            self.__lib.nodeUpdated.connect(self.__onNodeUpdated, conn_type)
+            self.__lib.nodeCreated.connect(self.__onNodeUpdated, conn_type)
+            self.__lib.nodeRemoved.connect(self.__onNodeRemoved, conn_type)
+            self.__lib.linkCreated.connect(self.__onLinkChanged, conn_type)
+            self.__lib.linkRemoved.connect(self.__onLinkChanged, conn_type)
+            self.__lib.tagUpdated.connect(self.__onTagUpdated, conn_type)
+            self.__lib.resetted.connect(self.__onResetted)
+            self.__lib.committed.connect(self.__onCommitted, conn_type)
 
     @property
     def lib(self):
@@ -60,7 +245,7 @@ class ObjectsModel(QAbstractItemModel, Lockable):
     @property
     def query(self):
         with self.lock:
-            r_filter = self.__filters[0] if self.__filters else TagQuery()
+            r_filter = self.__filters[0] if self.__filters else NodeQuery()
             for f in self.__filters[1:]:
                 r_filter = r_filter & f
             return r_filter
@@ -74,34 +259,62 @@ class ObjectsModel(QAbstractItemModel, Lockable):
     def filters(self, new_filters):
         with self.lock:
             self.__filters = new_filters
-            self.__set.query = self.query
+            self.__onResetted()
+
+    @property
+    def loader(self):
+        """RowsLoader used by model or None if cells are rendered in calling thread"""
+        with self.lock:
+            return self.__loader
 
     def flags(self, index):
         return Qt.ItemIsEnabled | Qt.ItemIsSelectable
 
     def data(self, index, role=Qt.DisplayRole):
-        if index.isValid() and self.hasIndex(index.row(), index.column()):
-            node = self.__cached_nodes[index.row()]
-            if node is not None:
+        with self.lock:
+            self.__flushRemovals()
+            if index.isValid() and self.hasIndex(index.row(), index.column()):
+                identity = self.__identities[index.row()]
                 if role == self.NodeIdentityRole:
-                    return node.identity
-                else:
-                    return self.__columns[index.column()].data(index, node, role)
+                    return identity
+
+                column = self.__columns[index.column()]
+                in_background = self.__loader is not None and hasattr(column, 'renderMany')
+                if role == Qt.DisplayRole:
+                    texts = self.__cells.get(identity)
+                    if texts is not None:
+                        self.__cells.move_to_end(identity)
+                        if texts[index.column()] is not None:
+                            return texts[index.column()]
+                    elif in_background:
+                        self.__requestWindow(index.row())
+                        return self.PlaceholderText
+                elif in_background:
+                    return None
+
+                node = self.__node(index.row())
+                if node is not None:
+                    value = column.data(index, node, role)
+                    if role == Qt.DisplayRole and value is not None:
+                        self.__storeText(identity, index.column(), value)
+                    return value
         return None
 
     def headerData(self, section, orientation, role=Qt.DisplayRole):
         with self.lock:
+            self.__flushRemovals()
             if orientation == Qt.Horizontal:
                 if role == Qt.DisplayRole:
                     if 0 <= section < len(self.__columns):
                         return self.__columns[section].title
-            elif 0 <= section < len(self.__cached_nodes):
+            elif 0 <= section < len(self.__identities):
                 return str(section)
         return None
 
     def rowCount(self, index=QModelIndex()):
         with self.lock:
-            return len(self.__cached_nodes)
+            self.__flushRemovals()
+            return len(self.__identities) if not index.isValid() else 0
 
     def columnCount(self, index=QModelIndex()):
         with self.lock:
@@ -109,6 +322,7 @@ class ObjectsModel(QAbstractItemModel, Lockable):
 
     def index(self, row, column, parent=QModelIndex()):
         with self.lock:
+            self.__flushRemovals()
             if not parent.isValid() and self.hasIndex(row, column):
                 return self.createIndex(row, column)
         return QModelIndex()
@@ -116,6 +330,21 @@ class ObjectsModel(QAbstractItemModel, Lockable):
     def parent(self, index):
         return QModelIndex()
 
+    def canFetchMore(self, parent=QModelIndex()):
+        with self.lock:
+            return not parent.isValid() and not self.__exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        with self.lock:
+            if not parent.isValid():
+                self.__fetchBatch()
+
+    def fetchAll(self):
+        """Load all rows. Required by widgets that do not fetch rows on demand (combo boxes, for example)."""
+        with self.lock:
+            while not self.__exhausted:
+                self.__fetchBatch()
+
     @property
     def columns(self):
         with self.lock:
@@ -126,45 +355,294 @@ class ObjectsModel(QAbstractItemModel, Lockable):
         with self.lock:
             if new_columns != self.__columns:
                 self.__columns = new_columns
+                self.__invalidateCells()
                 self.reset()
 
-    def __onElementAppeared(self, new_element):
+    def __fetchBatch(self, notify=True):
+        with self.lock:
+            if self.__lib is None:
+                self.__exhausted = True
+                return
+
+            self.__flushRemovals()
+            query = self.query.orderBy('id').limit(self.FetchBatchSize)
+            if self.__identities:
+                query = query.after(self.__identities[-1])
+            identities = self.__lib.nodeIds(query)
+            self.__exhausted = len(identities) < self.FetchBatchSize
+            if identities:
+                first_row = len(self.__identities)
+                if notify:
+                    self.beginInsertRows(QModelIndex(), first_row, first_row + len(identities) - 1)
+                for row, identity in enumerate(identities, first_row):
+                    self.__rows[identity] = row
+                if self.__indexedRows == first_row:
+                    self.__indexedRows += len(identities)
+                self.__identities += identities
+                self.__ids += [identity.id for identity in identities]
+                if notify:
+                    self.endInsertRows()
+
+    def __node(self, row):
+        """Get node shown at given row. Nodes of window containing row are fetched if it is not cached"""
+
+        identity = self.__identities[row]
+        node = self.__cached_nodes.get(identity)
+        if node is not None:
+            self.__cached_nodes.move_to_end(identity)
+            return node
+
+        window_start = row - row % self.WindowSize
+        window = [ident for ident in self.__identities[window_start:window_start + self.WindowSize]
+                  if ident not in self.__cached_nodes]
+        fetched = self.__lib.nodesByIds(ident.id for ident in window)
+        for ident in window:
+            if ident.id in fetched:
+                self.__cached_nodes[ident] = fetched[ident.id]
+        # node requested is the most recently used one
+        if identity in self.__cached_nodes:
+            self.__cached_nodes.move_to_end(identity)
+        while len(self.__cached_nodes) > self.CacheSize:
+            self.__cached_nodes.popitem(last=False)
+        return self.__cached_nodes.get(identity)
+
+    def __requestWindow(self, row):
+        """Request texts for window containing row, previous and next ones from loader"""
+
+        window_start = row - row % self.WindowSize
+        if window_start not in self.__requestedWindows:
+            first_row = max(0, window_start - self.WindowSize)
+            last_row = min(len(self.__identities), window_start + 2 * self.WindowSize)
+            # loader abandons previous requests
+            self.__requestedWindows = set(range(first_row, last_row, self.WindowSize))
+            self.__loader.request(self.__generation, self.__identities[first_row:last_row], self.__columns)
+
+    def __storeText(self, identity, column, text):
+        texts = self.__cells.get(identity)
+        if texts is None:
+            texts = self.__cells[identity] = [None] * len(self.__columns)
+            while len(self.__cells) > self.CacheSize:
+                self.__cells.popitem(last=False)
+        texts[column] = text
+
+    def __invalidateCells(self, identity=None, class_names=None, node=None):
+        """Forget cached texts of node with given identity (or of all nodes). If :class_names: is given, only
+        texts of columns depending on tags of these classes are forgotten (:node: is passed to
+        column.classNames). Returns list of columns which texts were forgotten. Texts being loaded by loader now
+        are dropped as they can be stale too.
+        """
+
+        if self.__loader is not None:
+            self.__generation += 1
+            self.__requestedWindows = set()
+            self.__loader.cancel()
+            if identity is not None:
+                self.__uncommitted.add(identity)
+
+        if identity is None:
+            self.__uncommitted = set()
+            self.__cells = OrderedDict()
+            return list(range(len(self.__columns)))
+
+        texts = self.__cells.get(identity)
+        if texts is None:
+            return []
+        elif class_names is None:
+            del self.__cells[identity]
+            return list(range(len(self.__columns)))
+
+        class_names = set(helpers.uncase(class_name) for class_name in class_names)
+        invalidated = []
+        for column_index, column in enumerate(self.__columns):
+            if texts[column_index] is not None:
+                if (node is None or not hasattr(column, 'classNames') or
+                        column.classNames(node) & class_names):
+                    texts[column_index] = None
+                    invalidated.append(column_index)
+        return invalidated
+
+    def __emitCellsChanged(self, identity, columns):
+        row = self.__rowOf(identity)
+        if row is not None and columns:
+            self.dataChanged.emit(self.index(row, min(columns)), self.index(row, max(columns)))
+
+    def __onRowsLoaded(self, generation, cells):
+        with self.lock:
+            if generation != self.__generation:
+                return
+
+            rows = []
+            self.__flushRemovals()
+            for identity, texts in cells.items():
+                row = self.__rowOf(identity)
+                if row is not None:
+                    self.__cells[identity] = texts
+                    self.__cells.move_to_end(identity)
+                    rows.append(row)
+            while len(self.__cells) > self.CacheSize:
+                self.__cells.popitem(last=False)
+
+            if rows:
+                self.dataChanged.emit(self.index(min(rows), 0), self.index(max(rows), self.columnCount() - 1))
+
+    def __isLoaded(self, identity):
+        """Check if row for node with given identity would be among loaded rows"""
+        return self.__exhausted or bool(self.__identities and identity.id <= self.__identities[-1].id)
+
+    def __rowOf(self, identity):
+        """Get row of node with given identity or None if node is not shown. Rows following inserted or
+        removed ones are not indexed again immediately, index is updated only when stale row is requested. So
+        series of insertions and removals costs one reindexing instead of one for each change.
+        """
+
+        row = self.__rows.get(identity)
+        if row is None or row < self.__indexedRows:
+            return row
+
+        for stale_row in range(self.__indexedRows, len(self.__identities)):
+            self.__rows[self.__identities[stale_row]] = stale_row
+        self.__indexedRows = len(self.__identities)
+        return self.__rows.get(identity)
+
+    def __insertRow(self, identity):
+        row = bisect.bisect_left(self.__ids, identity.id)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.__identities.insert(row, identity)
+        self.__ids.insert(row, identity.id)
+        self.__rows[identity] = row
+        self.__indexedRows = min(self.__indexedRows, row)
+        self.__requestedWindows = set()
+        self.endInsertRows()
+
+    def __removeRow(self, identity):
+        """Schedule removing row of node with given identity"""
+
+        if identity in self.__rows:
+            self.__pendingRemovals.append(identity)
+            if len(self.__pendingRemovals) == 1:
+                QTimer.singleShot(0, self.__onRemovalTimer)
+
+    def __onRemovalTimer(self):
         with self.lock:
-            # append new element to end of list
-            node_to_cache = self.lib.node(new_element)
-            if node_to_cache is not None:
-                self.beginInsertRows(QModelIndex(), len(self.__cached_nodes), len(self.__cached_nodes))
-                self.__cached_nodes.append(node_to_cache)
-                self.endInsertRows()
+            self.__flushRemovals()
+
+    def __flushRemovals(self):
+        """Remove rows of nodes scheduled by __removeRow, ranges of adjacent rows are removed at once"""
+
+        if not self.__pendingRemovals:
+            return
+
+        removed_rows = sorted(set(row for row in (self.__rowOf(identity) for identity in self.__pendingRemovals)
+                                  if row is not None))
+        self.__pendingRemovals = []
+
+        # split rows into ranges of adjacent ones and remove them starting from last range, so rows of ranges
+        # that are not removed yet are not shifted
+        ranges = []
+        for row in removed_rows:
+            if ranges and ranges[-1][1] == row - 1:
+                ranges[-1][1] = row
+            else:
+                ranges.append([row, row])
+
+        for first_row, last_row in reversed(ranges):
+            self.beginRemoveRows(QModelIndex(), first_row, last_row)
+            for identity in self.__identities[first_row:last_row + 1]:
+                del self.__rows[identity]
+                self.__cached_nodes.pop(identity, None)
+                self.__invalidateCells(identity)
+            del self.__identities[first_row:last_row + 1]
+            del self.__ids[first_row:last_row + 1]
+            self.__indexedRows = min(self.__indexedRows, first_row)
+            self.endRemoveRows()
+
+    def __updateNode(self, node, class_names=None):
+        """Update row of node after its tags of given classes (or node itself) were changed"""
+
+        self.__flushRemovals()
+        identity = node.identity
+        passes = self.query.passes(node)
+        if identity in self.__rows:
+            self.__cached_nodes.pop(identity, None)
+            if passes:
+                self.__emitCellsChanged(identity, self.__invalidateCells(identity, class_names, node))
+            else:
+                self.__removeRow(identity)
+        elif passes and self.__isLoaded(identity):
+            # nodes following last loaded one will be fetched later
+            self.__insertRow(identity)
+
+    def __onNodeUpdated(self, updated_node):
+        with self.lock:
+            self.__updateNode(updated_node)
+
+            # names of updated node are shown by nodes referring to it
+            if updated_node.isFlushed and self.__cells:
+                for identity in self.__lib.nodeIds(NodeQuery(tags=TagQuery(node_ref=updated_node))):
+                    if identity in self.__rows and identity != updated_node.identity:
+                        self.__cached_nodes.pop(identity, None)
+                        self.__emitCellsChanged(identity, self.__invalidateCells(identity))
 
-    def __onElementDisappeared(self, removed_element):
+    def __onNodeRemoved(self, removed_node):
         with self.lock:
-            for node_index in range(len(self.__cached_nodes)):
-                if self.__cached_nodes[node_index].identity == removed_element:
-                    self.beginRemoveRows(QModelIndex(), node_index, node_index)
-                    del self.__cached_nodes[node_index]
-                    self.endRemoveRows()
-                    break
+            self.__removeRow(removed_node.identity)
 
-    def __onElementUpdated(self, updated_element):
+    def __onLinkChanged(self, node, tag):
         with self.lock:
-            for node_index in range(len(self.__cached_nodes)):
-                if self.__cached_nodes[node_index].identity == updated_element:
-                    self.dataChanged.emit(self.index(node_index, 0), self.index(node_index, self.columnCount() - 1))
-                    break
+            self.__updateNode(node, (tag.className, ))
+
+    def __onTagUpdated(self, updated_tag, old_tag):
+        with self.lock:
+            class_names = (updated_tag.className, old_tag.className)
+            needs_check = self.query.qeval() != 1
+            for identity in self.__lib.nodeIds(NodeQuery(linked_with=updated_tag)):
+                if identity in self.__rows and not needs_check:
+                    # node passes query anyway, no need to fetch it. Template is taken from cached node if any.
+                    node = self.__cached_nodes.pop(identity, None)
+                    self.__emitCellsChanged(identity, self.__invalidateCells(identity, class_names, node))
+                elif identity in self.__rows or self.__isLoaded(identity):
+                    node = self.__lib.node(identity)
+                    if node is not None:
+                        self.__updateNode(node, class_names)
+
+    def __onCommitted(self):
+        with self.lock:
+            if not self.__uncommitted:
+                return
+
+            # texts rendered by loader before commit are dropped, rows are requested again by view
+            uncommitted = self.__uncommitted
+            self.__flushRemovals()
+            for identity in uncommitted:
+                self.__invalidateCells(identity)
+                row = self.__rowOf(identity)
+                if row is not None:
+                    self.dataChanged.emit(self.index(row, 0), self.index(row, self.columnCount() - 1))
+            self.__uncommitted = set()
 
     def __onResetted(self):
         with self.lock:
             self.beginResetModel()
-            self.__cached_nodes = []
-            self.__fetch()
+            self.__identities = []
+            self.__ids = []
+            self.__rows = {}
+            self.__indexedRows = 0
+            self.__pendingRemovals = []
+            self.__cached_nodes = OrderedDict()
+            self.__invalidateCells()
+            self.__exhausted = False
+            self.__fetchBatch(notify=False)
             self.endResetModel()
 
-    def __fetch(self):
-        with self.lock:
-            self.__cached_nodes = [ident.lib.node(ident) for ident in self.__set.allNodes]
-
     def indexOfNode(self, node):
-        row = self.__cached_nodes.index(get_identity(node))
-        return self.index(row, 0) if row >= 0 else QModelIndex()
+        """Get index of first column of row showing given node. Rows are loaded until one for node is found
+        or it becomes clear that node is not shown.
+        """
 
+        with self.lock:
+            self.__flushRemovals()
+            identity = get_identity(node)
+            while identity not in self.__rows and not self.__isLoaded(identity):
+                self.__fetchBatch()
+            row = self.__rowOf(identity)
+            return self.index(row, 0) if row is not None else QModelIndex()
@@ -0,0 +1,212 @@
+import time
+import logging
+import sqlite3
+from collections import deque
+from organica.utils.lockable import Lockable
+
+
+logger = logging.getLogger(__name__)
+
+
+class QueryLogEntry(object):
+    """Information about single executed SQL statement.
+        sql:        statement text
+        params:     parameters bound to statement (first set of parameters for executemany)
+        executions: number of parameter sets statement was executed with (executemany), 1 otherwise
+        rowCount:   number of rows fetched for queries returning rows, number of modified rows for other statements
+        duration:   wall time in seconds spent executing statement and fetching its results
+        plan:       list of EXPLAIN QUERY PLAN detail strings. Captured only for slow statements, None otherwise.
+        timestamp:  time statement was executed at (as returned by time.time)
+    """
+
+    def __init__(self, sql, params):
+        self.sql = sql
+        self.params = params
+        self.executions = 1
+        self.rowCount = 0
+        self.duration = 0.0
+        self.plan = None
+        self.timestamp = time.time()
+
+    @property
+    def isSlow(self):
+        return self.plan is not None
+
+    def __str__(self):
+        text = '{0:.2f} ms, {1} rows: {2}'.format(self.duration * 1000, self.rowCount, self.sql)
+        if self.executions != 1:
+            text += ' x {0}'.format(self.executions)
+        if self.params:
+            text += ' {0}'.format(tuple(self.params))
+        if self.plan:
+            text += '\n    ' + '\n    '.join(self.plan)
+        return text
+
+
+class QueryLog(Lockable):
+    """Collects information about SQL statements executed by library. Log is disabled by default and
+    instrumentation does not affect library performance until enabled.
+    Last :capacity: statements are kept in memory; statements executed longer than :threshold: seconds
+    are considered slow, get their query plan captured and are kept in separate buffer of same capacity,
+    so they are not evicted by fast statements.
+    If logToLogger is True, slow statements are reported with logging module with WARNING level and all other
+    statements with DEBUG level.
+    """
+
+    def __init__(self, capacity=1000, threshold=0.1):
+        Lockable.__init__(self)
+        self.enabled = False
+        self.threshold = threshold
+        self.logToLogger = False
+        self.__entries = deque(maxlen=capacity)
+        self.__slowEntries = deque(maxlen=capacity)
+
+    @property
+    def capacity(self):
+        with self.lock:
+            return self.__entries.maxlen
+
+    @capacity.setter
+    def capacity(self, new_capacity):
+        with self.lock:
+            self.__entries = deque(self.__entries, maxlen=new_capacity)
+            self.__slowEntries = deque(self.__slowEntries, maxlen=new_capacity)
+
+    def entries(self):
+        """List of last executed statements, oldest first."""
+
+        with self.lock:
+            return list(self.__entries)
+
+    def slowEntries(self):
+        """List of last statements executed longer than threshold, oldest first."""
+
+        with self.lock:
+            return list(self.__slowEntries)
+
+    def clear(self):
+        with self.lock:
+            self.__entries.clear()
+            self.__slowEntries.clear()
+
+    def wrap(self, cursor):
+        """Return cursor that reports executed statements to this log if log is enabled, or cursor itself otherwise.
+        """
+
+        return _InstrumentedCursor(cursor, self) if self.enabled else cursor
+
+    def _addEntry(self, entry, connection):
+        slow = entry.duration >= self.threshold
+        if slow:
+            entry.plan = self.__explain(entry, connection)
+
+        with self.lock:
+            self.__entries.append(entry)
+            if slow:
+                self.__slowEntries.append(entry)
+
+        if self.logToLogger:
+            if slow:
+                logger.warning('slow query: {0}'.format(entry))
+            else:
+                logger.debug('query: {0}'.format(entry))
+
+    @staticmethod
+    def __explain(entry, connection):
+        try:
+            return [str(row[-1]) for row in connection.execute('explain query plan ' + entry.sql, entry.params)]
+        except sqlite3.Error:
+            # not every statement can be explained (savepoints, pragmas...)
+            return []
+
+
+class _InstrumentedCursor(object):
+    """Proxy for sqlite3 cursor measuring time spent in executing statements and fetching results.
+    Statement is reported to QueryLog when next statement is executed, all rows are fetched or cursor is closed.
+    """
+
+    def __init__(self, cursor, query_log):
+        self.__cursor = cursor
+        self.__log = query_log
+        self.__entry = None
+
+    def execute(self, sql, params=()):
+        self.__report()
+        entry = QueryLogEntry(sql, params)
+        started = time.perf_counter()
+        try:
+            self.__cursor.execute(sql, params)
+        finally:
+            entry.duration = time.perf_counter() - started
+            self.__entry = entry
+        if self.__cursor.description is None:
+            # statement returns no rows
+            entry.rowCount = self.__cursor.rowcount
+            self.__report()
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        self.__report()
+        seq_of_params = list(seq_of_params)
+        entry = QueryLogEntry(sql, seq_of_params[0] if seq_of_params else ())
+        entry.executions = len(seq_of_params)
+        started = time.perf_counter()
+        try:
+            self.__cursor.executemany(sql, seq_of_params)
+        finally:
+            entry.duration = time.perf_counter() - started
+            self.__entry = entry
+        entry.rowCount = self.__cursor.rowcount
+        self.__report()
+        return self
+
+    def executescript(self, script):
+        self.__report()
+        return self.__cursor.executescript(script)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = self.__cursor.fetchone()
+        self.__account(started, 0 if row is None else 1)
+        if row is None:
+            self.__report()
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = self.__cursor.fetchmany(size) if size is not None else self.__cursor.fetchmany()
+        self.__account(started, len(rows))
+        if not rows:
+            self.__report()
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = self.__cursor.fetchall()
+        self.__account(started, len(rows))
+        self.__report()
+        return rows
+
+    def __iter__(self):
+        while True:
+            row = self.fetchone()
+            if row is None:
+                break
+            yield row
+
+    def close(self):
+        self.__report()
+        self.__cursor.close()
+
+    def __getattr__(self, name):
+        return getattr(self.__cursor, name)
+
+    def __account(self, started, row_count):
+        if self.__entry is not None:
+            self.__entry.duration += time.perf_counter() - started
+            self.__entry.rowCount += row_count
+
+    def __report(self):
+        if self.__entry is not None:
+            entry, self.__entry = self.__entry, None
+            self.__log._addEntry(entry, self.__cursor.connection)
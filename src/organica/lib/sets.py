@@ -9,6 +9,8 @@ class _Set(QObject, Lockable):
     and appearing and disappearing new objects.
     Set holds not Tag or Node objects, but its identities. You should manually
     query library for actual Tag or Node object.
+    Results are kept in dictionary (preserving order elements appeared in), so checking if
+    element is in set, adding and removing elements take constant time.
     """
 
     elementAppeared = pyqtSignal(object)
@@ -19,7 +21,8 @@ class _Set(QObject, Lockable):
     def __init__(self, lib=None, query=None):
         QObject.__init__(self)
         Lockable.__init__(self)
-        self.results = []
+        self.results = {}  # ordered dictionary of identities (values are not used)
+        self.__resultsList = None  # cached list of results for indexing
         self.__isFetched = False
         self.__lib = lib
         self.__query = None
@@ -65,6 +68,30 @@ class _Set(QObject, Lockable):
         """Subclass should reimplement this method"""
         raise NotImplementedError()
 
+    def _setResults(self, identities):
+        with self.lock:
+            self.results = dict.fromkeys(identities)
+            self.__resultsList = None
+
+    def _addResult(self, identity):
+        with self.lock:
+            self.results[identity] = None
+            self.__resultsList = None
+
+    def _removeResult(self, identity):
+        with self.lock:
+            del self.results[identity]
+            self.__resultsList = None
+
+    def _resultsList(self):
+        """List of results in order elements appeared in set. Should not be modified by caller."""
+
+        with self.lock:
+            self.ensureFetched()
+            if self.__resultsList is None:
+                self.__resultsList = list(self.results)
+            return self.__resultsList
+
     def __len__(self):
         with self.lock:
             self.ensureFetched()
@@ -72,8 +99,7 @@ class _Set(QObject, Lockable):
 
     def __getitem__(self, key):
         with self.lock:
-            self.ensureFetched()
-            return self.results[key]
+            return self._resultsList()[key]
 
     def __contains__(self, value):
         with self.lock:
@@ -82,13 +108,12 @@ class _Set(QObject, Lockable):
 
     def __iter__(self):
         with self.lock:
-            self.ensureFetched()
-            for result in self.results:
+            for result in self._resultsList():
                 yield result
 
     def __reset(self):
         with self.lock:
-            self._results = []
+            self._setResults(())
             self.__isFetched = False
             self.resetted.emit()
 
@@ -108,8 +133,7 @@ class TagSet(_Set):
     @property
     def allTags(self):
         with self.lock:
-            self.ensureFetched()
-            return self.results
+            return self._resultsList()
 
     def _fetch(self):
         with self.lock:
@@ -117,33 +141,33 @@ class TagSet(_Set):
                 from organica.lib.filters import TagQuery
 
                 normalized_query = self.query or TagQuery()
-                self.results = [x.identity for x in self.lib.tags(normalized_query)]
+                self._setResults(x.identity for x in self.lib.tags(normalized_query))
 
     def __onTagCreated(self, new_tag):
         # when tag is created it can appear in set
         with self.lock:
             if self.isFetched:
                 if self.query is None or self.query.passes(new_tag):
-                    self.results.append(new_tag.identity)
+                    self._addResult(new_tag.identity)
                     self.elementAppeared.emit(new_tag.identity)
 
     def __onTagRemoved(self, removed_tag):
         with self.lock:
             if removed_tag.identity in self.results:
-                self.results = [x for x in self.results if x != removed_tag.identity]
+                self._removeResult(removed_tag.identity)
                 self.elementDisappeared.emit(removed_tag.identity)
 
     def __onTagUpdated(self, updated_tag):
         with self.lock:
             if updated_tag.identity in self.results:
                 if not (self.query is None or self.query.passes(updated_tag)):
-                    self.results = [x for x in self.results if x != updated_tag.identity]
+                    self._removeResult(updated_tag.identity)
                     self.elementDisappeared.emit(updated_tag.identity)
                 else:
                     self.elementUpdated.emit(updated_tag.identity)
             else:
                 if self.query is None or self.query.passes(updated_tag):
-                    self.results.append(updated_tag.identity)
+                    self._addResult(updated_tag.identity)
                     self.elementAppeared.emit(updated_tag.identity)
 
     def __onLink(self, node, tag):
@@ -172,8 +196,7 @@ class NodeSet(_Set):
     @property
     def allNodes(self):
         with self.lock:
-            self.ensureFetched()
-            return self.results
+            return self._resultsList()
 
     def _fetch(self):
         with self.lock:
@@ -181,30 +204,30 @@ class NodeSet(_Set):
                 from organica.lib.filters import NodeQuery
 
                 normalized_query = self.query or NodeQuery()
-                self.results = [x.identity for x in self.lib.nodes(normalized_query)]
+                self._setResults(self.lib.nodeIds(normalized_query))
 
     def __onNodeUpdated(self, updated_node):
         with self.lock:
             if updated_node.identity in self.results:
                 if not (self.query is None or self.query.passes(updated_node)):
-                    self.results = [n for n in self.results if n != updated_node.identity]
-                    self.elementAppeared.emit(updated_node.identity)
+                    self._removeResult(updated_node.identity)
+                    self.elementDisappeared.emit(updated_node.identity)
                 else:
                     self.elementUpdated.emit(updated_node.identity)
             elif self.query is None or self.query.passes(updated_node):
-                self.results.append(updated_node.identity)
+                self._addResult(updated_node.identity)
                 self.elementAppeared.emit(updated_node.identity)
 
     def __onNodeCreated(self, created_node):
         with self.lock:
             if self.query is None or self.query.passes(created_node):
-                self.results.append(created_node.identity)
+                self._addResult(created_node.identity)
                 self.elementAppeared.emit(created_node.identity)
 
     def __onNodeRemoved(self, removed_node):
         with self.lock:
             if removed_node.identity in self.results:
-                self.results = [n for n in self.results if n != removed_node.identity]
+                self._removeResult(removed_node.identity)
                 self.elementDisappeared.emit(removed_node.identity)
 
     def __onLinkCreated(self, node, tag):
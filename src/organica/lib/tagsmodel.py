@@ -1,28 +1,66 @@
 import copy
-from PyQt4.QtCore import Qt, QAbstractItemModel, QModelIndex
+from collections import OrderedDict
+from PyQt4.QtCore import Qt, QAbstractItemModel, QModelIndex, QTimer
 from organica.lib.sets import TagSet
 from organica.utils.lockable import Lockable
 from organica.lib.filters import TagQuery
+from organica.lib.objects import get_identity
+import organica.utils.constants as constants
 
 
 class _Leaf(object):
     def __init__(self):
         self.id = -1  # unique leaf id
         self.children = []  # list of ids
+        self.childByTag = dict()  # dictionary of children ids by tag identities
         self.tagset = None
         self.parentId = -1
+        self.row = 0  # row of leaf in list of parent children
         self.level = 0
         self.tag = None
         self.cachedClassName = ''
         self.cachedValue = ''
+        self.count = 0  # number of nodes tag is linked to, for children of leaves - together with parent tag
+        self.fetched = False  # True if children of this leaf are fetched
+
+
+class _ChildrenChanges(object):
+    """Changes of children of one leaf collected by TagsModel while applying pending changes"""
+
+    def __init__(self):
+        self.removed = set()  # ids of children to remove
+        self.inserted = OrderedDict()  # (tag, count) tuples of children to insert by tag identities
+        self.updated = set()  # ids of children which data is changed
+
+
+class _Batch(object):
+    """Changes collected by TagsModel while applying pending changes, by ids of parent leaves"""
+
+    def __init__(self):
+        self.changes = OrderedDict()
+
+    def changesOf(self, leaf):
+        if leaf.id not in self.changes:
+            self.changes[leaf.id] = _ChildrenChanges()
+        return self.changes[leaf.id]
 
 
 class TagsModel(QAbstractItemModel, Lockable):
     """Model represents library tag structure in hierarchical form.
     This will not work correctly with queries using 'unused' conditions.
+
+    Only first-level items are fetched when model is reset, children of each item are fetched
+    when view asks for them (see canFetchMore and fetchMore). Views should report collapsed branches
+    with branchCollapsed, so children of these branches can be released when model has more than
+    MaxLeaves leaves.
+    First-level items are watched with TagSet, children of other items are fetched with
+    Library.cooccurringTags and fetched again when links of parent tag change. Changes are not applied
+    immediately, but collected until control returns to event loop (or until model is accessed) and applied
+    at once: adjacent rows are removed together and new rows of each parent are inserted together.
     """
 
     TagIdentityRole = Qt.UserRole + 200
+    MaxLeaves = 10000
 
     def __init__(self, lib):
         QAbstractItemModel.__init__(self)
@@ -30,11 +68,23 @@ class TagsModel(QAbstractItemModel, Lockable):
         self.__lib = lib
         self.__hierarchy = ['*']  # list of strings (class names)
         self.__leaves = dict()  # dictionary of leaves by id
+        self.__leafByTagset = dict()  # ids of leaves by TagSet watching their children
+        self.__leavesByTag = dict()  # sets of leaf ids by tag identities
         self.__showHidden = False  # True if model should take hidden tags into account
         self.__lastNodeId = -1
         self.__filters = []
+        self.__collapsed = OrderedDict()  # ids of collapsed leaves with fetched children, oldest first
+        self.__pendingChanges = []  # list of (leaf id, routine, tag) tuples for changes reported by TagSet
+        self.__pendingSyncs = set()  # ids of leaves which children should be fetched again
+        self.__flushScheduled = False
         self.__reset()
 
+        if self.__lib is not None:
+            conn_type = Qt.DirectConnection if constants.disable_set_queued_connections else Qt.QueuedConnection
+            self.__lib.linkCreated.connect(self.__onLinkChanged, conn_type)
+            self.__lib.linkRemoved.connect(self.__onLinkChanged, conn_type)
+            self.__lib.tagUpdated.connect(self.__onTagUpdated, conn_type)
+
     @property
     def lib(self):
         with self.lock:
@@ -87,53 +137,64 @@ class TagsModel(QAbstractItemModel, Lockable):
             self.__reset()
 
     def __reset(self):
+        self.beginResetModel()
+        if self.__leaves:
+            self.__dropLeaves((-1,))
         self.__leaves = dict()
         self.__leaves[-1] = _Leaf()  # root leaf
+        self.__leafByTagset = dict()
+        self.__leavesByTag = dict()
         self.__lastNodeId = -1
+        self.__collapsed = OrderedDict()
+        self.__pendingChanges = []
+        self.__pendingSyncs = set()
         if self.lib is not None:
-            self.__fetch(-1)
-
-    def __fetch(self, leaf):
-        if isinstance(leaf, int):
-            leaf = self.__leaves[leaf]
+            self.__fetch(self.__leaves[-1], notify=False)
+        self.endResetModel()
 
-        self.beginResetModel()
+    def __canHaveChildren(self, leaf):
+        return leaf.level < len(self.__hierarchy)
 
-        # clear list of children and remove them from
-        if leaf.children:
-            self.__leaves = [x for x in self.__leaves if x not in leaf.children]
-            leaf.children = []
+    def __fetch(self, leaf, notify=True):
+        """Fetch children of given leaf. Children of fetched leaves are not fetched.
+        """
 
-        # disconnect any TagSet signals bound to this object
-        if leaf.tagset is not None:
-            leaf.tagset.elementAppeared.disconnect(self.__onElementAppeared)
-            leaf.tagset.elementDisappeared.disconnect(self.__onElementDisappeared)
-            leaf.tagset.elementUpdated.disconnect(self.__onElementUpdated)
-            leaf.tagset.resetted.disconnect(self.__onTagsetResetted)
+        leaf.fetched = True
 
         # do not fetch anything for leaves on last level
-        if leaf.level >= len(self.__hierarchy):
-            self.endResetModel()
+        if not self.__canHaveChildren(leaf):
             return
 
-        # build filter for children of this leaf
+        if leaf.level > 0:
+            child_tags = self.__childTags(leaf)
+            if notify and child_tags:
+                self.beginInsertRows(self.__indexForLeaf(leaf), 0, len(child_tags) - 1)
+            for tag, count in child_tags:
+                self.__doInsertLeaf(leaf, tag.identity, tag, count)
+            if notify and child_tags:
+                self.endInsertRows()
+            return
+
+        # build filter for first-level items
         if self.__hierarchy[leaf.level] == '*':
             children_filter = TagQuery()
         else:
             children_filter = TagQuery(tag_class=self.__hierarchy[leaf.level])
-        if leaf.level > 0:
-            children_filter = children_filter & TagQuery(friend_of=leaf.tag)
         if not self.__showHidden:
             children_filter = children_filter & TagQuery(hidden=False)
-        if leaf.level == 0:
-            children_filter = children_filter & self.query
+        children_filter = children_filter & self.query
 
         leaf.tagset = TagSet(self.lib, children_filter)
+        self.__leafByTagset[leaf.tagset] = leaf.id
 
-        # recursively fetch all children
         with leaf.tagset.lock:
-            for tag_identity in leaf.tagset.allTags:
+            tag_identities = leaf.tagset.allTags
+            if notify and tag_identities:
+                self.beginInsertRows(self.__indexForLeaf(leaf), 0, len(tag_identities) - 1)
+            for tag_identity in tag_identities:
                 self.__doInsertLeaf(leaf, tag_identity)
+            if notify and tag_identities:
+                self.endInsertRows()
 
             # and connect to signals of TagSet
             leaf.tagset.elementAppeared.connect(self.__onElementAppeared)
@@ -141,68 +202,237 @@ class TagsModel(QAbstractItemModel, Lockable):
             leaf.tagset.elementUpdated.connect(self.__onElementUpdated)
             leaf.tagset.resetted.connect(self.__onTagsetResetted)
 
-        self.endResetModel()
+    def __childTags(self, leaf):
+        """List of (tag, count) tuples for children of given leaf that is not root.
+        """
+
+        class_name = self.__hierarchy[leaf.level] if self.__hierarchy[leaf.level] != '*' else None
+        return [(tag, count) for tag, count in self.lib.cooccurringTags((leaf.tag, ), class_name)
+                if self.__showHidden or not tag.tagClass.hidden]
+
+    def __syncChildren(self, leaf, batch):
+        """Fetch children of given fetched leaf (that is not root) again and collect differences into batch.
+        Should be called only by __flushChanges.
+        """
+
+        child_tags = self.__childTags(leaf)
+        actual_tags = dict((tag.identity, (tag, count)) for tag, count in child_tags)
+        changes = batch.changesOf(leaf)
+
+        for child_id in leaf.children:
+            child_leaf = self.__leaves[child_id]
+            if child_leaf.tag not in actual_tags:
+                changes.removed.add(child_id)
+            else:
+                tag, count = actual_tags[child_leaf.tag]
+                if (child_leaf.count, child_leaf.cachedValue) != (count, tag.value):
+                    child_leaf.count, child_leaf.cachedValue = count, tag.value
+                    changes.updated.add(child_id)
+
+        for tag, count in child_tags:
+            if tag.identity not in leaf.childByTag:
+                changes.inserted[tag.identity] = (tag, count)
+
+    def __onLinkChanged(self, node, tag):
+        with self.lock:
+            # co-occurrence counts change only for children of leaves with tags linked to this node
+            node_tags = set(node_tag.identity for node_tag in node.allTags)
+            node_tags.add(tag.identity)
+            for tag_identity in node_tags:
+                self.__pendingSyncs.update(leaf_id for leaf_id in self.__leavesByTag.get(tag_identity, ())
+                                           if self.__leaves[leaf_id].level > 0)
+            self.__scheduleFlush()
+
+    def __onTagUpdated(self, updated_tag, old_tag):
+        with self.lock:
+            self.__pendingSyncs.update(self.__leaves[leaf_id].parentId
+                                       for leaf_id in self.__leavesByTag.get(updated_tag.identity, ())
+                                       if self.__leaves[leaf_id].parentId != -1)
+            self.__scheduleFlush()
+
+    def __release(self, leaf):
+        """Drop children of given leaf, so they will be fetched again when view asks for them.
+        """
+
+        if leaf.children:
+            self.beginRemoveRows(self.__indexForLeaf(leaf), 0, len(leaf.children) - 1)
+            self.__dropLeaves(leaf.children)
+            leaf.children = []
+            leaf.childByTag = dict()
+            self.endRemoveRows()
+        self.__disconnectTagset(leaf)
+        leaf.fetched = False
 
-    def __doInsertLeaf(self, parent_leaf, tag_identity):
+    def __releaseCollapsed(self):
+        while len(self.__leaves) > self.MaxLeaves and self.__collapsed:
+            leaf = self.__leaves.get(self.__collapsed.popitem(last=False)[0])
+            if leaf is not None:
+                self.__release(leaf)
+
+    def __doInsertLeaf(self, parent_leaf, tag_identity, actual_tag=None, count=None):
         child_leaf = _Leaf()
         child_leaf.id = self.__lastNodeId + 1
         self.__lastNodeId += 1
         child_leaf.level = parent_leaf.level + 1
         child_leaf.tag = tag_identity
 
-        actual_tag = self.lib.tag(tag_identity)
+        if actual_tag is None:
+            actual_tag = self.lib.tag(tag_identity)
         child_leaf.cachedClassName = actual_tag.className
         child_leaf.cachedValue = actual_tag.value
+        child_leaf.count = count if count is not None else actual_tag.useCount
 
         child_leaf.parentId = parent_leaf.id
+        child_leaf.row = len(parent_leaf.children)
         parent_leaf.children.append(child_leaf.id)
+        parent_leaf.childByTag[tag_identity] = child_leaf.id
         self.__leaves[child_leaf.id] = child_leaf
-        if child_leaf.level < len(self.__hierarchy):
-            self.__fetch(child_leaf)
+        self.__leavesByTag.setdefault(tag_identity, set()).add(child_leaf.id)
 
     def __processLeaf(self, tag, routine):
         target_tagset = self.sender()
         assert target_tagset is not None
 
-        for leaf in self.__leaves.values():
-            if leaf.tagset is target_tagset:
-                routine(leaf, tag)
-                break
+        leaf_id = self.__leafByTagset.get(target_tagset)
+        if leaf_id is not None:
+            self.__pendingChanges.append((leaf_id, routine, tag))
+            self.__scheduleFlush()
+
+    def __scheduleFlush(self):
+        if (self.__pendingChanges or self.__pendingSyncs) and not self.__flushScheduled:
+            self.__flushScheduled = True
+            QTimer.singleShot(0, self.__onFlushTimer)
 
-    def __insertLeaf(self, leaf, tag):
-        new_leaf_index = len(leaf.children)
-        self.beginInsertRows(self.__indexForLeaf(leaf), new_leaf_index, new_leaf_index)
-        self.__doInsertLeaf(leaf, tag)
-        self.endInsertRows()
+    def __onFlushTimer(self):
+        with self.lock:
+            self.__flushChanges()
+
+    def __flushChanges(self):
+        """Apply changes collected since last flush. Changes are first collected for each parent leaf, then
+        removed rows are grouped into ranges of adjacent rows and new rows are appended, so model emits one pair
+        of signals for each range instead of one for each changed row.
+        """
+
+        self.__flushScheduled = False
+        changes, syncs = self.__pendingChanges, self.__pendingSyncs
+        self.__pendingChanges, self.__pendingSyncs = [], set()
+        if not changes and not syncs:
+            return
+
+        batch = _Batch()
+        for leaf_id, routine, tag in changes:
+            leaf = self.__leaves.get(leaf_id)
+            if leaf is not None:
+                routine(leaf, tag, batch)
+
+        for leaf_id in syncs:
+            leaf = self.__leaves.get(leaf_id)
+            if leaf is not None and leaf.fetched:
+                self.__syncChildren(leaf, batch)
+
+        for leaf_id, children_changes in batch.changes.items():
+            # leaf can be removed with its parent
+            leaf = self.__leaves.get(leaf_id)
+            if leaf is not None:
+                self.__applyChanges(leaf, children_changes)
+
+    def __applyChanges(self, leaf, changes):
+        parent_index = self.__indexForLeaf(leaf)
+
+        rows = sorted(self.__leaves[child_id].row for child_id in changes.removed)
+        ranges = []
+        for row in rows:
+            if ranges and ranges[-1][1] == row - 1:
+                ranges[-1][1] = row
+            else:
+                ranges.append([row, row])
+
+        # last ranges are removed first, so rows of ranges not removed yet are not shifted
+        for first_row, last_row in reversed(ranges):
+            self.beginRemoveRows(parent_index, first_row, last_row)
+            removed_ids = leaf.children[first_row:last_row + 1]
+            for child_id in removed_ids:
+                del leaf.childByTag[self.__leaves[child_id].tag]
+            self.__dropLeaves(removed_ids)
+            del leaf.children[first_row:last_row + 1]
+            for row in range(first_row, len(leaf.children)):
+                self.__leaves[leaf.children[row]].row = row
+            self.endRemoveRows()
+
+        inserted = []
+        for tag_identity, (actual_tag, count) in changes.inserted.items():
+            if actual_tag is None:
+                actual_tag = self.lib.tag(tag_identity)
+            if actual_tag is not None:
+                inserted.append((tag_identity, actual_tag, count))
+        if inserted:
+            first_row = len(leaf.children)
+            self.beginInsertRows(parent_index, first_row, first_row + len(inserted) - 1)
+            for tag_identity, actual_tag, count in inserted:
+                self.__doInsertLeaf(leaf, tag_identity, actual_tag, count)
+            self.endInsertRows()
+
+        for child_id in changes.updated - changes.removed:
+            self.dataChanged.emit(self.__indexForLeaf(child_id), self.__indexForLeaf(child_id, self.columnCount() - 1))
+
+    def __insertLeaf(self, leaf, tag, batch):
+        changes = batch.changesOf(leaf)
+        child_id = leaf.childByTag.get(tag)
+        if child_id is None:
+            changes.inserted[tag] = (None, None)
+        elif child_id in changes.removed:
+            # tag disappeared and appeared again, its data could be changed meanwhile
+            changes.removed.discard(child_id)
+            self.__updateLeaf(leaf, tag, batch)
 
     def __onElementAppeared(self, element):
         with self.lock:
             self.__processLeaf(element, self.__insertLeaf)
 
-    def __removeLeaf(self, leaf, tag):
+    def __removeLeaf(self, leaf, tag, batch):
+        changes = batch.changesOf(leaf)
         child_id = self.__childIdForTag(leaf, tag)
         if child_id is not None:
-            child_row = leaf.children.index(child_id)
-            self.beginRemoveRows(self.__indexForLeaf(leaf), child_row, child_row)
-            leaf.children = [x for x in leaf.children if x != child_id]
-            self.endRemoveRows()
+            changes.removed.add(child_id)
+        changes.inserted.pop(tag, None)
+
+    def __dropLeaves(self, leaf_ids):
+        """Remove leaves with given ids and all their descendants from dictionary of leaves"""
+
+        for leaf_id in leaf_ids:
+            dropped = self.__leaves.pop(leaf_id, None)
+            if dropped is not None:
+                self.__disconnectTagset(dropped)
+                if dropped.tag is not None:
+                    self.__leavesByTag[dropped.tag].discard(leaf_id)
+                    if not self.__leavesByTag[dropped.tag]:
+                        del self.__leavesByTag[dropped.tag]
+                self.__dropLeaves(dropped.children)
+
+    def __disconnectTagset(self, leaf):
+        if leaf.tagset is not None:
+            leaf.tagset.elementAppeared.disconnect(self.__onElementAppeared)
+            leaf.tagset.elementDisappeared.disconnect(self.__onElementDisappeared)
+            leaf.tagset.elementUpdated.disconnect(self.__onElementUpdated)
+            leaf.tagset.resetted.disconnect(self.__onTagsetResetted)
+            self.__leafByTagset.pop(leaf.tagset, None)
+            leaf.tagset = None
 
     def __childIdForTag(self, leaf, tag):
-        for child_id in leaf.children:
-            if self.__leaves[child_id].tag == tag:
-                return child_id
-        else:
-            return None
+        return leaf.childByTag.get(tag)
 
     def __onElementDisappeared(self, element):
         with self.lock:
             self.__processLeaf(element, self.__removeLeaf)
 
-    def __updateLeaf(self, leaf, tag):
+    def __updateLeaf(self, leaf, tag, batch):
         child_id = self.__childIdForTag(leaf, tag)
         if child_id is not None:
-            self.dataChanged.emit(self.__indexForLeaf(child_id),
-                                  self.__indexForLeaf(child_id, self.columnCount() - 1))
+            actual_tag = self.lib.tag(tag)
+            if actual_tag is not None:
+                child_leaf = self.__leaves[child_id]
+                child_leaf.cachedValue, child_leaf.count = actual_tag.value, actual_tag.useCount
+            batch.changesOf(leaf).updated.add(child_id)
 
     def __onElementUpdated(self, element):
         with self.lock:
@@ -218,20 +448,19 @@ class TagsModel(QAbstractItemModel, Lockable):
 
         if leaf.id == -1:
             return QModelIndex()
-        parent_leaf = self.__leaves[leaf.parentId]
-        assert leaf.id in parent_leaf.children
-        return self.createIndex(parent_leaf.children.index(leaf.id), column, leaf.id)
+        return self.createIndex(leaf.row, column, leaf.id)
 
     def __leafForIndex(self, index):
         if not index.isValid():
             return self.__leaves[-1]
-        return self.__leaves[index.internalId()]
+        return self.__leaves.get(index.internalId())
 
     def flags(self, index):
         return Qt.ItemIsEnabled | Qt.ItemIsSelectable
 
     def data(self, index, role=Qt.DisplayRole):
         with self.lock:
+            self.__flushChanges()
             if not index.isValid():
                 return None
 
@@ -244,6 +473,8 @@ class TagsModel(QAbstractItemModel, Lockable):
                     return leaf.cachedClassName
                 elif index.column() == 1:
                     return str(leaf.cachedValue)
+                elif index.column() == 2:
+                    return leaf.count
             elif role == TagsModel.TagIdentityRole:
                 return leaf.tag
             return None
@@ -254,18 +485,61 @@ class TagsModel(QAbstractItemModel, Lockable):
                 return 'Name'
             elif section == 1:
                 return 'Value'
+            elif section == 2:
+                return 'Count'
 
     def rowCount(self, index=QModelIndex()):
         with self.lock:
+            self.__flushChanges()
             leaf = self.__leafForIndex(index)
             return len(leaf.children) if leaf is not None else 0
 
     def columnCount(self, index=QModelIndex()):
-        return 2
+        return 3
+
+    def hasChildren(self, index=QModelIndex()):
+        with self.lock:
+            self.__flushChanges()
+            leaf = self.__leafForIndex(index)
+            if leaf is None or not self.__canHaveChildren(leaf):
+                return False
+            return not leaf.fetched or bool(leaf.children)
+
+    def canFetchMore(self, index=QModelIndex()):
+        with self.lock:
+            leaf = self.__leafForIndex(index)
+            return leaf is not None and not leaf.fetched and self.__canHaveChildren(leaf)
+
+    def fetchMore(self, index=QModelIndex()):
+        with self.lock:
+            leaf = self.__leafForIndex(index)
+            if leaf is not None and not leaf.fetched:
+                self.__collapsed.pop(leaf.id, None)
+                self.__fetch(leaf)
+
+    def branchExpanded(self, index):
+        """Should be called by view when branch with given index is expanded.
+        """
+
+        with self.lock:
+            if index.isValid():
+                self.__collapsed.pop(index.internalId(), None)
+
+    def branchCollapsed(self, index):
+        """Should be called by view when branch with given index is collapsed. Children of collapsed
+        branches are released when model has too many leaves, and fetched again on next expansion.
+        """
+
+        with self.lock:
+            leaf = self.__leafForIndex(index)
+            if index.isValid() and leaf is not None and leaf.fetched:
+                self.__collapsed[leaf.id] = True
+                self.__releaseCollapsed()
 
     def index(self, row, column, parent=QModelIndex()):
         with self.lock:
-            if row < 0 or not (0 <= column < 2):
+            self.__flushChanges()
+            if row < 0 or not (0 <= column < self.columnCount()):
                 return QModelIndex()
 
             parent_leaf = self.__leafForIndex(parent)
@@ -288,12 +562,16 @@ class TagsModel(QAbstractItemModel, Lockable):
             return self.__indexForLeaf(leaf.parentId)
 
     def indexesForTag(self, tag_identity, column=0):
-        """Get list of indexes that refer to given tag.
+        """Get list of indexes that refer to given tag. Only fetched items are taken into account.
         """
 
         with self.lock:
+            self.__flushChanges()
             actual_tag = self.lib.tag(tag_identity)
             if actual_tag is not None and '*' not in self.__hierarchy and actual_tag.className not in self.__hierarchy:
                 return []
 
-            return [self.__indexForLeaf(x) for x in self.__leaves.values() if x.tag == tag_identity]
+            if tag_identity is None:
+                return []
+            return [self.__indexForLeaf(leaf_id, column)
+                    for leaf_id in self.__leavesByTag.get(get_identity(tag_identity), ())]
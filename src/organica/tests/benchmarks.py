@@ -0,0 +1,99 @@
+import unittest
+import organica.utils.constants as constants
+from organica.lib.filters import NodeQuery, TagQuery
+from organica.benchmarks.generator import LibraryGenerator
+import organica.benchmarks.suite as suite
+from organica.benchmarks.stress import StressTest
+from organica.benchmarks.memory import measureLibrary
+from organica.benchmarks.micro import runMicroBenchmarks
+
+
+class TestLibraryGenerator(unittest.TestCase):
+    def test(self):
+        generator = LibraryGenerator(node_count=20, tag_count=10, class_count=3, links_per_node=3, seed=42)
+        lib = generator.generate()
+        another_lib = generator.generate()
+
+        self.assertEqual(len(lib.nodes(NodeQuery())), 20)
+        self.assertEqual(len(lib.tags(TagQuery())), 10)
+        # locator class is created with any library
+        self.assertEqual(sorted(tc.name for tc in lib.tagClasses()), sorted(generator.classNames() + ['locator']))
+
+        # generated libraries are reproducible
+        def links(l):
+            return sorted((node.displayName, tag.value.printable())
+                          for node in l.nodes(NodeQuery()) for tag in node.allTags)
+
+        self.assertEqual(len(links(lib)), 60)
+        self.assertEqual(links(lib), links(another_lib))
+
+        lib.close()
+        another_lib.close()
+
+
+class TestBenchmarkSuite(unittest.TestCase):
+    def test(self):
+        generator = LibraryGenerator(node_count=10, tag_count=5, class_count=2, links_per_node=2)
+        results = suite.runSuite(generator, repeat=2, sample_size=3)
+
+        self.assertEqual(results['parameters'], generator.parameters)
+        for name, benchmark in suite.Benchmarks:
+            self.assertEqual(results['benchmarks'][name]['runs'], 2)
+        self.assertEqual(results['benchmarks'][suite.BulkImportBenchmarkName]['runs'], 1)
+
+        # global connection setting is restored after suite is run
+        queued_connections_disabled = constants.disable_set_queued_connections
+        constants.disable_set_queued_connections = False
+        try:
+            only_queries = suite.runSuite(generator, repeat=1, sample_size=3, names=['queries.*'])
+            self.assertFalse(constants.disable_set_queued_connections)
+        finally:
+            constants.disable_set_queued_connections = queued_connections_disabled
+        self.assertTrue(all(name.startswith('queries.') for name in only_queries['benchmarks']))
+
+        baseline = {'parameters': results['parameters'], 'benchmarks': {
+            'queries.all_nodes': {'median': results['benchmarks']['queries.all_nodes']['median'] / 1000},
+            'removed': {'median': 1.0}
+        }}
+        comparison = suite.compareResults(only_queries, baseline)
+        self.assertEqual(comparison['queries.all_nodes']['status'], suite.STATUS_REGRESSION)
+        self.assertEqual(comparison['removed']['status'], suite.STATUS_MISSING)
+        self.assertEqual(comparison['queries.tags_by_class']['status'], suite.STATUS_NEW)
+        self.assertTrue(suite.hasRegressions(comparison))
+
+
+class TestStressTest(unittest.TestCase):
+    def test(self):
+        lib = LibraryGenerator(node_count=30, tag_count=10, class_count=2, links_per_node=2).generate()
+
+        results = StressTest(lib, readers=2, writers=2, duration=0.5, deadlock_timeout=30).run()
+        self.assertFalse(results['deadlocks'])
+        self.assertFalse(results['anomalies'])
+        for op_name in StressTest.ReaderOperations + StressTest.WriterOperations:
+            self.assertTrue(results['operations'][op_name]['count'] > 0)
+            self.assertFalse(results['operations'][op_name]['errors'])
+
+        # transaction methods are restored after test
+        self.assertNotIn('_begin', lib.__dict__)
+        lib.close()
+
+
+class TestMemoryProfiler(unittest.TestCase):
+    def test(self):
+        generator = LibraryGenerator(node_count=50, tag_count=10, class_count=2, links_per_node=2)
+        results = measureLibrary(generator)
+
+        self.assertEqual(results['node_count'], 50)
+        for name in ('Node', 'Tag', 'Node.allTags', 'Identity', 'TagValue', 'Locator', 'signal copy of Node'):
+            self.assertTrue(results['per_object'][name] > 0)
+        for name in ('Library._nodes', 'Library._tags', '_Set.results', 'ObjectsModel', 'TagsModel'):
+            self.assertIn(name, results['structures'])
+        self.assertTrue(results['bytes_per_node'] > 0)
+        self.assertTrue(results['top_allocations'])
+
+
+class TestMicroBenchmarks(unittest.TestCase):
+    def test(self):
+        results = runMicroBenchmarks(number=100, repeat=1)
+        self.assertIn('TagValue == str', results)
+        self.assertTrue(all(value > 0 for value in results.values()))
@@ -0,0 +1,98 @@
+import unittest
+
+from organica.lib.bitmapindex import BitmapIndex, bitmapFromIds, idsFromBitmap
+from organica.lib.library import Library
+from organica.lib.filters import NodeQuery, TagQuery, Wildcard
+
+
+class TestBitmaps(unittest.TestCase):
+    def test(self):
+        self.assertEqual(bitmapFromIds([]), 0)
+        self.assertEqual(bitmapFromIds([0, 3, 9]), 0b1000001001)
+        self.assertEqual(idsFromBitmap(0), [])
+        self.assertEqual(idsFromBitmap(bitmapFromIds([900, 3, 17, 8])), [3, 8, 17, 900])
+
+
+class TestBitmapIndex(unittest.TestCase):
+    def setUp(self):
+        self.lib = Library.createLibrary(':memory:')
+        color_class = self.lib.createTagClass('color')
+        size_class = self.lib.createTagClass('size')
+        self.red = self.lib.createTag(color_class, 'red')
+        self.green = self.lib.createTag(color_class, 'green')
+        self.big = self.lib.createTag(size_class, 'big')
+        self.nodes = []
+        for index in range(300):
+            tags = [self.red if index % 2 else self.green]
+            if index % 3 == 0:
+                tags.append(self.big)
+            self.nodes.append(self.lib.createNode('node #{0}'.format(index), tags))
+        # rarely used tag is stored as set of node ids
+        self.rare = self.lib.createTag(size_class, 'small')
+        self.lib.createLink(self.nodes[5], self.rare)
+
+    def tearDown(self):
+        self.lib.close()
+
+    def queries(self):
+        def has(tag):
+            return NodeQuery(tags=TagQuery(identity=tag))
+
+        return [has(self.red), has(self.red) & has(self.big), has(self.green) & ~has(self.big),
+                has(self.rare) | (has(self.big) & ~has(self.red)), ~has(self.rare),
+                NodeQuery(tags=TagQuery(identity=self.red) | TagQuery(identity=self.rare)),
+                NodeQuery(identity=self.nodes[10]) & has(self.green), NodeQuery()]
+
+    def test(self):
+        index = BitmapIndex(self.lib)
+
+        # results are same as ones of database query
+        for query in self.queries():
+            self.assertEqual(index.nodeIds(query), sorted(identity.id for identity in self.lib.nodeIds(query)))
+
+        # queries with other conditions cannot be evaluated
+        self.assertIsNone(index.nodeBitmap(NodeQuery(name=Wildcard('node #1*'))))
+        self.assertIsNone(index.nodeBitmap(NodeQuery(tags=TagQuery(tag_class='color'))))
+        self.assertIsNone(index.nodeBitmap(NodeQuery(tags=TagQuery(identity=self.red)).limit(10)))
+
+        # index is updated when library changes
+        self.lib.removeLink(self.nodes[1], self.red)
+        self.lib.createLink(self.nodes[2], self.rare)
+        self.lib.removeNode(self.nodes[4])
+        new_node = self.lib.createNode('new node', [self.red, self.rare])
+        self.assertTrue(new_node.id in index.nodeIds(NodeQuery(tags=TagQuery(identity=self.rare))))
+        for query in self.queries():
+            self.assertEqual(index.nodeIds(query), sorted(identity.id for identity in self.lib.nodeIds(query)))
+
+        index.close()
+
+    def testLibrary(self):
+        def nodeIds(query):
+            return sorted(node.id for node in self.lib.nodes(query))
+
+        expected = [nodeIds(query) for query in self.queries()]
+
+        self.lib.bitmapIndexEnabled = True
+        self.lib.queryLog.enabled = True
+        self.assertEqual([nodeIds(query) for query in self.queries()], expected)
+        self.assertFalse(any('links' in entry.sql for entry in self.lib.queryLog.entries()))
+        self.lib.queryLog.enabled = False
+
+        self.lib.bitmapIndexEnabled = False
+        self.assertFalse(self.lib.bitmapIndexEnabled)
+
+    def testRollback(self):
+        index = BitmapIndex(self.lib)
+        query = NodeQuery(tags=TagQuery(identity=self.rare))
+
+        # index is rebuilt from data that remains after transaction is rolled back
+        with self.assertRaises(ValueError):
+            with self.lib.transaction():
+                self.lib.createLink(self.nodes[7], self.rare)
+                self.lib.removeLink(self.nodes[0], self.big)
+                raise ValueError()
+        self.assertEqual(index.nodeIds(query), [self.nodes[5].id])
+        for query in self.queries():
+            self.assertEqual(index.nodeIds(query), sorted(identity.id for identity in self.lib.nodeIds(query)))
+
+        index.close()
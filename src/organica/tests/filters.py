@@ -124,7 +124,7 @@ class TestFilters(unittest.TestCase):
         self.assertTrue(tag_obj1.passes(f))
         self.assertFalse(tag_obj2.passes(f))
         self.assertFalse(page_count.passes(f))
-        self.assertEqual(f.generateSqlWhere(), "value_type = {0} and value = {1}".format(TagValue.TYPE_NODE_REFERENCE,
+        self.assertEqual(f.generateSqlWhere(), "value_type = {0} and value = '{1}'".format(TagValue.TYPE_NODE_REFERENCE,
                          obj1.id))
 
         f = TagQuery(node_ref=Identity())
@@ -260,3 +260,73 @@ class TestFilters(unittest.TestCase):
         self.assertTrue(obj_unflushed.passes(f))
 
         lib.close()
+
+
+class TestCompiledFilters(unittest.TestCase):
+    def setUp(self):
+        self.lib = Library.createLibrary(':memory:')
+        author_class = self.lib.createTagClass('author')
+        year_class = self.lib.createTagClass('year')
+        self.authors = [self.lib.createTag(author_class, 'author #{0}'.format(index)) for index in range(10)]
+        self.years = [self.lib.createTag(year_class, 1900 + index) for index in range(5)]
+        self.nodes = []
+        for index in range(20):
+            tags = [self.authors[index % 7], self.years[index % 3]]
+            self.nodes.append(self.lib.createNode('book #{0}'.format(index), tags))
+
+    def tearDown(self):
+        self.lib.close()
+
+    def test(self):
+        tags = self.lib.tags(TagQuery())
+        queries = [TagQuery(unused=True), TagQuery(friend_of=self.years[0]), TagQuery(linked_with=self.nodes[3]),
+                   TagQuery(tag_class=Wildcard('AUTH*')) & ~TagQuery(unused=True),
+                   TagQuery(tag_class='year') | TagQuery(text=Wildcard('*#1')), TagQuery(identity=self.authors[2])]
+        for query in queries:
+            # results are same as ones of database query
+            expected_ids = sorted(tag.id for tag in self.lib.tags(query))
+            self.assertEqual(sorted(tag.id for tag in tags if query.passes(tag)), expected_ids)
+            self.assertEqual(sorted(tag.id for tag, passes in zip(tags, query.passesMany(tags)) if passes),
+                             expected_ids)
+
+        # database is queried once for whole list
+        self.lib.queryLog.enabled = True
+        for query in queries[:2]:
+            self.lib.queryLog.clear()
+            query.passesMany(tags)
+            self.assertEqual(len(self.lib.queryLog.entries()), 1)
+
+        # only tags of batch are looked up
+        self.lib.queryLog.clear()
+        self.assertEqual(queries[0].passesMany(tags[:3]), [queries[0].passes(tag) for tag in tags[:3]])
+        self.assertEqual(sorted(self.lib.queryLog.entries()[0].params), sorted(tag.id for tag in tags[:3]))
+        self.lib.queryLog.enabled = False
+
+        query = NodeQuery(tags=TagQuery(friend_of=self.authors[1])) & ~NodeQuery(name=Wildcard('*#1*'))
+        expected_ids = sorted(node.id for node in self.lib.nodes(query))
+        self.assertEqual(sorted(node.id for node, passes in zip(self.nodes, query.passesMany(self.nodes)) if passes),
+                         expected_ids)
+        self.assertFalse(query.passesMany([None])[0])
+
+        # tags of nodes that are not fetched yet are fetched with one query for whole batch
+        nodes = []
+        for node in self.nodes:
+            unfetched = Node(node.displayNameTemplate)
+            unfetched.identity = node.identity
+            nodes.append(unfetched)
+        query = NodeQuery(tags=TagQuery(tag_class='author', text='author #1'))
+        self.lib.queryLog.enabled = True
+        self.lib.queryLog.clear()
+        results = query.passesMany(nodes)
+        self.assertEqual(len(self.lib.queryLog.entries()), 1)
+        self.lib.queryLog.enabled = False
+        self.assertEqual(sorted(node.id for node, passes in zip(nodes, results) if passes),
+                         sorted(node.id for node in self.lib.nodes(query)))
+        self.assertTrue(all(node.tagsFetched for node in nodes))
+
+    def testWildcard(self):
+        wildcard = Wildcard('book*')
+        self.assertTrue(wildcard == 'Book #1')
+        wildcard.pattern = '*#2'
+        self.assertFalse(wildcard == 'Book #1')
+        self.assertTrue(wildcard == 'Book #2')
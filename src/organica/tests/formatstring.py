@@ -1,6 +1,7 @@
-from organica.lib.formatstring import FormatString
-from organica.lib.objects import Node
+from organica.lib.formatstring import FormatString, compileTemplate, tagValuesByClass, displayNames
+from organica.lib.objects import Node, TagValue
 from organica.lib.library import Library
+from organica.lib.filters import NodeQuery, Wildcard
 import unittest
 
 
@@ -53,3 +54,72 @@ class TestFormatString(unittest.TestCase):
         self.assertEqual(fs.format(obj), 'Это не ASCII (c)')
 
         lib.close()
+
+
+class TestCompiledTemplate(unittest.TestCase):
+    def test(self):
+        lib = Library.createLibrary(':memory:')
+
+        obj = Node('{author: sort=desc} ({year})')
+        obj.link(lib.createTagClass('author'), 'Author name')
+        obj.link(lib.createTagClass('author'), 'Another author')
+        obj.link(lib.createTagClass('year', TagValue.TYPE_NUMBER), 1865)
+
+        # compiled templates are shared
+        compiled = compileTemplate(obj.displayNameTemplate)
+        self.assertTrue(compiled is compileTemplate(obj.displayNameTemplate))
+        self.assertTrue(compiled.usesTags)
+        self.assertFalse(compileTemplate('static text').usesTags)
+
+        self.assertEqual(obj.displayName, 'Author name, Another author (1865)')
+        self.assertEqual(compiled.render(obj, tagValuesByClass(obj.allTags)), obj.displayName)
+        self.assertEqual(compiled.render(obj, {'author': [TagValue('Prefetched')]}), 'Prefetched ()')
+
+        # templates with custom blocks are compiled by format string itself
+        fs = FormatString('{@source}/{year}')
+        fs.registerCustomBlock('@source', lambda node, token: 'source')
+        self.assertEqual(fs.format(obj), 'source/1865')
+        self.assertEqual(fs.compile().render(obj), 'source/1865')
+        self.assertTrue(fs.compile() is fs.compile())
+
+        lib.close()
+
+
+class TestFormatMany(unittest.TestCase):
+    def test(self):
+        lib = Library.createLibrary(':memory:')
+        author_class = lib.createTagClass('author')
+        series_class = lib.createTagClass('series', TagValue.TYPE_NODE_REFERENCE)
+
+        series = Node('Alice books')
+        series.flush(lib)
+        for index in range(30):
+            node = Node('{{author}} - book #{0}'.format(index) if index % 2 else 'static #{0}'.format(index))
+            node.link(author_class, 'Lewis Carrol')
+            node.link(author_class, 'Author #{0}'.format(index))
+            node.link(series_class, series.identity)
+            node.flush(lib)
+
+        fs = FormatString('{author: max=1} / {series} / {@}')
+        nodes = lib.nodes(NodeQuery(display_name=Wildcard('*#*')))
+        expected = [fs.format(node) for node in lib.nodes(NodeQuery(display_name=Wildcard('*#*')))]
+        self.assertEqual(len(expected), 30)
+        self.assertTrue(any(text.endswith(' / Alice books / static #0') for text in expected))
+
+        # tags and referenced nodes are fetched with at most one query each
+        lib.queryLog.enabled = True
+        self.assertEqual(fs.formatMany(nodes), expected)
+        self.assertTrue(len(lib.queryLog.entries()) <= 2)
+        lib.queryLog.enabled = False
+
+        values = lib.tagValuesByNode([node.id for node in nodes], ['Author'])
+        self.assertEqual(len(values), 30)
+        self.assertEqual(sorted(values[nodes[0].id].keys()), ['author'])
+        self.assertEqual(len(values[nodes[0].id]['author']), 2)
+        self.assertEqual(lib.nodeDisplayNames([series.id, -1]), {series.id: 'Alice books'})
+
+        self.assertEqual(displayNames(nodes), [node.displayName for node in nodes])
+        self.assertEqual(FormatString('text').formatMany(nodes), ['text'] * len(nodes))
+        self.assertEqual(fs.formatMany([]), [])
+
+        lib.close()
@@ -31,13 +31,15 @@ class TestLibraryMeta(unittest.TestCase):
 
         self.assertEqual(self.lib.allMeta, {'meta1': 'meta1_value2',
                                              'meta2': 'meta2_value',
-                                             'organica': 'is magic'})
+                                             'organica': 'is magic',
+                                             'uuid': self.lib.uuid})
 
         self.lib.removeMeta('meta1')
         self.assertTrue(not self.lib.testMeta('meta1'))
         self.assertEqual(self.lib.getMeta('meta1'), '')
         self.assertEqual(self.lib.allMeta, {'meta2': 'meta2_value',
-                                             'organica': 'is magic'})
+                                             'organica': 'is magic',
+                                             'uuid': self.lib.uuid})
 
         self.assertFalse(objects.isCorrectIdent('meta!'))
         self.assertTrue(objects.isCorrectIdent('meta2_name'))
@@ -85,3 +87,355 @@ class TestLibraryTagClasses(unittest.TestCase):
 
         classes = self.lib.tagClasses(Wildcard('a*'))
         self.assertListEqual(classes, [self.lib.tagClass('author')])
+
+
+class TestLibrarySync(unittest.TestCase):
+    def setUp(self):
+        self.master = library.Library.createLibrary(':memory:')
+        self.replica = library.Library.createLibrary(':memory:')
+
+    def tearDown(self):
+        self.master.close()
+        self.replica.close()
+
+    def test(self):
+        from organica.lib.filters import TagQuery, NodeQuery
+        from organica.lib.changelog import Change
+
+        self.assertNotEqual(self.master.uuid, self.replica.uuid)
+        self.assertEqual(self.replica.syncedSeq(self.master.uuid), 0)
+
+        author_class = self.master.createTagClass('author')
+        node = self.master.createNode('Alice in Wonderland')
+        node.link(author_class, 'Lewis Carrol')
+        node.flush()
+        self.master.setMeta('meta1', 'value1')
+
+        seq = self.master.lastChangeSeq
+        self.assertTrue(seq > 0)
+        self.assertEqual(len(self.master.changesSince(seq)), 0)
+        self.assertTrue(all(c.origin == self.master.uuid for c in self.master.changesSince()))
+
+        self.assertEqual(self.replica.syncFrom(self.master), len(self.master.changesSince()))
+        self.assertEqual(self.replica.syncedSeq(self.master.uuid), seq)
+        self.assertEqual(self.replica.getMeta('meta1'), 'value1')
+        replica_nodes = self.replica.nodes(NodeQuery(display_name='Alice in Wonderland'))
+        self.assertEqual(len(replica_nodes), 1)
+        self.assertEqual(len(replica_nodes[0].tags(TagQuery(tag_class='author', text='Lewis Carrol'))), 1)
+
+        # only delta is transferred on next synchronization
+        node.displayNameTemplate = 'Alice'
+        node.unlink(TagQuery(tag_class='author'))
+        node.flush()
+        delta = self.master.changesSince(seq)
+        self.assertEqual([c.objectType for c in delta], [Change.NODE, Change.LINK])
+
+        # changes survive serialization
+        delta = [Change.fromDict(c.toDict()) for c in delta]
+        self.replica.applyChanges(delta)
+        replica_node = self.replica.nodes(NodeQuery(display_name='Alice'))[0]
+        self.assertFalse(replica_node.allTags)
+        self.assertEqual(self.replica.syncFrom(self.master), 0)
+
+        # changes applied from master are not applied back
+        self.master.syncFrom(self.replica)
+        self.assertEqual(len(self.master.nodes(NodeQuery())), 1)
+
+        node.remove()
+        self.replica.syncFrom(self.master)
+        self.assertFalse(self.replica.nodes(NodeQuery()))
+
+
+class TestLibraryQueryLog(unittest.TestCase):
+    def setUp(self):
+        self.lib = library.Library.createLibrary(':memory:')
+        self.lib.createTagClass('author')
+        for index in range(10):
+            self.lib.createNode('node #{0}'.format(index))
+
+    def tearDown(self):
+        self.lib.close()
+
+    def test(self):
+        from organica.lib.filters import NodeQuery
+
+        query_log = self.lib.queryLog
+        self.assertFalse(query_log.enabled)
+        self.lib.nodes(NodeQuery())
+        self.assertFalse(query_log.entries())
+
+        query_log.enabled = True
+        query_log.threshold = 1000
+        self.assertEqual(len(self.lib.nodes(NodeQuery())), 10)
+        entries = query_log.entries()
+        self.assertTrue(entries)
+        self.assertTrue(any(e.rowCount == 10 and 'from nodes' in e.sql.lower() for e in entries))
+        self.assertTrue(all(e.plan is None for e in entries))
+        self.assertFalse(query_log.slowEntries())
+
+        # every statement is slow now, query plans should be captured
+        query_log.clear()
+        query_log.threshold = 0
+        self.lib.createNode('node #10')
+        self.lib.nodes(NodeQuery(display_name='node #10'))
+        slow_entries = query_log.slowEntries()
+        self.assertTrue(slow_entries)
+        self.assertTrue(any(e.plan for e in slow_entries if e.sql.lower().startswith('select')))
+
+        # statements executed with executemany are logged too
+        self.assertTrue(any(e.executions == 1 and e.rowCount == 1 for e in slow_entries
+                            if e.sql.lower().startswith('update nodes set rendered_name')))
+        query_log.clear()
+        query_log.threshold = 1000
+        with self.lib.transaction() as cursor:
+            cursor.executemany('insert into nodes(display_name) values(?)', [('a', ), ('b', ), ('c', )])
+        entry = [e for e in query_log.entries() if e.sql.startswith('insert into nodes')][0]
+        self.assertEqual((entry.executions, entry.rowCount, entry.params), (3, 3, ('a', )))
+
+        # ring buffer is bounded
+        query_log.capacity = 2
+        self.lib.nodes(NodeQuery())
+        self.assertEqual(len(query_log.entries()), 2)
+
+        query_log.enabled = False
+        query_log.clear()
+        self.lib.nodes(NodeQuery())
+        self.assertFalse(query_log.entries())
+
+
+class TestLibraryRenderedNames(unittest.TestCase):
+    def setUp(self):
+        self.lib = library.Library.createLibrary(':memory:')
+        self.author_class = self.lib.createTagClass('author')
+
+    def tearDown(self):
+        self.lib.close()
+
+    def renderedName(self, node):
+        with self.lib.cursor() as c:
+            c.execute('select rendered_name, rendered_key from nodes where id = ?', (node.id, ))
+            return tuple(c.fetchone())
+
+    def test(self):
+        from organica.lib.filters import NodeQuery
+
+        node = self.lib.createNode('Book by {author}', [(self.author_class, 'Lewis Carrol')])
+        self.assertEqual(self.renderedName(node), ('Book by Lewis Carrol', 'book by lewis carrol'))
+
+        # tag used by template is updated
+        tag = self.lib.node(node).allTags[0]
+        tag.value = TagValue('Mark Twain')
+        self.lib.flushTag(tag)
+        self.assertEqual(self.renderedName(node)[0], 'Book by Mark Twain')
+
+        # link is removed and created
+        self.lib.removeLink(node, tag)
+        self.assertEqual(self.renderedName(node)[0], 'Book by ')
+        self.lib.createLink(node, tag)
+        self.assertEqual(self.renderedName(node)[0], 'Book by Mark Twain')
+
+        # template is changed, referring nodes are updated too
+        ref_class = self.lib.createTagClass('sequel_of', TagValue.TYPE_NODE_REFERENCE)
+        sequel = self.lib.createNode('Sequel of {sequel_of}', [(ref_class, node.identity)])
+        self.assertEqual(self.renderedName(sequel)[0], 'Sequel of Book by {author}')
+        node = self.lib.node(node)
+        node.displayNameTemplate = 'Tom Sawyer'
+        node.flush()
+        self.assertEqual(self.renderedName(node)[0], 'Tom Sawyer')
+        self.assertEqual(self.renderedName(sequel)[0], 'Sequel of Tom Sawyer')
+
+        self.assertEqual(self.lib.nodes(NodeQuery(name='TOM SAWYER')), [node])
+        self.assertEqual(self.lib.nodes(NodeQuery(name=Wildcard('sequel*'))), [sequel])
+        self.assertTrue(NodeQuery(name='sequel of tom sawyer').passes(sequel))
+        self.assertFalse(NodeQuery(name='Sequel').passes(sequel))
+
+
+class TestLibraryPagination(unittest.TestCase):
+    def setUp(self):
+        self.lib = library.Library.createLibrary(':memory:')
+        year_class = self.lib.createTagClass('year', TagValue.TYPE_NUMBER)
+        years = [self.lib.createTag(year_class, 1900 + index) for index in range(5)]
+        for index in range(20):
+            self.lib.createNode('Book #{0:02}'.format(19 - index), [years[index % 5]])
+        self.lib.createNode('book without year')
+
+    def tearDown(self):
+        self.lib.close()
+
+    def pages(self, query, page_size):
+        result, last = [], None
+        while True:
+            page_query = query.limit(page_size) if last is None else query.after(last).limit(page_size)
+            page = self.lib.nodes(page_query)
+            self.assertTrue(len(page) <= page_size)
+            result += page
+            if len(page) < page_size:
+                return result
+            last = page[-1]
+
+    def test(self):
+        from organica.lib.filters import NodeQuery, TagQuery
+
+        names = [node.displayName for node in self.lib.nodes(NodeQuery().orderBy('name'))]
+        self.assertEqual(names, sorted(names, key=str.lower))
+        self.assertEqual([node.displayName for node in self.lib.nodes(NodeQuery().orderBy('-name'))],
+                         list(reversed(names)))
+
+        # keyset pages give same results as whole query
+        for query in (NodeQuery().orderBy('name'), NodeQuery().orderBy('tag_year', '-name'),
+                      NodeQuery(name=Wildcard('book #*')).orderBy('-tag_year')):
+            self.assertEqual(self.pages(query, 3), self.lib.nodes(query))
+
+        by_year = self.lib.nodes(NodeQuery().orderBy('tag_year', 'name'))
+        self.assertEqual(by_year[0].displayName, 'Book #04')
+        self.assertEqual(by_year[-1].displayName, 'book without year')
+
+        self.assertEqual(len(self.lib.nodes(NodeQuery().orderBy('id').offset(18))), 3)
+
+        # limits are allowed in nested queries
+        first_year = self.lib.tags(TagQuery(tag_class='year').orderBy('value').limit(1))
+        self.assertEqual(len(first_year), 1)
+        self.assertEqual(first_year[0].value.number, 1900)
+        self.assertEqual(len(self.lib.nodes(NodeQuery(tags=TagQuery(tag_class='year').orderBy('value').limit(1)))),
+                         4)
+
+        tags = self.lib.tags(TagQuery(tag_class='year').orderBy('-use_count', 'value'))
+        self.assertEqual([tag.value.number for tag in tags], [1900, 1901, 1902, 1903, 1904])
+
+        self.assertRaises(TypeError, NodeQuery().orderBy, 'use_count')
+        self.assertRaises(TypeError, NodeQuery().after, objects.Node('unflushed'))
+
+
+class TestLibraryCooccurringTags(unittest.TestCase):
+    def setUp(self):
+        self.lib = library.Library.createLibrary(':memory:')
+
+    def tearDown(self):
+        self.lib.close()
+
+    def test(self):
+        from organica.lib.filters import TagQuery
+
+        author_class = self.lib.createTagClass('author')
+        gentre_class = self.lib.createTagClass('gentre')
+        fiction = self.lib.createTag(gentre_class, 'Fiction')
+        poetry = self.lib.createTag(gentre_class, 'Poetry')
+        carrol = self.lib.createTag(author_class, 'Lewis Carrol')
+        twain = self.lib.createTag(author_class, 'Mark Twain')
+        self.lib.createNode('Alice in Wonderland', [fiction, carrol])
+        self.lib.createNode('The Hunting of the Snark', [poetry, carrol])
+        self.lib.createNode('Phantasmagoria', [fiction, poetry, carrol])
+        self.lib.createNode('Tom Sawyer', [fiction, twain])
+
+        def values(tags_with_counts):
+            return sorted((str(tag.value), count) for tag, count in tags_with_counts)
+
+        self.assertEqual(values(self.lib.cooccurringTags([fiction], 'author')),
+                         [('Lewis Carrol', 2), ('Mark Twain', 1)])
+        self.assertEqual(values(self.lib.cooccurringTags([carrol])),
+                         [('Fiction', 2), ('Poetry', 2)])
+        self.assertEqual(values(self.lib.cooccurringTags([fiction, poetry])), [('Lewis Carrol', 1)])
+
+        # results are same as ones of friend_of filter
+        self.assertEqual(set(tag for tag, count in self.lib.cooccurringTags([twain])),
+                         set(tag for tag in self.lib.tags(TagQuery(friend_of=twain)) if tag != twain))
+
+        self.assertEqual(self.lib.cooccurringTags([fiction], 'publisher'), [])
+        self.assertEqual(self.lib.cooccurringTags([]), [])
+
+
+class TestLibraryFacets(unittest.TestCase):
+    def setUp(self):
+        self.lib = library.Library.createLibrary(':memory:')
+        author_class = self.lib.createTagClass('author')
+        gentre_class = self.lib.createTagClass('gentre')
+        self.lib.createNode('Alice in Wonderland', [(gentre_class, 'Fiction'), (author_class, 'Lewis Carrol')])
+        self.lib.createNode('The Hunting of the Snark', [(gentre_class, 'Poetry'), (author_class, 'Lewis Carrol')])
+        self.lib.createNode('Tom Sawyer', [(gentre_class, 'Fiction'), (author_class, 'Mark Twain')])
+        self.lib.createNode('Phantasmagoria', [(gentre_class, 'Poetry'), (author_class, 'Lewis Carrol')])
+        self.lib.createNode('Untagged book')
+
+    def tearDown(self):
+        self.lib.close()
+
+    def values(self, facet):
+        return [(str(tag.value), count) for tag, count in facet]
+
+    def test(self):
+        from organica.lib.filters import NodeQuery, TagQuery
+
+        facets = self.lib.facets(NodeQuery())
+        self.assertEqual(sorted(facets.keys()), ['author', 'gentre'])
+        self.assertEqual(self.values(facets['author']), [('Lewis Carrol', 3), ('Mark Twain', 1)])
+        self.assertEqual(self.values(facets['gentre']), [('Fiction', 2), ('Poetry', 2)])
+
+        # only matching nodes are counted
+        facets = self.lib.facets(NodeQuery(tags=TagQuery(tag_class='author', value='Lewis Carrol')))
+        self.assertEqual(self.values(facets['gentre']), [('Poetry', 2), ('Fiction', 1)])
+        self.assertEqual(self.values(facets['author']), [('Lewis Carrol', 3)])
+
+        facets = self.lib.facets(NodeQuery(name=Wildcard('t*')), classes=['Author'], limit_per_class=1)
+        self.assertEqual(list(facets.keys()), ['author'])
+        self.assertEqual(self.values(facets['author']), [('Lewis Carrol', 1)])
+
+        # tags with equal counts are ordered by id
+        facets = self.lib.facets(NodeQuery(), limit_per_class=1)
+        self.assertEqual(self.values(facets['author']), [('Lewis Carrol', 3)])
+        self.assertEqual(self.values(facets['gentre']), [('Fiction', 2)])
+        self.assertEqual(self.lib.facets(NodeQuery(), limit_per_class=0), {})
+
+        # limits of node query are respected
+        facets = self.lib.facets(NodeQuery().orderBy('name').limit(1))
+        self.assertEqual(self.values(facets['author']), [('Lewis Carrol', 1)])
+
+        self.assertEqual(self.lib.facets(NodeQuery(name='No such book')), {})
+        self.assertEqual(self.lib.facets(NodeQuery(), classes=['publisher']), {})
+
+
+class TestLibraryProfiling(unittest.TestCase):
+    def setUp(self):
+        self.lib = library.Library.createLibrary(':memory:')
+        author_class = self.lib.createTagClass('author')
+        for index in range(5):
+            node = self.lib.createNode('node #{0}'.format(index))
+            node.link(author_class, 'author #{0}'.format(index))
+            node.flush()
+
+    def tearDown(self):
+        library.Library.setProfilingEnabled(False)
+        library.Library.profileStats(reset=True)
+        self.lib.close()
+
+    def test(self):
+        from organica.lib.filters import NodeQuery, TagQuery
+
+        original_nodes = library.Library.nodes
+
+        library.Library.profileStats(reset=True)
+        self.lib.nodes(NodeQuery())
+        self.assertFalse(library.Library.profileStats())
+
+        library.Library.setProfilingEnabled(True)
+        self.assertIsNot(library.Library.nodes, original_nodes)
+        nodes = self.lib.nodes(NodeQuery())
+        for node in nodes:
+            node.ensureTagsFetched()
+        self.lib.tags(TagQuery(tag_class='author'))
+
+        stats = library.Library.profileStats()
+        self.assertEqual(stats['Library.nodes'].calls, 1)
+        self.assertEqual(stats['Library.nodes'].rows, 5)
+        self.assertEqual(stats['Node.ensureTagsFetched'].calls, 5)
+        self.assertTrue(stats['Library.tags'].rows >= 5)
+        self.assertTrue(stats['_Query.generateSqlWhere'].calls >= 1)
+        self.assertTrue(stats['deepcopy'].calls > 0)
+        self.assertTrue(stats['deepcopy'].rows >= stats['deepcopy'].calls)
+
+        stats = library.Library.profileStats(reset=True)
+        self.assertTrue(stats)
+        self.assertFalse(library.Library.profileStats())
+
+        library.Library.setProfilingEnabled(False)
+        self.assertIs(library.Library.nodes, original_nodes)
+        self.lib.nodes(NodeQuery())
+        self.assertFalse(library.Library.profileStats())
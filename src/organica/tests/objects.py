@@ -95,3 +95,83 @@ class TestNode(unittest.TestCase):
         self.assertTrue(Tag(year_class, 1855) in lib.node(node).allTags)
 
         lib.close()
+
+
+class TestNodeTagIndex(unittest.TestCase):
+    def test(self):
+        from organica.lib.objects import ObjectError
+
+        lib = Library.createLibrary(':memory:')
+        author_class = lib.createTagClass('author')
+        year_class = lib.createTagClass('year', TagValue.TYPE_NUMBER)
+
+        node = Node('some_book', (Tag(author_class, 'Lewis Carrol'), Tag(year_class, 1865)))
+        self.assertRaises(ObjectError, node.link, author_class, 'LEWIS CARROL')
+        self.assertTrue(node.testTag(Tag(author_class, 'lewis carrol')))
+        self.assertFalse(node.testTag(Tag(year_class, 1866)))
+
+        # index follows changes of tags list
+        node.allTags.append(Tag(year_class, 1866))
+        self.assertTrue(node.testTag(Tag(year_class, 1866)))
+        node.unlink(Tag(year_class, 1866))
+        self.assertFalse(node.testTag(Tag(year_class, 1866)))
+        # replacing tag does not change length of list
+        node.allTags[-1] = Tag(year_class, 1867)
+        self.assertTrue(node.testTag(Tag(year_class, 1867)))
+        self.assertFalse(node.testTag(Tag(year_class, 1865)))
+        node.allTags[-1] = Tag(year_class, 1865)
+        node.flush(lib)
+
+        other_node = Node('another_book', (Tag(author_class, 'Lewis Carrol'), Tag(year_class, 1871)))
+        other_node.flush(lib)
+        self.assertEqual(Node.commonTags((node, other_node)), [Tag(author_class, 'Lewis Carrol')])
+        self.assertEqual(len(Node.commonTags((node, lib.node(node)))), 2)
+        self.assertEqual(Node.commonTags(()), [])
+
+        lib.close()
+
+
+class TestObjectsLayout(unittest.TestCase):
+    def test(self):
+        import copy
+
+        lib = Library.createLibrary(':memory:')
+        node = Node('some_book', (Tag(lib.createTagClass('author'), 'Lewis Carrol'), ))
+        node.flush(lib)
+
+        # objects have compact layout without per-instance dictionary
+        for obj in (node, node.allTags[0], node.allTags[0].value, node.identity, node.allTags[0].tagClass):
+            self.assertFalse(hasattr(obj, '__dict__'))
+
+        # copies share immutable identities
+        node_copy = copy.deepcopy(node)
+        self.assertIs(node_copy.identity, node.identity)
+        self.assertIs(node_copy.allTags[0].identity, node.allTags[0].identity)
+        self.assertIsNot(node_copy.allTags[0].value, node.allTags[0].value)
+        self.assertEqual(node_copy, node)
+
+        lib.close()
+
+
+class TestObjectsHashing(unittest.TestCase):
+    def test(self):
+        lib = Library.createLibrary(':memory:')
+        author_class = lib.createTagClass('author')
+        node = Node('some_book', (Tag(author_class, 'Lewis Carrol'), ))
+        node.flush(lib)
+        tag = node.allTags[0]
+
+        # equal objects have equal hashes
+        self.assertEqual(hash(Identity(lib, node.id)), hash(node.identity))
+        self.assertEqual(hash(TagValue('lewis carrol').hashKey), hash(TagValue('Lewis Carrol').hashKey))
+        self.assertEqual(hash(Tag(author_class, 'LEWIS CARROL')), hash(tag))
+        self.assertEqual(hash(lib.tagClass('AUTHOR')), hash(author_class))
+
+        identities = {node.identity, tag.identity}
+        self.assertTrue(Identity(lib, node.id) in identities)
+        self.assertFalse(Identity() in identities)
+        self.assertTrue(Tag(author_class, 'lewis carrol') in {tag})
+        self.assertTrue(lib.node(node) in {node})
+        self.assertTrue(lib.tagClass(author_class.identity) == author_class)
+
+        lib.close()
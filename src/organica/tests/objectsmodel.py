@@ -1,5 +1,13 @@
 import unittest
-from organica.lib.objectsmodel import ObjectsModel
+import os
+import time
+import shutil
+import tempfile
+from PyQt4.QtCore import Qt
+from organica.lib.objectsmodel import ObjectsModel, FormattedColumn
+from organica.lib.objects import TagValue
+from organica.lib.library import Library
+from organica.lib.filters import NodeQuery, Wildcard
 from organica.tests.samplelib import buildSample
 
 
@@ -11,3 +19,215 @@ class TestObjectsModel(unittest.TestCase):
         # should show all objects
 
         self.assertEqual(model.rowCount(), 4)
+
+        for row in range(model.rowCount()):
+            node_identity = model.data(model.index(row, 0), ObjectsModel.NodeIdentityRole)
+            self.assertEqual(model.indexOfNode(node_identity).row(), row)
+            self.assertEqual(model.indexOfNode(lib.node(node_identity)).row(), row)
+
+
+class _SmallObjectsModel(ObjectsModel):
+    FetchBatchSize = 3
+    WindowSize = 2
+    CacheSize = 4
+
+
+class TestObjectsModelFetching(unittest.TestCase):
+    def test(self):
+        lib = Library.createLibrary(':memory:')
+        nodes = [lib.createNode('node #{0}'.format(index)) for index in range(10)]
+
+        model = _SmallObjectsModel(lib)
+        self.assertEqual(model.rowCount(), 3)
+        self.assertTrue(model.canFetchMore())
+        model.fetchMore()
+        self.assertEqual(model.rowCount(), 6)
+
+        # data is fetched for any loaded row
+        for row in range(model.rowCount()):
+            self.assertEqual(model.data(model.index(row, 0)), nodes[row].displayName)
+
+        # rows are loaded until node is found
+        self.assertEqual(model.indexOfNode(nodes[7]).row(), 7)
+        self.assertEqual(model.rowCount(), 9)
+
+        # node following loaded rows is not inserted, it will be fetched later
+        lib.createNode('node #10')
+        self.assertEqual(model.rowCount(), 9)
+        model.fetchAll()
+        self.assertFalse(model.canFetchMore())
+        self.assertEqual(model.rowCount(), 11)
+        lib.createNode('node #11')
+        self.assertEqual(model.rowCount(), 12)
+
+        lib.removeNode(nodes[1])
+        self.assertEqual(model.rowCount(), 11)
+        self.assertEqual(model.indexOfNode(nodes[2]).row(), 1)
+        self.assertFalse(model.indexOfNode(nodes[1]).isValid())
+
+        # node that does not match filter disappears after update
+        model.filters = [NodeQuery(display_name=Wildcard('node #?'))]
+        self.assertEqual(model.rowCount(), 3)
+        model.fetchAll()
+        self.assertEqual(model.rowCount(), 9)
+        node = lib.node(nodes[0])
+        node.displayNameTemplate = 'renamed node'
+        node.flush()
+        self.assertEqual(model.rowCount(), 8)
+        self.assertEqual(model.data(model.index(0, 0)), 'node #2')
+
+        lib.close()
+
+
+class TestObjectsModelLoader(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.lib = Library.createLibrary(os.path.join(self.directory, 'lib.orl'))
+        author_class = self.lib.createTagClass('author')
+        for index in range(100):
+            self.lib.createNode('{{author}} - book #{0}'.format(index), [(author_class, 'Author #{0}'.format(index))])
+
+    def tearDown(self):
+        self.lib.close()
+        shutil.rmtree(self.directory)
+
+    def waitForText(self, model, row, expected):
+        for attempt in range(500):
+            text = model.data(model.index(row, 0))
+            if text != ObjectsModel.PlaceholderText:
+                self.assertEqual(text, expected)
+                return
+            time.sleep(0.01)
+        self.fail('row was not loaded')
+
+    def test(self):
+        model = ObjectsModel(self.lib)
+        self.assertIsNotNone(model.loader)
+        self.assertIsNone(ObjectsModel(self.lib, background_loading=False).loader)
+
+        # texts are rendered in background, placeholder is shown meanwhile
+        self.assertEqual(model.data(model.index(70, 0)), ObjectsModel.PlaceholderText)
+        self.waitForText(model, 70, 'Author #70 - book #70')
+        self.waitForText(model, 5, 'Author #5 - book #5')
+
+        # updated node is rendered again
+        node = self.lib.node(model.data(model.index(70, 0), ObjectsModel.NodeIdentityRole))
+        node.displayNameTemplate = 'renamed'
+        node.flush()
+        self.waitForText(model, 70, 'renamed')
+
+        # loader does not see changes until transaction is committed
+        self.waitForText(model, 0, 'Author #0 - book #0')
+        with self.lib.transaction():
+            node = self.lib.node(model.data(model.index(0, 0), ObjectsModel.NodeIdentityRole))
+            node.displayNameTemplate = 'renamed in transaction'
+            node.flush()
+            model.data(model.index(0, 0))
+            time.sleep(0.1)  # let loader render text of uncommitted state
+        self.waitForText(model, 0, 'renamed in transaction')
+
+        # loader thread is stopped when library is closed
+        self.assertTrue(model.loader.isRunning())
+        self.lib.close()
+        self.assertFalse(model.loader.isRunning())
+
+    def testFailingColumn(self):
+        class FailingColumn(FormattedColumn):
+            def renderMany(self, nodes, connection=None):
+                raise ValueError('cannot render')
+
+        # rows loader failed to render are rendered by model itself, loader keeps working
+        model = ObjectsModel(self.lib)
+        model.columns = [FailingColumn('{author}')]
+        self.assertEqual(model.data(model.index(0, 0)), ObjectsModel.PlaceholderText)
+        self.waitForText(model, 0, 'Author #0')
+        model.columns = [FormattedColumn('{author}!')]
+        self.waitForText(model, 0, 'Author #0!')
+        self.assertTrue(model.loader.isRunning())
+        model.loader.stop()
+
+
+class _CountingColumn(FormattedColumn):
+    def __init__(self, template):
+        FormattedColumn.__init__(self, template)
+        self.calls = 0
+
+    def data(self, index, node, role=Qt.DisplayRole):
+        self.calls += 1
+        return FormattedColumn.data(self, index, node, role)
+
+
+class TestObjectsModelCellCache(unittest.TestCase):
+    def test(self):
+        lib = Library.createLibrary(':memory:')
+        author_class = lib.createTagClass('author')
+        year_class = lib.createTagClass('year', TagValue.TYPE_NUMBER)
+        node = lib.createNode('book', [(author_class, 'Lewis Carrol'), (year_class, 1865)])
+
+        model = ObjectsModel(lib)
+        author_column, year_column = _CountingColumn('{author}'), _CountingColumn('{year}')
+        model.columns = [author_column, year_column]
+
+        for attempt in range(3):
+            self.assertEqual(model.data(model.index(0, 0)), 'Lewis Carrol')
+            self.assertEqual(model.data(model.index(0, 1)), '1865')
+        self.assertEqual((author_column.calls, year_column.calls), (1, 1))
+
+        # only cells depending on changed tag are rendered again
+        year_tag = [tag for tag in lib.node(node).allTags if tag.className == 'year'][0]
+        year_tag.value = TagValue(1871)
+        lib.flushTag(year_tag)
+        self.assertEqual(model.data(model.index(0, 0)), 'Lewis Carrol')
+        self.assertEqual(model.data(model.index(0, 1)), '1871')
+        self.assertEqual((author_column.calls, year_column.calls), (1, 2))
+
+        lib.createLink(node, lib.createTag(author_class, 'Mark Twain'))
+        self.assertEqual(model.data(model.index(0, 0)), 'Lewis Carrol, Mark Twain')
+        self.assertEqual(model.data(model.index(0, 1)), '1871')
+        self.assertEqual((author_column.calls, year_column.calls), (2, 2))
+
+        # changing node itself makes all cells stale
+        node = lib.node(node)
+        node.displayNameTemplate = 'another book'
+        node.flush()
+        model.data(model.index(0, 0))
+        model.data(model.index(0, 1))
+        self.assertEqual((author_column.calls, year_column.calls), (3, 3))
+
+        model.columns = [year_column]
+        self.assertEqual(model.data(model.index(0, 0)), '1871')
+        self.assertEqual(year_column.calls, 4)
+
+        lib.close()
+
+
+class TestObjectsModelRemoval(unittest.TestCase):
+    def test(self):
+        from unittest import mock
+
+        lib = Library.createLibrary(':memory:')
+        nodes = [lib.createNode('node #{0}'.format(index)) for index in range(20)]
+        model = ObjectsModel(lib)
+
+        removed_ranges = []
+        model.rowsAboutToBeRemoved.connect(lambda parent, first, last: removed_ranges.append((first, last)))
+
+        # removals are collected until control returns to event loop
+        timers = []
+        with mock.patch('organica.lib.objectsmodel.QTimer.singleShot', lambda msec, slot: timers.append(slot)):
+            for index in (3, 4, 5, 6, 10, 12, 11, 19):
+                lib.removeNode(nodes[index])
+        self.assertEqual(len(timers), 1)
+        self.assertEqual(removed_ranges, [])
+        timers[0]()
+
+        self.assertEqual(removed_ranges, [(19, 19), (10, 12), (3, 6)])
+        self.assertEqual(model.rowCount(), 12)
+        for node in nodes:
+            index = model.indexOfNode(node)
+            if lib.node(node) is not None:
+                self.assertEqual(model.data(index, ObjectsModel.NodeIdentityRole), node.identity)
+            else:
+                self.assertFalse(index.isValid())
+
+        lib.close()
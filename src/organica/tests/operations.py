@@ -120,3 +120,89 @@ class TestOperation(unittest.TestCase):
         wrapper_operation.run()
         wrapper_operation.waitForFinish()
         self.assertEqual(wrapper_operation.state.results['result'], 4)
+
+
+class TestLibraryMaintenanceOperations(unittest.TestCase):
+    def setUp(self):
+        import tempfile
+
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        import shutil
+
+        shutil.rmtree(self.directory)
+
+    def test(self):
+        import os
+        from organica.lib.library import Library
+        from organica.lib.filters import NodeQuery, Wildcard
+        from organica.utils.operations import BackupLibraryOperation, OptimizeLibraryOperation
+
+        temp_dir = self.directory
+        lib = Library.createLibrary(os.path.join(temp_dir, 'source.db'))
+        for node_index in range(100):
+            lib.createNode('node #{0}'.format(node_index))
+        lib.removeNodes(NodeQuery(display_name=Wildcard('node #1*')))
+
+        backup_filename = os.path.join(temp_dir, 'backup.db')
+        backup_op = BackupLibraryOperation(lib, backup_filename)
+        backup_op.run()
+        self.assertEqual(backup_op.waitForFinish(), OperationState.COMPLETED)
+        self.assertEqual(backup_op.state.results[BackupLibraryOperation.ResultName], backup_filename)
+
+        backup_lib = Library.loadLibrary(backup_filename)
+        self.assertEqual(len(backup_lib.nodes(NodeQuery())), 89)
+        backup_lib.close()
+
+        optimize_op = OptimizeLibraryOperation(lib)
+        optimize_op.run()
+        self.assertEqual(optimize_op.waitForFinish(), OperationState.COMPLETED)
+        self.assertEqual(len(lib.nodes(NodeQuery())), 89)
+
+        # cancelled backup leaves no file
+        cancelled_filename = os.path.join(temp_dir, 'cancelled.db')
+        self.assertFalse(lib.backupTo(cancelled_filename, 1, lambda remaining, total: False))
+        self.assertFalse(os.path.exists(cancelled_filename))
+
+        # as well as failed one
+        def failing_callback(remaining, total):
+            raise RuntimeError('backup failed')
+
+        self.assertRaises(RuntimeError, lib.backupTo, cancelled_filename, 1, failing_callback)
+        self.assertFalse(os.path.exists(cancelled_filename))
+
+        # full vacuum of library created by older version does not lock library
+        import threading
+
+        conn = lib.openConnection()
+        conn.execute('pragma auto_vacuum = none')
+        conn.execute('vacuum')
+        conn.close()
+
+        lock_taken, release_lock = threading.Event(), threading.Event()
+
+        def hold_lock():
+            with lib.lock:
+                lock_taken.set()
+                release_lock.wait(10)
+
+        holder = threading.Thread(target=hold_lock, daemon=True)
+
+        def on_progress(done_steps, total_steps):
+            if done_steps == 2:
+                holder.start()
+                lock_taken.wait()
+            return True
+
+        try:
+            self.assertTrue(lib.optimize(progress_callback=on_progress))
+            self.assertTrue(holder.is_alive())
+        finally:
+            release_lock.set()
+            holder.join()
+        conn = lib.openConnection()
+        self.assertEqual(conn.execute('pragma auto_vacuum').fetchone()[0], 2)
+        conn.close()
+
+        lib.close()
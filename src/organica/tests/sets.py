@@ -28,6 +28,8 @@ class TestTagSet(unittest.TestCase):
 
         self.assertEqual(len(tagSet), 1)
         self.assertTrue(author_carrol.identity in tagSet)
+        self.assertEqual(tagSet[0], author_carrol.identity)
+        self.assertEqual(list(tagSet), [author_carrol.identity])
 
         author_carrol.tagClass = just_a_man_class
         author_carrol.flush()
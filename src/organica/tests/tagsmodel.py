@@ -1,4 +1,5 @@
 import unittest
+from unittest import mock
 
 from organica.lib.tagsmodel import TagsModel
 from organica.tests.samplelib import buildSample
@@ -30,3 +31,131 @@ class TestTagsModel(unittest.TestCase):
         self.assertEqual(sorted(values), ['Brand new gentre', 'Fiction', 'Tragedy'])
 
         lib.close()
+
+
+class TestTagsModelFetching(unittest.TestCase):
+    def test(self):
+        lib = buildSample()
+        model = TagsModel(lib)
+        model.hierarchy = ['gentre', 'author']
+
+        # children are not fetched until view asks for them
+        values = [model.data(model.index(x, 1)) for x in range(model.rowCount())]
+        fiction_index = model.index(values.index('Fiction'), 0)
+        self.assertTrue(model.hasChildren(fiction_index))
+        self.assertTrue(model.canFetchMore(fiction_index))
+        self.assertEqual(model.rowCount(fiction_index), 0)
+
+        model.fetchMore(fiction_index)
+        self.assertFalse(model.canFetchMore(fiction_index))
+        self.assertEqual(model.rowCount(fiction_index), 1)
+        author_index = model.index(0, 1, fiction_index)
+        self.assertEqual(model.data(author_index), 'Lewis Carrol')
+        self.assertEqual(model.data(model.index(0, 2, fiction_index)), 1)
+        self.assertEqual(model.parent(author_index).internalId(), fiction_index.internalId())
+
+        # leaves on last level have no children
+        self.assertFalse(model.hasChildren(author_index))
+        self.assertFalse(model.canFetchMore(author_index))
+
+        # fetched leaves are updated
+        another_book = lib.createNode('Another book')
+        another_book.link(lib.tagClass('gentre'), 'Fiction')
+        another_book.link(lib.tagClass('author'), 'Another author')
+        another_book.flush(lib)
+        self.assertEqual(model.rowCount(fiction_index), 2)
+        self.assertEqual(model.data(model.index(fiction_index.row(), 2)), 2)
+
+        # counts of children are number of nodes having both parent and child tags linked
+        another_book.link(lib.tagClass('author'), 'Lewis Carrol')
+        another_book.flush(lib)
+        self.assertEqual(model.rowCount(fiction_index), 2)
+        counts = dict((model.data(model.index(row, 1, fiction_index)), model.data(model.index(row, 2, fiction_index)))
+                      for row in range(2))
+        self.assertEqual(counts, {'Lewis Carrol': 2, 'Another author': 1})
+
+        another_book.unlink(lib.tag(lib.tagClass('author'), 'Another author'))
+        another_book.flush(lib)
+        self.assertEqual(model.rowCount(fiction_index), 1)
+
+        # collapsed branches are released only when model has too many leaves
+        model.branchCollapsed(fiction_index)
+        self.assertEqual(model.rowCount(fiction_index), 1)
+
+        model.MaxLeaves = 1
+        model.branchCollapsed(fiction_index)
+        self.assertEqual(model.rowCount(fiction_index), 0)
+        self.assertTrue(model.canFetchMore(fiction_index))
+
+        model.fetchMore(fiction_index)
+        self.assertEqual(model.rowCount(fiction_index), 1)
+
+        lib.close()
+
+
+class TestTagsModelBatches(unittest.TestCase):
+    def test(self):
+        lib = buildSample()
+        model = TagsModel(lib)
+        model.hierarchy = ['gentre', 'author']
+        gentre_class, author_class = lib.tagClass('gentre'), lib.tagClass('author')
+
+        fiction_index = model.indexesForTag(lib.tag(gentre_class, 'Fiction'))[0]
+        model.fetchMore(fiction_index)
+        self.assertEqual(model.rowCount(fiction_index), 1)
+
+        inserted, removed, layout_changes = [], [], []
+        model.rowsAboutToBeInserted.connect(lambda parent, first, last: inserted.append((parent.isValid(), first,
+                                                                                         last)))
+        model.rowsAboutToBeRemoved.connect(lambda parent, first, last: removed.append((parent.isValid(), first,
+                                                                                       last)))
+        model.layoutChanged.connect(lambda: layout_changes.append(True))
+
+        # changes are collected until control returns to event loop or model is accessed
+        timers = []
+        with mock.patch('organica.lib.tagsmodel.QTimer.singleShot', lambda msec, slot: timers.append(slot)):
+            for index in range(5):
+                lib.createNode('Book #{0}'.format(index), [(gentre_class, 'Gentre #{0}'.format(index)),
+                                                           (author_class, 'Author #{0}'.format(index))])
+            lib.createNode('Another fiction book', [lib.tag(gentre_class, 'Fiction'), (author_class, 'Author #0')])
+            lib.tag(gentre_class, 'Tragedy').remove(remove_links=True)
+        self.assertEqual(len(timers), 1)
+        self.assertEqual((inserted, removed), ([], []))
+
+        # new rows of each parent are inserted at once
+        self.assertEqual(model.rowCount(), 7)
+        self.assertEqual(sorted(inserted), [(False, 2, 6), (True, 1, 1)])
+        self.assertEqual(len(removed), 1)
+        self.assertEqual(layout_changes, [])
+        timers[0]()
+        self.assertEqual(len(inserted), 2)
+
+        values = sorted(model.data(model.index(row, 1)) for row in range(model.rowCount()))
+        self.assertEqual(values, ['Fiction', 'Gentre #0', 'Gentre #1', 'Gentre #2', 'Gentre #3', 'Gentre #4',
+                                  'Novel'])
+
+        # indexes of leaves are valid after rows are shifted
+        for row in range(model.rowCount()):
+            index = model.index(row, 1)
+            self.assertEqual(model.indexesForTag(index.data(TagsModel.TagIdentityRole), 1), [index])
+        fiction_index = model.indexesForTag(lib.tag(gentre_class, 'Fiction'))[0]
+        authors = sorted(model.data(model.index(row, 1, fiction_index)) for row in range(model.rowCount(fiction_index)))
+        self.assertEqual(authors, ['Author #0', 'Lewis Carrol'])
+
+        # adjacent rows are removed together
+        def rowOf(value):
+            return model.indexesForTag(lib.tag(gentre_class, value))[0].row()
+
+        self.assertEqual(rowOf('Gentre #2'), rowOf('Gentre #1') + 1)
+        self.assertNotIn(rowOf('Gentre #4'), (rowOf('Gentre #1') - 1, rowOf('Gentre #2') + 1))
+        del removed[:]
+        with mock.patch('organica.lib.tagsmodel.QTimer.singleShot', lambda msec, slot: None):
+            for value in ('Gentre #1', 'Gentre #2', 'Gentre #4'):
+                lib.tag(gentre_class, value).remove(remove_links=True)
+        self.assertEqual(model.rowCount(), 4)
+        self.assertEqual(sorted(last - first + 1 for is_child, first, last in removed), [1, 2])
+        for row in range(model.rowCount()):
+            index = model.index(row, 1)
+            self.assertEqual(model.indexesForTag(index.data(TagsModel.TagIdentityRole), 1), [index])
+
+        lib.close()
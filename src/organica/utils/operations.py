@@ -728,6 +728,77 @@ class DelayOperation(Operation):
         QTimer.singleShot(self.__delay, self.finish)
 
 
+class _LibraryMaintenanceOperation(Operation):
+    """Base class for operations that execute long library maintenance routine supporting progress
+    reporting and cancellation through callback (see Library.backupTo and Library.optimize).
+    """
+
+    def __init__(self, lib, title='', parent=None):
+        super().__init__(title, parent)
+        self._lib = lib
+        self.__cancelRequested = False
+
+    def onCommandReceived(self, command):
+        if command == self.CANCEL_COMMAND:
+            with self.lock:
+                self.__cancelRequested = True
+            return True
+        return False
+
+    def doWork(self):
+        self.setCanCancel(True)
+        if not self._maintain() or self.__cancelRequested:
+            self.cancel()
+
+    def _maintain(self):
+        """Should be reimplemented to execute maintenance routine passing self._onProgress as progress callback.
+        Should return False if routine was cancelled.
+        """
+
+        raise NotImplementedError()
+
+    def _onProgress(self, done, total):
+        if total:
+            self.setProgress(min(100.0, 100.0 * done / total))
+        with self.lock:
+            return not self.__cancelRequested
+
+
+class BackupLibraryOperation(_LibraryMaintenanceOperation):
+    """Copies library database into another file while library remains usable. Name of created file
+    is accessible in results dict under 'filename' name. Partially copied file is removed if operation is cancelled.
+    """
+
+    ResultName = 'filename'
+    PagesPerStep = 256
+
+    def __init__(self, lib, filename, parent=None):
+        super().__init__(lib, tr('Backup library to {0}').format(filename), parent)
+        self.__filename = filename
+
+    def _maintain(self):
+        self.setProgressText(tr('Copying database'))
+        completed = self._lib.backupTo(self.__filename, self.PagesPerStep,
+                                       lambda remaining, total: self._onProgress(total - remaining, total))
+        if completed:
+            self.addResult(self.ResultName, self.__filename)
+        return completed
+
+
+class OptimizeLibraryOperation(_LibraryMaintenanceOperation):
+    """Updates query planner statistics and compacts library database (see Library.optimize).
+    """
+
+    PagesPerStep = 256
+
+    def __init__(self, lib, parent=None):
+        super().__init__(lib, tr('Optimize library'), parent)
+
+    def _maintain(self):
+        self.setProgressText(tr('Optimizing database'))
+        return self._lib.optimize(self.PagesPerStep, self._onProgress)
+
+
 class _InlineOperation(Operation):
     """This is helper class which allows executing of operations
     that are not implemented as a derived class. It supports context manager
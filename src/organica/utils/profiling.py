@@ -0,0 +1,179 @@
+import time
+import threading
+import importlib
+import functools
+from organica.utils.lockable import Lockable
+
+
+class ProfileRecord(object):
+    """Statistics collected for single profiled function.
+        calls:      number of calls
+        totalTime:  wall time in seconds spent in function (including time spent in nested profiled functions)
+        maxTime:    longest single call
+        rows:       total number of objects returned by function (for functions returning lists) or
+                    number of objects copied (for deepcopy)
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.totalTime = 0.0
+        self.maxTime = 0.0
+        self.rows = 0
+
+    @property
+    def averageTime(self):
+        return self.totalTime / self.calls if self.calls else 0.0
+
+    def __str__(self):
+        return '{0} calls, {1:.2f} ms total, {2:.2f} ms max, {3} rows'.format(self.calls, self.totalTime * 1000,
+                                                                           self.maxTime * 1000, self.rows)
+
+
+def _resultLength(result):
+    return len(result) if isinstance(result, (list, tuple)) else 0
+
+
+class Profiler(Lockable):
+    """Counts calls, wall time and returned rows for hot functions of library code.
+    Profiler is disabled by default. Profiled functions are replaced with instrumented ones only while profiler
+    is enabled, and originals are restored on disabling, so code does not pay anything for profiling
+    until it is turned on.
+    """
+
+    # (module, owner class name or None for module-level function, attribute, row counter)
+    _Targets = (
+        ('organica.lib.library', 'Library', 'tags', _resultLength),
+        ('organica.lib.library', 'Library', 'nodes', _resultLength),
+        ('organica.lib.library', 'Library', 'tag', None),
+        ('organica.lib.library', 'Library', 'node', None),
+        ('organica.lib.library', 'Library', 'createLink', None),
+        ('organica.lib.library', 'Library', 'flushNode', None),
+        ('organica.lib.filters', '_Query', 'generateSqlWhere', None),
+        ('organica.lib.objects', 'Node', 'ensureTagsFetched', None),
+        ('organica.lib.formatstring', 'CompiledTemplate', 'render', None)
+    )
+
+    # modules that have deepcopy bound to own name (in addition to copy module itself)
+    _DeepcopyModules = ('copy', 'organica.lib.objects')
+
+    DeepcopyStatName = 'deepcopy'
+
+    def __init__(self):
+        Lockable.__init__(self)
+        self.__stats = {}
+        self.__originals = []  # list of (owner, attribute, original value)
+        self.__local = threading.local()
+
+    @property
+    def enabled(self):
+        with self.lock:
+            return bool(self.__originals)
+
+    @enabled.setter
+    def enabled(self, enable):
+        with self.lock:
+            if enable and not self.__originals:
+                self.__install()
+            elif not enable and self.__originals:
+                for owner, attr, original in reversed(self.__originals):
+                    setattr(owner, attr, original)
+                self.__originals = []
+
+    def stats(self, reset=False):
+        """Return dictionary of collected statistics mapping function name (like 'Library.nodes') to ProfileRecord.
+        If :reset: is True, collected statistics are cleared after returning.
+        """
+
+        with self.lock:
+            result = self.__stats
+            if reset:
+                self.__stats = {}
+            else:
+                result = dict((name, self.__copyRecord(record)) for name, record in result.items())
+            return result
+
+    def reset(self):
+        with self.lock:
+            self.__stats = {}
+
+    def record(self, name, elapsed, rows=0):
+        """Add call information to statistics. Can be used to profile code not covered by profiler itself."""
+
+        with self.lock:
+            record = self.__stats.get(name)
+            if record is None:
+                record = self.__stats[name] = ProfileRecord()
+            record.calls += 1
+            record.totalTime += elapsed
+            record.maxTime = max(record.maxTime, elapsed)
+            record.rows += rows
+
+    @staticmethod
+    def __copyRecord(record):
+        copied = ProfileRecord()
+        copied.__dict__.update(record.__dict__)
+        return copied
+
+    def __install(self):
+        for module_name, owner_name, attr, row_counter in self._Targets:
+            module = importlib.import_module(module_name)
+            owner = getattr(module, owner_name) if owner_name else module
+            original = owner.__dict__[attr]
+            name = '{0}.{1}'.format(owner_name, attr) if owner_name else attr
+            self.__patch(owner, attr, original, self.__instrument(original, name, row_counter))
+
+        original_deepcopy = importlib.import_module('copy').deepcopy
+        instrumented_deepcopy = self.__instrumentDeepcopy(original_deepcopy)
+        for module_name in self._DeepcopyModules:
+            self.__patch(importlib.import_module(module_name), 'deepcopy', original_deepcopy, instrumented_deepcopy)
+
+    def __patch(self, owner, attr, original, replacement):
+        setattr(owner, attr, replacement)
+        self.__originals.append((owner, attr, original))
+
+    def __instrument(self, func, name, row_counter):
+        profiler = self
+
+        @functools.wraps(func)
+        def instrumented(*args, **kwargs):
+            started = time.perf_counter()
+            result = func(*args, **kwargs)
+            profiler.record(name, time.perf_counter() - started, row_counter(result) if row_counter else 0)
+            return result
+
+        return instrumented
+
+    def __instrumentDeepcopy(self, original_deepcopy):
+        profiler = self
+        local = self.__local
+
+        @functools.wraps(original_deepcopy)
+        def instrumented(x, memo=None, *args):
+            # copy module calls deepcopy recursively for nested objects; only outermost call is counted
+            if getattr(local, 'depth', 0):
+                return original_deepcopy(x, memo, *args)
+
+            if memo is None:
+                memo = {}
+            local.depth = 1
+            started = time.perf_counter()
+            try:
+                result = original_deepcopy(x, memo, *args)
+            finally:
+                local.depth = 0
+            # memo holds copied objects and a keep-alive list stored under id(memo)
+            copied = len(memo) - 1 if id(memo) in memo else len(memo)
+            profiler.record(profiler.DeepcopyStatName, time.perf_counter() - started, copied)
+            return result
+
+        return instrumented
+
+
+_globalProfiler = None
+
+
+def globalProfiler():
+    global _globalProfiler
+    if _globalProfiler is None:
+        _globalProfiler = Profiler()
+    return _globalProfiler
@@ -11,6 +11,8 @@ import organica.tests.extend
 import organica.tests.operations
 import organica.tests.tagsmodel
 import organica.tests.objectsmodel
+import organica.tests.bitmapindex
+import organica.tests.benchmarks
 
 
 def run():
@@ -28,6 +30,8 @@ def run():
                     organica.tests.operations,
                     organica.tests.tagsmodel,
                     organica.tests.objectsmodel,
+                    organica.tests.bitmapindex,
+                    organica.tests.benchmarks,
                    )
 
     for module in module_list: